@@ -0,0 +1,63 @@
+'''
+Benchmark appending a document section to aggregators of different sizes
+
+Run with: python benchmarks/bench_append.py
+Time per append should stay flat as the aggregator grows. The first append builds the
+aggregator's index once, and is timed separately.
+'''
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from enheduanna.types.markdown.document_section import DocumentSection
+from enheduanna.types.markdown.markdown_section import MarkdownSection
+from enheduanna.utils.markdown import write_document_section
+
+SECTION_COUNTS = [100, 1_000, 10_000]
+APPENDS = 50
+
+
+def build_aggregator(path: Path, section_count: int) -> None:
+    '''
+    Write an aggregator with many dated level 2 sections
+    '''
+    root = MarkdownSection('Greg Weekly', 'Running notes for the weekly sync')
+    for count in range(section_count):
+        section = MarkdownSection(f'{count:05d} Greg Weekly', '', level=2)
+        section.add_section(MarkdownSection('Details', '- discussed the roadmap\n- agreed on next steps', level=3))
+        root.add_section(section)
+    path.write_text(root.write())
+
+
+def build_document(count: int) -> DocumentSection:
+    '''
+    Build a document section as collate extracts it from an entry
+    '''
+    root = MarkdownSection(f'Append {count} Greg Weekly', '', level=1)
+    root.add_section(MarkdownSection('Details', '- some notes from the meeting', level=2))
+    return DocumentSection(base_title='Greg Weekly', root=root)
+
+
+def main():
+    '''
+    Time write_document_section appends for each aggregator size
+    '''
+    print(f'{"sections":>10} {"size KB":>10} {"index ms":>10} {"ms/append":>10}')
+    for section_count in SECTION_COUNTS:
+        with TemporaryDirectory() as tmpdir:
+            document_folder = Path(tmpdir)
+            aggregate_path = document_folder / 'Greg Weekly.md'
+            build_aggregator(aggregate_path, section_count)
+            size = aggregate_path.stat().st_size
+            start = perf_counter()
+            write_document_section(build_document(APPENDS), document_folder)
+            index_elapsed = perf_counter() - start
+            start = perf_counter()
+            for count in range(APPENDS):
+                write_document_section(build_document(count), document_folder)
+            elapsed = perf_counter() - start
+        print(f'{section_count:>10} {size / 1024:>10.1f} {index_elapsed * 1000:>10.1f} {elapsed / APPENDS * 1000:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+'''
+Benchmark running new-entry through the client, with and without a daemon
+
+Run with: python benchmarks/bench_daemon.py
+Commands served by the daemon skip Python startup imports and config loading.
+'''
+from os import environ
+from pathlib import Path
+from subprocess import DEVNULL, Popen, run
+from sys import executable
+from tempfile import TemporaryDirectory
+from time import perf_counter, sleep
+
+from enheduanna.client import is_running
+
+RUNS = 20
+CLIENT = [executable, '-c', 'from enheduanna.client import main; main()']
+
+
+def time_client(config_path: Path, env: dict) -> float:
+    '''
+    Average seconds per new-entry run through the client
+    '''
+    start = perf_counter()
+    for _ in range(RUNS):
+        run([*CLIENT, '-c', str(config_path), 'new-entry'], env=env, check=True, stdout=DEVNULL)
+    return (perf_counter() - start) / RUNS
+
+
+def main():
+    '''
+    Time client runs in process and against a running daemon
+    '''
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        config_path = tmpdir / 'config.yml'
+        config_path.write_text(f'---\nfile:\n  entries_folder: {tmpdir / "notes"}\n  document_folder: {tmpdir / "docs"}\n')
+        socket_path = tmpdir / 'daemon.sock'
+        env = {**environ, 'ENHEDUANNA_SOCKET': str(socket_path)}
+        in_process = time_client(config_path, env)
+        daemon = Popen([executable, '-m', 'enheduanna.cli', '-c', str(config_path), 'daemon', 'start'], env=env, stdout=DEVNULL)
+        while not is_running(socket_path):
+            sleep(0.01)
+        served = time_client(config_path, env)
+        run([*CLIENT, 'daemon', 'stop'], env=env, check=True, stdout=DEVNULL)
+        daemon.wait()
+    print(f'{"mode":>12} {"ms/command":>12}')
+    print(f'{"in process":>12} {in_process * 1000:>12.1f}')
+    print(f'{"daemon":>12} {served * 1000:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
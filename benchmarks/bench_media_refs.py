@@ -0,0 +1,87 @@
+'''
+Benchmark rewriting media references in collated entries
+
+Run with: python benchmarks/bench_media_refs.py
+Compares the earlier rewrite, two regexes per mapped file name run over every
+entry's text, with the single pass over the parsed section trees. The earlier
+rewrite is timed on a sample of the entries and scaled up, as it is far slower.
+'''
+from copy import deepcopy
+from time import perf_counter
+import re
+
+from enheduanna.types.markdown.markdown_file import generate_markdown_sections
+from enheduanna.utils.media import rewrite_media_references, update_section_media_references
+
+MEDIA_FILES = 5_000
+ENTRIES = 200
+IMAGES_PER_ENTRY = 10
+SAMPLE_ENTRIES = 5
+
+
+def build_mapping() -> dict:
+    '''
+    Mapping for a collation period with many screenshots
+    '''
+    return {f'Screenshot {count:05d}.png': ('media', f'2025-01-20_14-{count // 60 % 60:02d}-{count % 60:02d}_{count}.png')
+            for count in range(MEDIA_FILES)}
+
+
+def build_entry(count: int) -> str:
+    '''
+    Build an entry embedding a few of the screenshots
+    '''
+    lines = [f'# 2025-01-{count:03d}', '', '## Work Done', '']
+    for image in range(IMAGES_PER_ENTRY):
+        lines.append(f'- Fixed ticket (ABC-{image}) ![shot](~/Screenshots/Screenshot {(count * IMAGES_PER_ENTRY + image) % MEDIA_FILES:05d}.png)')
+        lines.append(f'- Notes on the fix <img src="/home/user/Downloads/other {image}.gif">')
+    lines.extend(['', '## Scratch', '', '- Nothing to see here'])
+    return '\n'.join(lines) + '\n'
+
+
+def legacy_rewrite(text: str, mapping: dict) -> str:
+    '''
+    The earlier rewrite, compiling and running two regexes for each mapped file name
+    '''
+    for old_filename, (subfolder, new_filename) in mapping.items():
+        text = re.sub(rf'(!\[([^\]]*)\]\()([^)]*{re.escape(old_filename)})(\))',
+                      lambda match, subfolder=subfolder, new_filename=new_filename:
+                      f'{match.group(1)}./{subfolder}/{new_filename}{match.group(4)}', text)
+        text = re.sub(rf'(<img\s+[^>]*src=")([^"]*{re.escape(old_filename)})(")',
+                      lambda match, subfolder=subfolder, new_filename=new_filename:
+                      f'{match.group(1)}./{subfolder}/{new_filename}{match.group(3)}', text)
+    return text
+
+
+def main():
+    '''
+    Time each rewrite over every entry
+    '''
+    mapping = build_mapping()
+    texts = [build_entry(count) for count in range(ENTRIES)]
+    trees = [generate_markdown_sections(text) for text in texts]
+
+    start = perf_counter()
+    legacy = [legacy_rewrite(text, mapping) for text in texts[:SAMPLE_ENTRIES]]
+    legacy_elapsed = (perf_counter() - start) * ENTRIES / SAMPLE_ENTRIES
+
+    start = perf_counter()
+    rewritten = [rewrite_media_references(text, mapping) for text in texts]
+    text_elapsed = perf_counter() - start
+    assert rewritten[:SAMPLE_ENTRIES] == legacy
+
+    copies = deepcopy(trees)
+    start = perf_counter()
+    for tree in copies:
+        update_section_media_references(tree, mapping)
+    tree_elapsed = perf_counter() - start
+
+    print(f'{MEDIA_FILES} media files, {ENTRIES} entries')
+    print(f'{"rewrite":>24} {"seconds":>10} {"speedup":>10}')
+    print(f'{"per file name (scaled)":>24} {legacy_elapsed:>10.4f} {1:>10.1f}')
+    print(f'{"single pass, text":>24} {text_elapsed:>10.4f} {legacy_elapsed / text_elapsed:>10.1f}')
+    print(f'{"single pass, trees":>24} {tree_elapsed:>10.4f} {legacy_elapsed / tree_elapsed:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+'''
+Benchmark merging sections with many subsections
+
+Run with: python benchmarks/bench_merge.py
+Time per child should stay flat as the number of subsections grows.
+'''
+from time import perf_counter
+
+from enheduanna.types.markdown.markdown_section import MarkdownSection
+
+CHILD_COUNTS = [1_000, 5_000, 20_000]
+
+
+def build_section(child_count: int, offset: int) -> MarkdownSection:
+    '''
+    Build a "Work Done" section with many sub-headings, half shared with other days
+    '''
+    section = MarkdownSection('Work Done', '- work', level=2)
+    for count in range(child_count):
+        title = f'Ticket {count}' if count % 2 == 0 else f'Ticket {count + offset}'
+        section.add_section(MarkdownSection(title, f'- update {count}', level=3))
+    return section
+
+
+def main():
+    '''
+    Time merging two sections for each child count
+    '''
+    print(f'{"children":>10} {"seconds":>10} {"us/child":>10}')
+    for child_count in CHILD_COUNTS:
+        first = build_section(child_count, 0)
+        second = build_section(child_count, child_count * 10)
+        start = perf_counter()
+        first.merge(second)
+        elapsed = perf_counter() - start
+        print(f'{child_count:>10} {elapsed:>10.4f} {elapsed / child_count * 1_000_000:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
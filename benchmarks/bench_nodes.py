@@ -0,0 +1,80 @@
+'''
+Benchmark parse time and memory per section for a year of entries
+
+Run with: python benchmarks/bench_nodes.py
+'''
+import tracemalloc
+from time import perf_counter
+
+from enheduanna.types.markdown.markdown_file import generate_markdown_sections
+
+ENTRY_COUNT = 260
+
+ENTRY_TEXT = '''# 2025-01-20
+
+## Work Done
+
+- Worked on the release (ABC-1234)
+- Reviewed a pull request
+
+### Release Prep
+
+- Cut the branch
+
+### Reviews
+
+- Reviewed the parser change
+
+## Meetings
+
+| Time | Meeting Name |
+| ---- | ------------ |
+| 0900 | Standup |
+
+## Follow Ups
+
+- Send the release notes
+
+## Scratch
+
+- scratch notes
+
+## Steps to Reboot Servers
+
+ssh ubuntu@foo.com
+sudo reboot
+
+## Greg Weekly
+
+- discussed the release plan
+'''
+
+
+def count_sections(section) -> int:
+    '''
+    Count a section and all of its subsections
+    '''
+    return 1 + sum(count_sections(child) for child in section.sections)
+
+
+def main():
+    '''
+    Parse a year of entries, reporting time and traced memory per section
+    '''
+    texts = [ENTRY_TEXT.replace('2025-01-20', f'entry-{count}') for count in range(ENTRY_COUNT)]
+    start = perf_counter()
+    for text in texts:
+        generate_markdown_sections(text)
+    elapsed = perf_counter() - start
+    tracemalloc.start()
+    roots = [generate_markdown_sections(text) for text in texts]
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    section_count = sum(count_sections(root) for root in roots)
+    print(f'entries: {ENTRY_COUNT}  sections: {section_count}')
+    print(f'parse: {elapsed:.4f}s  ({elapsed / section_count * 1_000_000:.2f} us/section)')
+    print(f'memory: {current / section_count:.0f} bytes/section')
+
+
+if __name__ == '__main__':
+    main()
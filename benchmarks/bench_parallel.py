@@ -0,0 +1,54 @@
+'''
+Benchmark serial against process-pool parsing of a folder of entries
+
+Run with: python benchmarks/bench_parallel.py
+Parallel parsing only pays off once there are enough files to cover process startup.
+'''
+from os import cpu_count
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from enheduanna.utils.parse import parse_markdown_files
+
+FILE_COUNTS = [10, 100, 1_000, 5_000]
+LINES_PER_FILE = 200
+
+
+def build_entry(number: int) -> str:
+    '''
+    Build a synthetic entry with a few sections of list items
+    '''
+    lines = [f'# Entry {number}']
+    for count in range(LINES_PER_FILE):
+        if count % 40 == 0:
+            lines.append(f'## Section {count}')
+        else:
+            lines.append(f'- Worked on ticket number {count} (ABC-{count % 97})')
+    return '\n'.join(lines)
+
+
+def main():
+    '''
+    Time serial and parallel parsing for each folder size
+    '''
+    jobs = cpu_count() or 1
+    print(f'{"files":>10} {"serial s":>10} {f"jobs={jobs} s":>12}')
+    for file_count in FILE_COUNTS:
+        with TemporaryDirectory() as tmpdir:
+            paths = []
+            for number in range(file_count):
+                path = Path(tmpdir) / f'{number:05d}.md'
+                path.write_text(build_entry(number))
+                paths.append(path)
+            start = perf_counter()
+            parse_markdown_files(paths)
+            serial = perf_counter() - start
+            start = perf_counter()
+            parse_markdown_files(paths, jobs=jobs)
+            parallel = perf_counter() - start
+            print(f'{file_count:>10} {serial:>10.4f} {parallel:>12.4f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+'''
+Benchmark markdown parsing across file sizes
+
+Run with: python benchmarks/bench_parse.py
+Time per line should stay flat as the file grows (linear scaling).
+'''
+from time import perf_counter
+
+from enheduanna.types.markdown.markdown_file import generate_markdown_sections
+
+LINE_COUNTS = [1_000, 10_000, 50_000, 100_000]
+
+
+def build_document(line_count: int) -> str:
+    '''
+    Build a synthetic entry with nested sections and list items
+    '''
+    lines = ['# 2025-01-20']
+    for count in range(line_count):
+        if count % 50 == 0:
+            lines.append(f'## Section {count}')
+        elif count % 10 == 0:
+            lines.append(f'### Sub-Section {count}')
+        else:
+            lines.append(f'- Worked on ticket number {count} (ABC-{count % 97})')
+    return '\n'.join(lines)
+
+
+def main():
+    '''
+    Time the parser for each document size
+    '''
+    print(f'{"lines":>10} {"seconds":>10} {"us/line":>10}')
+    for line_count in LINE_COUNTS:
+        text = build_document(line_count)
+        start = perf_counter()
+        generate_markdown_sections(text)
+        elapsed = perf_counter() - start
+        print(f'{line_count:>10} {elapsed:>10.4f} {elapsed / line_count * 1_000_000:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
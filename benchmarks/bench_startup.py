@@ -0,0 +1,75 @@
+'''
+Benchmark CLI startup: wall time of `enheduanna --help` and `new-entry`, and import cost per module
+
+Run with: python benchmarks/bench_startup.py [--budget-ms MS]
+With --budget-ms the script exits non-zero when new-entry takes longer than the budget.
+'''
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import median
+from subprocess import DEVNULL, run
+from sys import executable
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+RUNS = 10
+TOP_MODULES = 15
+CLI = [executable, '-c', 'from enheduanna.cli import main; main()']
+
+
+def time_command(command: list) -> float:
+    '''
+    Median milliseconds to run a command
+    '''
+    timings = []
+    for _ in range(RUNS):
+        start = perf_counter()
+        run(command, check=True, stdout=DEVNULL)
+        timings.append((perf_counter() - start) * 1000)
+    return median(timings)
+
+
+def import_costs(command: list) -> list:
+    '''
+    Cumulative import time in milliseconds of each module a command loads, largest first
+    '''
+    result = run([command[0], '-X', 'importtime', *command[1:]], check=True, stdout=DEVNULL, stderr=-1, text=True)
+    costs = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self, cumulative, name = line.removeprefix('import time:').split('|')
+        costs.append((int(cumulative) / 1000, name.strip()))
+    return sorted(costs, reverse=True)
+
+
+def main():
+    '''
+    Print startup timings and the most expensive imports of new-entry
+    '''
+    parser = ArgumentParser()
+    parser.add_argument('--budget-ms', type=float, help='Fail when new-entry takes longer than this')
+    args = parser.parse_args()
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        config_path = tmpdir / 'config.yml'
+        config_path.write_text(f'---\nfile:\n  entries_folder: {tmpdir / "notes"}\n  document_folder: {tmpdir / "docs"}\n')
+        new_entry = [*CLI, '-c', str(config_path), 'new-entry']
+        timings = {
+            'python': time_command([executable, '-c', 'pass']),
+            '--help': time_command([*CLI, '--help']),
+            'new-entry': time_command(new_entry),
+        }
+        costs = import_costs(new_entry)
+    print(f'{"command":>12} {"ms":>8}')
+    for name, elapsed in timings.items():
+        print(f'{name:>12} {elapsed:>8.1f}')
+    print(f'\n{"module":<50} {"cumulative ms":>14}')
+    for cumulative, name in costs[:TOP_MODULES]:
+        print(f'{name:<50} {cumulative:>14.1f}')
+    if args.budget_ms is not None and timings['new-entry'] > args.budget_ms:
+        raise SystemExit(f'new-entry took {timings["new-entry"]:.1f} ms, over the {args.budget_ms:.1f} ms budget')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+'''
+Benchmark markdown output across section counts
+
+Run with: python benchmarks/bench_write.py
+Time per section should stay flat as the document grows.
+'''
+from io import StringIO
+from time import perf_counter
+
+from enheduanna.types.markdown.markdown_section import MarkdownSection
+
+SECTION_COUNTS = [1_000, 10_000, 50_000]
+
+
+def build_document(section_count: int) -> MarkdownSection:
+    '''
+    Build a merged-style document with many level 2 sections and nested children
+    '''
+    root = MarkdownSection('Merged', '')
+    for count in range(0, section_count, 5):
+        section = MarkdownSection(f'Section {count}', f'- line for {count}\n' * 5, level=2)
+        for child in range(1, 5):
+            section.add_section(MarkdownSection(f'Child {count + child}', f'- child line {child}', level=3))
+        root.add_section(section)
+    return root
+
+
+def main():
+    '''
+    Time write() and write_to() for each document size
+    '''
+    print(f'{"sections":>10} {"write s":>10} {"write_to s":>10} {"us/section":>10}')
+    for section_count in SECTION_COUNTS:
+        document = build_document(section_count)
+        start = perf_counter()
+        document.write()
+        write_elapsed = perf_counter() - start
+        start = perf_counter()
+        document.write_to(StringIO())
+        stream_elapsed = perf_counter() - start
+        print(f'{section_count:>10} {write_elapsed:>10.4f} {stream_elapsed:>10.4f} '
+              f'{stream_elapsed / section_count * 1_000_000:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,52 @@
-from datetime import date
 from pathlib import Path
+from typing import TYPE_CHECKING, List, NamedTuple, Union
 
 import click
 
 from enheduanna.defaults import CONFIG_DEFAULT
-from enheduanna.types.config import Config
-from enheduanna.types.markdown.markdown_file import MarkdownFile
-from enheduanna.types.markdown.markdown_section import MarkdownSection
 
-from enheduanna.utils.collation import create_parent_folder
-from enheduanna.utils.files import list_markdown_files, find_last_markdown_file
-from enheduanna.utils.links import rewrite_section_links
-from enheduanna.utils.markdown import generate_markdown_collation, generate_markdown_merge, remove_empty_sections, write_document_section
-from enheduanna.utils.media import organize_media_for_collation, update_markdown_media_references, parse_collation_folder_name
-from enheduanna.utils.toc import build_summary_toc_section, update_root_index
+# Commands import what they use when they run, so starting the CLI only pays for click
+# and the modules of the command being run. See benchmarks/bench_startup.py.
+# pylint: disable=import-outside-toplevel
 
+if TYPE_CHECKING: # pragma: no cover
+    from datetime import date
 
-def ensure_entry_file(parent_folder: Path, today: date, config: Config,
-                      last_markdown_file: MarkdownFile) -> Path:
+    from enheduanna.types.config import Config
+    from enheduanna.types.markdown.document_section import DocumentSection
+    from enheduanna.types.markdown.markdown_file import MarkdownFile
+    from enheduanna.types.markdown.markdown_section import MarkdownSection
+    from enheduanna.utils.cache import ParseCache
+    from enheduanna.utils.collation.manifest import CollationManifest
+    from enheduanna.utils.workspace_index import WorkspaceIndex
+    from enheduanna.utils.write_plan import WritePlan
+
+DOCUMENT_MESSAGES = {
+    'written': 'Writing document to file {path}',
+    'appended': 'Appending document to file {path}',
+    'replaced': 'Replacing document in file {path}',
+    'unchanged': 'Document unchanged in file {path}',
+}
+
+# Context meta keys set when a command runs in the daemon
+RESIDENT_STATE = 'enheduanna.resident_state'
+RESIDENT_CACHE = 'enheduanna.resident_cache'
+
+
+def ensure_entry_file(parent_folder: Path, today: 'date', config: 'Config',
+                      last_markdown_file: 'MarkdownFile', write_plan: 'WritePlan') -> Path:
     '''
     Ensure entry file exists
     parent_folder : Folder for week
     today : Todays date
     config: Complete config
     last_markdown_file : Last created markdown file
+    write_plan : Write plan to stage the new and rolled over files with
     '''
+    from enheduanna.types.markdown.markdown_file import MarkdownFile
+    from enheduanna.types.markdown.markdown_section import MarkdownSection
+    from enheduanna.utils.links import rewrite_section_links
+
     entry_file = parent_folder / f'{today.strftime(config.file.date_output_format)}.md'
     if entry_file.exists():
         return entry_file
@@ -40,24 +62,51 @@ def ensure_entry_file(parent_folder: Path, today: date, config: Config,
                 rewrite_section_links(existing_section, last_markdown_file.file_path, parent_folder,
                                       last_markdown_file.root_section)
                 markdown_contents.add_section(existing_section)
-                last_markdown_file.write()
+                write_plan.stage(last_markdown_file)
                 continue
         if not section.auto_generate:
             continue
         markdown_contents.add_section(section)
-    entry_file.write_text(markdown_contents.write())
+    write_plan.stage(MarkdownFile(entry_file, markdown_contents))
     return entry_file
 
 
 @click.group()
 @click.option('-c', '--config-file', default=CONFIG_DEFAULT, show_default=True,
               type=click.Path(file_okay=True, dir_okay=False, exists=False))
+@click.option('--no-cache', is_flag=True, help='Parse every file again, skipping the parse cache')
 @click.pass_context
-def main(context: click.Context, config_file: str):
+def main(context: click.Context, config_file: str, no_cache: bool):
     '''
     Enheduanna CLI Runner
     '''
-    context.obj = Config.from_yaml(Path(config_file))
+    from enheduanna.daemon import ResidentState
+    from enheduanna.utils.config_snapshot import load_config
+
+    try:
+        if isinstance(context.obj, ResidentState):
+            # Running in the daemon, reuse its loaded config and parsed files
+            resident = context.obj
+            context.obj = resident.config(Path(config_file))
+            context.meta[RESIDENT_STATE] = resident
+            if not no_cache:
+                context.meta[RESIDENT_CACHE] = resident.parse_cache
+        else:
+            context.obj = load_config(Path(config_file))
+    except ValueError as e:
+        raise click.ClickException(f'Invalid config file {config_file}\n{e}') from e
+    if no_cache:
+        context.obj.file.cache.enabled = False
+
+def open_parse_cache(context: click.Context) -> Union['ParseCache', None]:
+    '''
+    Parse cache for a command, the daemon's in-memory cache when running in the daemon
+
+    context : Click context
+    '''
+    from enheduanna.utils.cache import ParseCache
+
+    return context.meta.get(RESIDENT_CACHE) or ParseCache.from_config(context.obj.file.cache)
 
 @main.command('new-entry')
 @click.pass_context
@@ -65,89 +114,476 @@ def new_entry(context: click.Context):
     '''
     Create a new entry for today
     '''
+    from datetime import date
+
+    from enheduanna.types.markdown.markdown_file import MarkdownFile
+    from enheduanna.utils.collation import create_parent_folder, find_latest_entry
+    from enheduanna.utils.workspace_index import WorkspaceIndex
+    from enheduanna.utils.write_plan import WritePlan
+
     # Get date basics
     today = date.today()
     # Find last file, see if it has any carryover sections
-    last_file = find_last_markdown_file(context.obj.file.entries_folder)
+    # Entries created or restored outside of enheduanna are not in the workspace index,
+    # so the newest entry always comes from the folders and the index is brought up to date
+    workspace_index = WorkspaceIndex.from_config(context.obj.file)
+    last_file = find_latest_entry(context.obj.file.entries_folder, context.obj.file.date_output_format)
+    if workspace_index and last_file and workspace_index.latest_entry() != last_file.resolve():
+        workspace_index.update([last_file])
     if last_file:
-        last_file = MarkdownFile.from_file(last_file)
+        cache = open_parse_cache(context)
+        last_file = MarkdownFile.from_file(last_file, lossless=context.obj.file.preserve_formatting, cache=cache)
+        if cache:
+            cache.save()
     # Get folder and file ready
     parent_folder = create_parent_folder(context.obj, today)
-    entry_file = ensure_entry_file(parent_folder, today, context.obj, last_file)
+    write_plan = WritePlan()
+    entry_file = ensure_entry_file(parent_folder, today, context.obj, last_file, write_plan)
+    written = write_plan.commit()
+    if workspace_index:
+        workspace_index.update(written)
+        workspace_index.close()
     click.echo(f'Created entry file {entry_file}')
+    click.echo(write_plan.summary())
 
-@main.command('collate')
-@click.option('-cn', '--collate-name', default='summary.md', show_default=True)
-@click.option('-t', '--title')
-@click.argument('file_dir', type=click.Path(file_okay=False, dir_okay=True, exists=True))
-@click.pass_context
-def collate(context: click.Context, file_dir: str, title, collate_name: str):
+class PreparedCollation(NamedTuple):
     '''
-    Collate entry files
+    Collation folder state between parsing and writing
     '''
-    file_dir = Path(file_dir)
-    title = title or f'Summary | {file_dir.name.replace("_", " -> ")}'
-    markdown_files = []
-    for path in list_markdown_files(file_dir):
-        markdown_files.append(MarkdownFile.from_file(path))
-    # Ignore sections set automatically but not in collate
-    ignore_sections = set(i.title for i in context.obj.file.entry_sections) - set([i.title for i in context.obj.file.collate_sections]) #pylint:disable=consider-using-set-comprehension
-    combos, documents = generate_markdown_collation(markdown_files, context.obj.file.collate_sections, ignore_sections, context.obj.file.document_folder)
+    file_dir: Path
+    manifest: 'CollationManifest'
+    entry_paths: List[Path]
+    markdown_files: List['MarkdownFile']
+    entry_files: List['MarkdownFile']
+    combos: List['MarkdownSection']
+    documents: List['DocumentSection']
+    write_plan: 'WritePlan'
+
+
+def prepare_collation(config: 'Config', file_dir: Path, cache: 'ParseCache', jobs: int, full: bool) -> PreparedCollation:
+    '''
+    Parse the changed entries of a collation folder and build its combined sections
+
+    Nothing is written yet, trimmed entries are staged in the returned write plan.
+
+    config : Complete config
+    file_dir : Collation folder
+    cache : Optional parse cache
+    jobs : Number of processes used to parse files
+    full : Ignore the collation manifest and rebuild from every entry
+    '''
+    from enheduanna.types.markdown.markdown_file import MarkdownFile
+    from enheduanna.types.markdown.markdown_section import MarkdownSection
+    from enheduanna.utils.collation.manifest import CollationManifest
+    from enheduanna.utils.files import list_markdown_files
+    from enheduanna.utils.markdown import gather_markdown_collation
+    from enheduanna.utils.parse import parse_markdown_files
+    from enheduanna.utils.write_plan import WritePlan
+
+    if full:
+        manifest = CollationManifest(file_dir, config.file.collation_plan)
+    else:
+        manifest = CollationManifest.load(file_dir, config.file.collation_plan)
+    # Only entries changed since the last run are parsed, the rest come from the manifest
+    entry_paths = list_markdown_files(file_dir)
+    changed_paths = [path for path in entry_paths if not manifest.is_current(path)]
+    markdown_files = parse_markdown_files(changed_paths, lossless=config.file.preserve_formatting,
+                                          cache=cache, jobs=jobs)
+    # Every file change is staged here and written once at the end
+    write_plan = WritePlan()
+    fragments, documents = gather_markdown_collation(markdown_files, config.file.collation_plan, config.file.document_folder,
+                                                     write_plan=write_plan)
+    combos = manifest.combine(entry_paths, dict(zip(changed_paths, fragments)))
+    # Unchanged entries only need their path and title from here on
+    changed_files = dict(zip(changed_paths, markdown_files))
+    entry_files = [changed_files.get(path) or MarkdownFile(path, MarkdownSection(manifest.title(path), ''))
+                   for path in entry_paths]
+    return PreparedCollation(file_dir, manifest, entry_paths, markdown_files, entry_files, combos, documents, write_plan)
+
+
+def finish_collation(config: 'Config', prepared: PreparedCollation, title: str, collate_name: str,
+                     update_index: bool = True, workspace_index: 'WorkspaceIndex' = None) -> bool:
+    '''
+    Organize media, write the summary and documents and clean up a prepared collation folder
+
+    config : Complete config
+    prepared : Output of prepare_collation
+    title : Summary title
+    collate_name : Summary file name
+    update_index : Refresh the root index when the summary changed
+    workspace_index : Optional workspace index, updated with every file written
+
+    Returns whether the summary was written
+    '''
+    from enheduanna.types.markdown.markdown_section import MarkdownSection
+    from enheduanna.utils.markdown import remove_empty_sections, write_document_section
+    from enheduanna.utils.media import organize_media_for_collation, parse_collation_folder_name
+    from enheduanna.utils.media import update_markdown_media_references, update_media_reference_files
+    from enheduanna.utils.media_store import MediaStore
+    from enheduanna.utils.toc import build_summary_toc_section, update_root_index
+
+    file_dir = prepared.file_dir
+    write_plan = prepared.write_plan
     # Organize media files if configured, before building the summary so the table
-    # of contents can list them. Move/copy the files now, but defer the in-note
-    # reference rewrite until after remove_empty_sections: that cleanup rewrites
-    # each entry from its in-memory section tree (which still holds the original
-    # reference) and would otherwise clobber the rewritten path.
-    date_range = parse_collation_folder_name(file_dir.name, context.obj.file.date_output_format)
+    # of contents can list them. References in the entries are rewritten later, in
+    # their section trees, so the cleanup below writes each entry only once.
+    date_range = parse_collation_folder_name(file_dir.name, config.file.date_output_format)
     filename_mapping = {}
     if date_range:
         start_date, end_date = date_range
-        filename_mapping = organize_media_for_collation(file_dir, start_date, end_date, context.obj.file.media)
+        filename_mapping = organize_media_for_collation(file_dir, start_date, end_date, config.file.media,
+                                                        store=MediaStore.from_config(config.file))
     new_document = MarkdownSection(title, '')
-    if context.obj.file.toc.enabled:
-        toc_section = build_summary_toc_section(file_dir, markdown_files, context.obj.file.media.extensions, context.obj.file.toc)
+    if config.file.toc.enabled:
+        toc_section = build_summary_toc_section(file_dir, prepared.entry_files, config.file.media.extensions, config.file.toc)
         if toc_section:
             new_document.add_section(toc_section)
-    for section in combos:
+    for section in prepared.combos:
         section.level = 2
         new_document.add_section(section)
     new_path = file_dir / collate_name
-    new_path.write_text(new_document.write())
-    click.echo(f'Collation data written to file {new_path}')
-    for document in documents:
-        new_path, appended = write_document_section(document, context.obj.file.document_folder)
-        verb = 'Appending' if appended else 'Writing'
-        click.echo(f'{verb} document to file {new_path}')
+    summary_text = new_document.write()
+    summary_written = not new_path.exists() or new_path.read_text() != summary_text
+    if summary_written:
+        write_plan.stage_text(new_path, summary_text)
+        click.echo(f'Collation data written to file {new_path}')
+    else:
+        click.echo(f'Collation data unchanged in file {new_path}')
+    for document in prepared.documents:
+        new_path, action = write_document_section(document, config.file.document_folder,
+                                                  lossless=config.file.preserve_formatting, write_plan=write_plan,
+                                                  update=config.file.aggregator_updates,
+                                                  sharding=config.file.aggregator_sharding,
+                                                  shard_size=config.file.aggregator_shard_size,
+                                                  date_format=config.file.date_output_format)
+        click.echo(DOCUMENT_MESSAGES[action].format(path=new_path))
     # Update the root index that links to each collation summary
-    if context.obj.file.toc.enabled and context.obj.file.toc.root_index_enabled:
-        index_path = update_root_index(context.obj.file.entries_folder, collate_name, context.obj.file.toc)
-        if index_path:
-            click.echo(f'Updated root index {index_path}')
-    # Clean up files
-    click.echo(f'Cleaning up files in dir {file_dir}')
-    remove_empty_sections(markdown_files)
-    # Rewrite media references last, so the cleanup write above cannot revert them
+    if update_index and config.file.toc.enabled and config.file.toc.root_index_enabled:
+        index_missing = not (config.file.entries_folder / config.file.toc.root_index_name).exists()
+        if summary_written or index_missing:
+            summary_folders = workspace_index.summary_folders(collate_name, staged=[file_dir]) if workspace_index else None
+            index_path = update_root_index(config.file.entries_folder, collate_name, config.file.toc,
+                                           write_plan=write_plan, summary_folders=summary_folders)
+            if index_path:
+                click.echo(f'Updated root index {index_path}')
+    # Point media references at the organized files, in the parsed section trees and,
+    # for entries unchanged since the last run, in their text
     if filename_mapping:
-        update_markdown_media_references(markdown_files, filename_mapping)
+        update_markdown_media_references(prepared.markdown_files, filename_mapping, write_plan=write_plan)
+        parsed = {markdown_file.file_path for markdown_file in prepared.markdown_files}
+        update_media_reference_files([path for path in prepared.entry_paths if path not in parsed],
+                                     filename_mapping, write_plan=write_plan)
+    # Clean up files
+    if prepared.markdown_files:
+        click.echo(f'Cleaning up files in dir {file_dir}')
+        remove_empty_sections(prepared.markdown_files, write_plan=write_plan)
+    written = write_plan.commit()
+    if workspace_index:
+        workspace_index.update(written)
+    click.echo(write_plan.summary())
+    prepared.manifest.refresh(prepared.entry_paths)
+    prepared.manifest.save()
+    return summary_written
+
+
+@main.command('collate')
+@click.option('-cn', '--collate-name', default='summary.md', show_default=True)
+@click.option('-t', '--title')
+@click.option('-j', '--jobs', default=1, show_default=True, type=click.IntRange(min=1),
+              help='Number of processes used to parse files')
+@click.option('--full', is_flag=True, help='Ignore the collation manifest and rebuild from every entry')
+@click.option('-a', '--all', 'all_folders', is_flag=True, help='Collate every folder in the entries folder')
+@click.option('-s', '--since', help='Collate every folder in the entries folder ending on or after this date')
+@click.option('-w', '--workers', default=4, show_default=True, type=click.IntRange(min=1),
+              help='Number of folders prepared at once with --all or --since')
+@click.argument('file_dir', required=False, type=click.Path(file_okay=False, dir_okay=True, exists=True))
+@click.pass_context
+def collate(context: click.Context, file_dir: str, title, collate_name: str, jobs: int, full: bool,
+            all_folders: bool, since: str, workers: int):
+    '''
+    Collate entry files
+    '''
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import datetime
+
+    from enheduanna.utils.collation import list_collation_folders
+    from enheduanna.utils.toc import update_root_index
+    from enheduanna.utils.workspace_index import WorkspaceIndex
+    from enheduanna.utils.write_plan import WritePlan
+
+    config = context.obj
+    cache = open_parse_cache(context)
+    workspace_index = WorkspaceIndex.from_config(config.file)
+    if not all_folders and not since:
+        if not file_dir:
+            raise click.UsageError('Give a FILE_DIR, or use --all or --since')
+        file_dir = Path(file_dir)
+        title = title or f'Summary | {file_dir.name.replace("_", " -> ")}'
+        prepared = prepare_collation(config, file_dir, cache, jobs, full)
+        if cache:
+            cache.save()
+        finish_collation(config, prepared, title, collate_name, workspace_index=workspace_index)
+        if workspace_index:
+            workspace_index.close()
+        return
+    if file_dir or title:
+        raise click.UsageError('FILE_DIR and --title cannot be used with --all or --since')
+    since_date = None
+    if since:
+        try:
+            since_date = datetime.strptime(since, config.file.date_output_format)
+        except ValueError as e:
+            raise click.BadParameter(f'Expected a date in format "{config.file.date_output_format}"', param_hint='--since') from e
+    folders = list_collation_folders(config.file.entries_folder, config.file.date_output_format, since=since_date)
+    summaries_written = False
+    # Parse and combine folders concurrently, but write them one at a time in date order
+    # so appends to shared aggregator documents keep their order
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(prepare_collation, config, folder, cache, jobs, full) for folder in folders]
+        for folder, future in zip(folders, futures):
+            folder_title = f'Summary | {folder.name.replace("_", " -> ")}'
+            summaries_written = finish_collation(config, future.result(), folder_title, collate_name, update_index=False,
+                                                 workspace_index=workspace_index) or summaries_written
+    if cache:
+        cache.save()
+    click.echo(f'Collated {len(folders)} folders')
+    # Refresh the root index once, after every summary is in place
+    if config.file.toc.enabled and config.file.toc.root_index_enabled:
+        index_missing = not (config.file.entries_folder / config.file.toc.root_index_name).exists()
+        if summaries_written or index_missing:
+            write_plan = WritePlan()
+            summary_folders = workspace_index.summary_folders(collate_name) if workspace_index else None
+            index_path = update_root_index(config.file.entries_folder, collate_name, config.file.toc, write_plan=write_plan,
+                                           summary_folders=summary_folders)
+            written = write_plan.commit()
+            if workspace_index:
+                workspace_index.update(written)
+            if index_path:
+                click.echo(f'Updated root index {index_path}')
+    if workspace_index:
+        workspace_index.close()
+
+@main.command('rollup')
+@click.option('-cn', '--collate-name', default='summary.md', show_default=True)
+@click.option('-y', '--year', type=int, help='Only roll up this year')
+@click.option('-o', '--output-dir', type=click.Path(file_okay=False, dir_okay=True),
+              help='Folder for rollup files, defaults to "rollups" in the entries folder')
+@click.option('--full', is_flag=True, help='Ignore the rollup manifest and rebuild every rollup')
+@click.pass_context
+def rollup(context: click.Context, collate_name: str, year: int, output_dir: str, full: bool):
+    '''
+    Roll collation summaries up into quarter and year summaries
+    '''
+    from enheduanna.types.markdown.collation_plan import CollationPlan
+    from enheduanna.utils.rollup import RollupManifest, build_rollups
+    from enheduanna.utils.write_plan import WritePlan
+
+    config = context.obj
+    output_dir = Path(output_dir) if output_dir else config.file.entries_folder / 'rollups'
+    collation_plan = CollationPlan(config.file.collate_sections, [config.file.toc.summary_title])
+    if full:
+        manifest = RollupManifest(output_dir, collation_plan)
+    else:
+        manifest = RollupManifest.load(output_dir, collation_plan)
+    write_plan = WritePlan()
+    results = build_rollups(manifest, output_dir, collate_name, config.file, write_plan, year=year)
+    if results:
+        output_dir.mkdir(parents=True, exist_ok=True)
+    write_plan.commit()
+    manifest.save()
+    for path, rebuilt in results:
+        verb = 'written to' if rebuilt else 'unchanged in'
+        click.echo(f'Rollup {verb} file {path}')
+    click.echo(write_plan.summary())
 
 @main.command('merge')
 @click.option('-t', '--title')
+@click.option('-j', '--jobs', default=1, show_default=True, type=click.IntRange(min=1),
+              help='Number of processes used to parse files')
 @click.argument('file_dir', type=click.Path(file_okay=False, dir_okay=True, exists=True))
 @click.argument('output_file', type=click.Path(file_okay=True, dir_okay=False, exists=False))
-def merge(file_dir: str, output_file: str, title):
+@click.pass_context
+def merge(context: click.Context, file_dir: str, output_file: str, title, jobs: int):
     '''
     Merge all markdown files into a single file
     '''
+    from enheduanna.types.markdown.markdown_file import MarkdownFile
+    from enheduanna.utils.files import list_markdown_files
+    from enheduanna.utils.markdown import generate_markdown_merge
+    from enheduanna.utils.parse import parse_markdown_files
+    from enheduanna.utils.workspace_index import WorkspaceIndex
+    from enheduanna.utils.write_plan import WritePlan
+
     file_dir = Path(file_dir)
     output_file = Path(output_file)
     title = title or f'Merged | {file_dir.name.replace("_", " -> ")}'
-    markdown_files = []
+    cache = open_parse_cache(context)
     # Include all markdown files, not just entries
-    for path in list_markdown_files(file_dir, only_include_entry=False):
-        markdown_files.append(MarkdownFile.from_file(path))
+    markdown_files = parse_markdown_files(list_markdown_files(file_dir, only_include_entry=False), cache=cache, jobs=jobs)
+    if cache:
+        cache.save()
     merged_section = generate_markdown_merge(markdown_files, title, output_file.parent)
-    output_file.write_text(merged_section.write())
+    write_plan = WritePlan()
+    write_plan.stage(MarkdownFile(output_file, merged_section))
+    written = write_plan.commit()
+    workspace_index = WorkspaceIndex.from_config(context.obj.file)
+    if workspace_index:
+        workspace_index.update(written)
+        workspace_index.close()
     click.echo(f'Merged data written to file {output_file}')
+    click.echo(write_plan.summary())
+
+@main.command('split-aggregators')
+@click.option('--by', type=click.Choice(['year', 'size']),
+              help='Shard by entry year or by size, defaults to the aggregator_sharding config')
+@click.pass_context
+def split_aggregators(context: click.Context, by: str):
+    '''
+    Split aggregator documents larger than the shard size into shards
+    '''
+    from enheduanna.types.config.file import AggregatorSharding
+    from enheduanna.utils.aggregate import list_shards, root_title, split_aggregator
+    from enheduanna.utils.write_plan import WritePlan
+
+    config = context.obj
+    sharding = AggregatorSharding(by) if by else config.file.aggregator_sharding
+    if sharding == AggregatorSharding.OFF:
+        raise click.UsageError('Set aggregator_sharding in the config or use --by')
+    write_plan = WritePlan()
+    for path in sorted(config.file.document_folder.glob('*.md')):
+        if path.stat().st_size <= config.file.aggregator_shard_size or list_shards(path, write_plan):
+            continue
+        title = root_title(write_plan.head(path))
+        if not title:
+            continue
+        shards = split_aggregator(path, title, sharding, config.file.aggregator_shard_size, write_plan,
+                                  date_format=config.file.date_output_format)
+        if shards:
+            click.echo(f'Split {path} into {len(shards)} shards')
+    write_plan.commit()
+    click.echo(write_plan.summary())
+
+@main.command('reindex')
+@click.pass_context
+def reindex(context: click.Context):
+    '''
+    Rebuild the workspace index from the entries and document folders
+    '''
+    from enheduanna.utils.workspace_index import WorkspaceIndex
+
+    workspace_index = WorkspaceIndex.from_config(context.obj.file)
+    if not workspace_index:
+        raise click.UsageError('Enable the workspace index in the config first')
+    indexed, _parsed = workspace_index.reindex()
+    workspace_index.close()
+    click.echo(f'Indexed {indexed} files in {workspace_index.path}')
+
+@main.group('config')
+def config_group():
+    '''
+    Manage the config file
+    '''
+
+@config_group.command('check')
+@click.pass_context
+def config_check(context: click.Context):
+    '''
+    Validate the config file and rebuild its snapshot
+    '''
+    from enheduanna.utils.config_snapshot import load_config, snapshot_path
+
+    config_file = Path(context.find_root().params['config_file'])
+    load_config(config_file, rebuild=True)
+    click.echo(f'Config file {config_file} is valid')
+    click.echo(f'Wrote config snapshot {snapshot_path(config_file)}')
+
+@main.group('cache')
+def cache_group():
+    '''
+    Manage the parse cache
+    '''
+
+@cache_group.command('clear')
+@click.pass_context
+def cache_clear(context: click.Context):
+    '''
+    Remove all cached parse results
+    '''
+    from enheduanna.utils.cache import ParseCache
+
+    config = context.obj.file.cache
+    ParseCache(config.folder, max_entries=config.max_entries).clear()
+    resident = context.meta.get(RESIDENT_STATE)
+    if resident:
+        resident.parse_cache.clear()
+    click.echo(f'Cleared parse cache in {config.folder}')
+
+@main.group('media')
+def media_group():
+    '''
+    Manage collated media
+    '''
+
+@media_group.command('gc')
+@click.pass_context
+def media_gc(context: click.Context):
+    '''
+    Remove media store files no collation folder uses anymore
+    '''
+    from enheduanna.utils.media_store import MEDIA_STORE_NAME, MediaStore
+
+    store = MediaStore(context.obj.file.entries_folder / MEDIA_STORE_NAME)
+    removed, freed = store.gc(context.obj.file.entries_folder)
+    click.echo(f'Removed {removed} unused media files ({freed} bytes) from {store.folder}')
+
+@main.group('daemon')
+def daemon_group():
+    '''
+    Keep config and parsed files in memory between commands
+    '''
+
+@daemon_group.command('start')
+@click.option('--socket', 'socket_file', type=click.Path(file_okay=True, dir_okay=False),
+              help='Socket path, defaults to $ENHEDUANNA_SOCKET or ~/.cache/enheduanna/daemon.sock')
+@click.pass_context
+def daemon_start(context: click.Context, socket_file: str):
+    '''
+    Serve commands to enheduanna-client until stopped
+    '''
+    from enheduanna.client import socket_path
+    from enheduanna.daemon import DaemonException, ResidentState, serve
+
+    if context.meta.get(RESIDENT_STATE):
+        raise click.UsageError('Already running in the daemon')
+    path = Path(socket_file) if socket_file else socket_path()
+    click.echo(f'Serving commands on {path}')
+    try:
+        serve(main, path, ResidentState(max_entries=context.obj.file.cache.max_entries))
+    except DaemonException as e:
+        raise click.ClickException(str(e)) from e
+    click.echo('Daemon stopped')
+
+@daemon_group.command('stop')
+@click.option('--socket', 'socket_file', type=click.Path(file_okay=True, dir_okay=False),
+              help='Socket path, defaults to $ENHEDUANNA_SOCKET or ~/.cache/enheduanna/daemon.sock')
+@click.pass_context
+def daemon_stop(context: click.Context, socket_file: str):
+    '''
+    Stop a running daemon
+    '''
+    from enheduanna.client import send_command, socket_path
+
+    resident = context.meta.get(RESIDENT_STATE)
+    if resident:
+        # The daemon finishes this command, then stops
+        resident.stop_requested = True
+        click.echo('Stopping daemon')
+        return
+    path = Path(socket_file) if socket_file else socket_path()
+    response = send_command(path, ['daemon', 'stop'], Path.cwd())
+    if response is None:
+        raise click.ClickException(f'No daemon running on {path}')
+    click.echo(response['stdout'], nl=False)
 
 if __name__ == '__main__':  # pragma: no cover
     main(obj={}) # pylint:disable=no-value-for-parameter
@@ -0,0 +1,106 @@
+from importlib import import_module
+from json import dumps, loads
+from pathlib import Path
+from typing import List, Union
+import os
+import socket
+import sys
+
+from enheduanna.defaults import SOCKET_PATH_DEFAULT
+
+# Environment variable to point the client and daemon at another socket
+SOCKET_ENV = 'ENHEDUANNA_SOCKET'
+
+def socket_path() -> Path:
+    '''
+    Daemon socket path, from the environment or the default
+    '''
+    return Path(os.environ.get(SOCKET_ENV, SOCKET_PATH_DEFAULT)).expanduser()
+
+def send_message(connection: socket.socket, message: dict) -> None:
+    '''
+    Send a json message and close the sending side, which marks the end of it
+
+    connection : Connected socket
+    message : Message to send
+    '''
+    connection.sendall(dumps(message, separators=(',', ':')).encode('utf-8'))
+    connection.shutdown(socket.SHUT_WR)
+
+def read_message(connection: socket.socket) -> Union[dict, None]:
+    '''
+    Read a json message until the other side stops sending
+
+    connection : Connected socket
+
+    Returns the message, or None if nothing valid was sent
+    '''
+    chunks = []
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    try:
+        message = loads(b''.join(chunks))
+    except ValueError:
+        return None
+    return message if isinstance(message, dict) else None
+
+def _connect(path: Path) -> Union[socket.socket, None]:
+    '''
+    Connect to the daemon socket, or None if no daemon is listening
+    '''
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(str(path))
+    except (FileNotFoundError, ConnectionRefusedError):
+        connection.close()
+        return None
+    return connection
+
+def is_running(path: Path) -> bool:
+    '''
+    Check if a daemon is listening on a socket
+
+    path : Socket path
+    '''
+    connection = _connect(path)
+    if connection is None:
+        return False
+    connection.close()
+    return True
+
+def send_command(path: Path, argv: List[str], cwd: Path) -> Union[dict, None]:
+    '''
+    Run a command on the daemon, with the environment of this process
+
+    path : Socket path
+    argv : Command line arguments, without the program name
+    cwd : Folder relative paths in the arguments resolve against
+
+    Returns dict with the exit code, stdout and stderr of the command, or None if no daemon is listening
+    '''
+    connection = _connect(path)
+    if connection is None:
+        return None
+    with connection:
+        send_message(connection, {'argv': argv, 'cwd': str(cwd), 'env': dict(os.environ)})
+        return read_message(connection)
+
+def main(argv: List[str] = None) -> None:
+    '''
+    Thin client entry point, runs the command on the daemon when one is listening
+
+    Only the standard library is imported until the command has to run in this process.
+
+    argv : Command line arguments, defaults to sys.argv
+    '''
+    argv = sys.argv[1:] if argv is None else list(argv)
+    response = send_command(socket_path(), argv, Path.cwd())
+    if response is None:
+        # No daemon, so pay for the full import and run the command here, it exits when done
+        return import_module('enheduanna.cli').main(args=argv, prog_name='enheduanna')
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    sys.exit(response['code'])
@@ -0,0 +1,169 @@
+from contextlib import redirect_stderr, redirect_stdout
+from copy import deepcopy
+from io import StringIO
+from pathlib import Path
+from traceback import print_exc
+from typing import Dict, List, Tuple, Union
+import os
+import socket
+
+import click
+
+from enheduanna.client import is_running, read_message, send_message
+from enheduanna.types.config import Config
+from enheduanna.utils.config_snapshot import load_config, snapshot_key
+from enheduanna.utils.cache import MemoryParseCache
+
+# Seconds a client has to send its request, and to read the response
+REQUEST_TIMEOUT = 10
+
+class DaemonException(Exception):
+    '''
+    Daemon could not be started
+    '''
+
+class ResidentState:
+    '''
+    State the daemon keeps between commands
+
+    max_entries : Maximum number of parsed files kept in memory
+    '''
+    def __init__(self, max_entries: int = 10000):
+        self.parse_cache = MemoryParseCache(max_entries=max_entries)
+        self.stop_requested = False
+        self._configs = {}
+
+    def config(self, config_path: Path) -> Config:
+        '''
+        Load config, reusing the loaded config while its snapshot key is unchanged
+
+        The key covers the config file and the environment variables it references, which
+        are the client's while a command runs. Commands can modify the config they are
+        given, so each call returns a copy.
+
+        config_path : Config file path
+        '''
+        path = str(config_path.resolve())
+        key = snapshot_key(config_path)
+        cached = self._configs.get(path)
+        if cached is None or cached[0] != key:
+            cached = (key, load_config(config_path))
+            self._configs[path] = cached
+        return deepcopy(cached[1])
+
+def run_command(command: click.Command, argv: List[str], cwd: Path, state: ResidentState,
+                env: Dict[str, str] = None) -> Tuple[int, str, str]:
+    '''
+    Run a click command in this process, capturing its output
+
+    command : Click command or group to run
+    argv : Command line arguments, without the program name
+    cwd : Folder to run the command in
+    state : Resident state, passed to the command as its context object
+    env : Environment to run the command with, instead of the daemon's own
+
+    Returns tuple of (exit code, stdout, stderr)
+    '''
+    stdout = StringIO()
+    stderr = StringIO()
+    previous_cwd = Path.cwd()
+    previous_env = dict(os.environ)
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            os.chdir(cwd)
+            if env is not None:
+                os.environ.clear()
+                os.environ.update(env)
+            result = command.main(args=argv, obj=state, prog_name='enheduanna', standalone_mode=False)
+            # Without standalone mode, exits (for example from --help) come back as the exit code
+            code = result if isinstance(result, int) else 0
+        except click.ClickException as e:
+            e.show()
+            code = e.exit_code
+        except click.Abort:
+            click.echo('Aborted!', err=True)
+            code = 1
+        except Exception: #pylint:disable=broad-exception-caught
+            # A failing command should not take the daemon down with it
+            print_exc()
+            code = 1
+        finally:
+            os.chdir(previous_cwd)
+            os.environ.clear()
+            os.environ.update(previous_env)
+    return code, stdout.getvalue(), stderr.getvalue()
+
+def request_error(request: dict) -> Union[str, None]:
+    '''
+    Check a request has an argument list, a working folder and an environment
+
+    request : Decoded request message
+
+    Returns a description of what is wrong, or None for a valid request
+    '''
+    argv = request.get('argv')
+    if not isinstance(argv, list) or not all(isinstance(arg, str) for arg in argv):
+        return 'argv must be a list of strings'
+    if not isinstance(request.get('cwd'), str):
+        return 'cwd must be a string'
+    env = request.get('env')
+    if not isinstance(env, dict) or not all(isinstance(value, str) for value in env.values()):
+        return 'env must be a mapping of strings'
+    return None
+
+def handle_request(command: click.Command, connection: socket.socket, state: ResidentState) -> None:
+    '''
+    Read a request from a client connection, run it, and send the result back
+
+    command : Click command or group to run
+    connection : Accepted client connection
+    state : Resident state to keep between commands
+    '''
+    request = read_message(connection)
+    if request is None:
+        return
+    error = request_error(request)
+    if error:
+        send_message(connection, {'code': 2, 'stdout': '', 'stderr': f'Invalid request: {error}\n'})
+        return
+    code, stdout, stderr = run_command(command, request['argv'], Path(request['cwd']), state, env=request['env'])
+    send_message(connection, {'code': code, 'stdout': stdout, 'stderr': stderr})
+
+def serve(command: click.Command, path: Path, state: ResidentState = None) -> None:
+    '''
+    Serve commands on a Unix domain socket until a stop is requested
+
+    Commands run one at a time, in the order they arrive, so they never write the same files at once.
+
+    command : Click command or group to run
+    path : Socket path
+    state : Resident state to keep between commands
+    '''
+    state = state or ResidentState()
+    if path.exists():
+        if is_running(path):
+            raise DaemonException(f'A daemon is already running on {path}')
+        # Left behind by a daemon that did not shut down cleanly
+        path.unlink()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        # Commands run with the daemon's permissions, so only its owner may connect. The socket
+        # is created with those permissions, leaving no gap before it could be changed.
+        previous_umask = os.umask(0o177)
+        try:
+            server.bind(str(path))
+        finally:
+            os.umask(previous_umask)
+        try:
+            server.listen()
+            while not state.stop_requested:
+                connection, _address = server.accept()
+                # A client that stops sending or reading must not hold up every later command
+                connection.settimeout(REQUEST_TIMEOUT)
+                with connection:
+                    try:
+                        handle_request(command, connection, state)
+                    except OSError as e:
+                        click.echo(f'Dropped connection: {e}', err=True)
+        finally:
+            path.unlink(missing_ok=True)
@@ -7,3 +7,18 @@ CONFIG_DEFAULT = Path.home() / '.enheduanna.yml'
 ENTRIES_DIR_DEFAULT = Path.home() / 'Notes'
 DOCUMENT_DIR_DEFAULT = Path.home() / 'Documents'
 DATE_OUTPUT_FORMAT_DEFAULT = '%Y-%m-%d'
+
+# Cache
+CACHE_DIR_DEFAULT = Path.home() / '.cache' / 'enheduanna'
+
+# Workspace index
+INDEX_PATH_DEFAULT = CACHE_DIR_DEFAULT / 'workspace.sqlite3'
+
+# Daemon
+SOCKET_PATH_DEFAULT = CACHE_DIR_DEFAULT / 'daemon.sock'
+
+# Config snapshot
+CONFIG_SNAPSHOT_DEFAULT = CACHE_DIR_DEFAULT / 'config.snapshot'
+
+# Media source indexes
+MEDIA_INDEX_DIR_DEFAULT = CACHE_DIR_DEFAULT / 'media'
@@ -2,7 +2,6 @@ from json import loads
 
 from pathlib import Path
 from pydantic.dataclasses import dataclass
-from pyaml_env import parse_config
 
 from enheduanna.types.config.collation import CollationConfig
 from enheduanna.types.config.file import FileConfig
@@ -21,6 +20,8 @@ def from_yaml(file_path: Path) -> Config:
     '''
     config = {}
     if file_path.exists():
+        # Only needed when there is no config snapshot to load
+        from pyaml_env import parse_config #pylint:disable=import-outside-toplevel
         config = parse_config(file_path)
         if isinstance(config, str):
             config = loads(config)
@@ -0,0 +1,14 @@
+from pathlib import Path
+
+from pydantic.dataclasses import dataclass
+
+from enheduanna.defaults import CACHE_DIR_DEFAULT
+
+@dataclass
+class CacheConfig:
+    '''
+    Parse cache config options
+    '''
+    enabled: bool = False
+    folder: Path = CACHE_DIR_DEFAULT
+    max_entries: int = 10000
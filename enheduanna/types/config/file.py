@@ -1,3 +1,5 @@
+from enum import Enum
+from functools import cached_property
 from pathlib import Path
 from typing import Self, List
 
@@ -8,6 +10,9 @@ from pydantic.dataclasses import dataclass
 from enheduanna.defaults import ENTRIES_DIR_DEFAULT, DOCUMENT_DIR_DEFAULT, DATE_OUTPUT_FORMAT_DEFAULT
 from enheduanna.types.markdown.markdown_section import MarkdownSection
 from enheduanna.types.markdown.collate_section import CollateSection
+from enheduanna.types.markdown.collation_plan import CollationPlan
+from enheduanna.types.config.cache import CacheConfig
+from enheduanna.types.config.index import IndexConfig
 from enheduanna.types.config.media import MediaConfig
 from enheduanna.types.config.toc import TocConfig
 
@@ -22,6 +27,21 @@ COLLATE_SECTIONS_DEFAULT = [
     CollateSection('Work Done', regex='\\((?P<ticket>[A-Za-z]+-[0-9]+)\\)', groupBy='ticket', level=2)
 ]
 
+class AggregatorUpdate(Enum):
+    '''
+    What to do when a section already appended to an aggregator has changed
+    '''
+    APPEND = 'append'
+    REPLACE = 'replace'
+
+class AggregatorSharding(Enum):
+    '''
+    How aggregator documents are split into shard files
+    '''
+    OFF = 'off'
+    YEAR = 'year'
+    SIZE = 'size'
+
 @dataclass
 class FileConfig:
     '''
@@ -30,11 +50,17 @@ class FileConfig:
     entries_folder: Path = ENTRIES_DIR_DEFAULT
     document_folder: Path = DOCUMENT_DIR_DEFAULT
     date_output_format: str = DATE_OUTPUT_FORMAT_DEFAULT
+    preserve_formatting: bool = False
+    aggregator_updates: AggregatorUpdate = AggregatorUpdate.APPEND
+    aggregator_sharding: AggregatorSharding = AggregatorSharding.OFF
+    aggregator_shard_size: int = 1_000_000
 
     entry_sections: List[MarkdownSection] = Field(default_factory=list)
     collate_sections: List[CollateSection] = Field(default_factory=list)
     media: MediaConfig = Field(default_factory=MediaConfig)
     toc: TocConfig = Field(default_factory=TocConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    index: IndexConfig = Field(default_factory=IndexConfig)
 
     @model_validator(mode='after')
     def validate_entry_sections(self) -> Self:
@@ -53,3 +79,13 @@ class FileConfig:
         if not self.collate_sections:
             self.collate_sections = COLLATE_SECTIONS_DEFAULT
         return self
+
+    @cached_property
+    def collation_plan(self) -> CollationPlan:
+        '''
+        Collate sections compiled for collation, built once per config
+        '''
+        # Ignore sections set automatically but not in collate
+        collate_titles = {collate_section.title for collate_section in self.collate_sections}
+        return CollationPlan(self.collate_sections,
+                             [section.title for section in self.entry_sections if section.title not in collate_titles])
@@ -0,0 +1,13 @@
+from pathlib import Path
+
+from pydantic.dataclasses import dataclass
+
+from enheduanna.defaults import INDEX_PATH_DEFAULT
+
+@dataclass
+class IndexConfig:
+    '''
+    Workspace index config options
+    '''
+    enabled: bool = False
+    path: Path = INDEX_PATH_DEFAULT
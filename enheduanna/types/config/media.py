@@ -4,6 +4,8 @@ from typing import List, Literal
 from pydantic import Field
 from pydantic.dataclasses import dataclass
 
+from enheduanna.defaults import MEDIA_INDEX_DIR_DEFAULT
+
 @dataclass
 class MediaSource:
     '''
@@ -12,6 +14,7 @@ class MediaSource:
     folder: Path
     operation: Literal["move", "copy"] = "copy"
     subfolder: str = "media"
+    workers: int = Field(default=4, ge=1)
 
 @dataclass
 class MediaConfig:
@@ -21,3 +24,6 @@ class MediaConfig:
     sources: List[MediaSource] = Field(default_factory=list)
     extensions: List[str] = Field(default_factory=lambda: [".png", ".jpg", ".jpeg", ".gif", ".webp"])
     enabled: bool = False
+    index: bool = False
+    index_folder: Path = MEDIA_INDEX_DIR_DEFAULT
+    store: bool = False
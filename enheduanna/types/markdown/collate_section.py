@@ -1,4 +1,6 @@
-from typing import Self
+from functools import cache, cached_property
+from re import Pattern, compile as compile_regex
+from typing import Self, Union
 
 from pydantic import TypeAdapter, model_validator
 from pydantic.dataclasses import dataclass
@@ -27,7 +29,28 @@ class CollateSection:
                 raise AssertionError('GroupBy field must be gathered in regex')
         return self
 
+    @cached_property
+    def pattern(self) -> Union[Pattern, None]:
+        '''
+        Compiled regex, built once so grouping does not look it up on every line
+        '''
+        return compile_regex(self.regex) if self.regex else None
+
+    @staticmethod
+    def from_json(data: Union[str, bytes]) -> 'CollateSection':
+        '''
+        Validate a collate section from json input
+
+        data : Json input
+        '''
+        return _json_adapter().validate_json(data)
+
     def __str__(self):
         return self.title
 
-CollateSection.from_json = TypeAdapter(CollateSection).validate_json
+@cache
+def _json_adapter() -> TypeAdapter:
+    '''
+    Json validator for collate sections, built on first use so importing this module stays cheap
+    '''
+    return TypeAdapter(CollateSection)
@@ -0,0 +1,65 @@
+from typing import Iterable, Tuple
+
+from enheduanna.types.markdown.collate_section import CollateSection
+
+
+class CollationPlan:
+    '''
+    Collate config compiled for lookups during collation
+
+    Matching a section is a single (title, level) lookup instead of a scan of
+    every collate section, and the ignored titles are kept in a frozen set.
+
+    collate_sections : Collate sections, in config order
+    ignore_sections : Section titles skipped during collation
+    '''
+    __slots__ = ('collate_sections', 'ignore_sections', '_lookup', '_indexes', '_title_indexes')
+
+    def __init__(self, collate_sections: Iterable[CollateSection], ignore_sections: Iterable[str] = ()):
+        self.collate_sections = tuple(collate_sections)
+        self.ignore_sections = frozenset(ignore_sections)
+        lookup = {}
+        self._indexes = {}
+        self._title_indexes = {}
+        for count, collate_section in enumerate(self.collate_sections):
+            lookup.setdefault((collate_section.title, collate_section.level), []).append(collate_section)
+            self._indexes[id(collate_section)] = count
+            self._title_indexes.setdefault(collate_section.title, count)
+        self._lookup = {key: tuple(value) for key, value in lookup.items()}
+
+    def match(self, section) -> Tuple[CollateSection, ...]:
+        '''
+        Collate sections matching a section's title and level, in config order
+
+        section : MarkdownSection to match
+        '''
+        return self._lookup.get((section.title, section.level), ())
+
+    def match_title(self, title: str) -> Tuple[CollateSection, ...]:
+        '''
+        Collate sections matching a title at the level it is first configured with, in config order
+
+        Summaries write every combined section at level 2, so their sections are matched by title alone.
+
+        title : Section title
+        '''
+        index = self._title_indexes.get(title)
+        if index is None:
+            return ()
+        return self._lookup[(title, self.collate_sections[index].level)]
+
+    def index(self, collate_section: CollateSection) -> int:
+        '''
+        Position of a collate section in the config
+
+        collate_section : Collate section from this plan
+        '''
+        return self._indexes[id(collate_section)]
+
+    def title_index(self, title: str) -> int:
+        '''
+        Position of the first collate section with a title
+
+        title : Collate section title
+        '''
+        return self._title_indexes[title]
@@ -1,3 +1,6 @@
+from typing import Self
+
+from pydantic import model_validator
 from pydantic.dataclasses import dataclass
 
 from enheduanna.types.markdown.markdown_section import MarkdownSection
@@ -10,6 +13,17 @@ class DocumentSection:
     base_title : Section title without the date prefix, used to match an
                  existing aggregator file in the document folder
     root : Root MarkdownSection titled "<date> <base_title>"
+    entry_title : Root title of the source entry, taken from the root title if not set
     '''
     base_title: str
     root: MarkdownSection
+    entry_title: str = None
+
+    @model_validator(mode='after')
+    def validate_entry_title(self) -> Self:
+        '''
+        Default the entry title to the date prefix of the root title
+        '''
+        if self.entry_title is None:
+            self.entry_title = self.root.title.removesuffix(f' {self.base_title}')
+        return self
@@ -1,9 +1,9 @@
 from pathlib import Path
-from typing import List
 
 from pydantic.dataclasses import dataclass
 
 from enheduanna.types.markdown.markdown_section import MarkdownSection
+from enheduanna.types.markdown.source_span import SourceSpan
 
 @dataclass
 class MarkdownFile:
@@ -17,7 +17,8 @@ class MarkdownFile:
         '''
         Write latest root section to file
         '''
-        self.file_path.write_text(self.root_section.write())
+        with self.file_path.open('w') as stream:
+            self.root_section.write_to(stream)
 
     def __str__(self) -> str:
         '''
@@ -42,58 +43,85 @@ def find_header(line_input: str) -> int:
         return 0
     return level
 
-def generate_markdown_sections(markdown_text: str, current_tab: int = 1) -> List[MarkdownSection]:
+def _close_section(frame: list, source: str = None, end: int = 0) -> MarkdownSection:
+    '''
+    Build the MarkdownSection for a finished parse frame
+
+    frame : [title, level, body lines, child sections, start offset, head end offset, tainted]
+    source : Source text, when parsing in lossless mode
+    end : Offset in the source where the section ends
+    '''
+    title, level, lines, children, start, head_end, tainted = frame
+    section = MarkdownSection(title, '\n'.join(lines), level=level)
+    for child in children:
+        section.add_section(child)
+    if source is not None and not tainted:
+        section.span = SourceSpan(source, start, end if head_end is None else head_end, end,
+                                  section.title, section.contents, section.level, tuple(children))
+    return section
+
+def generate_markdown_sections(markdown_text: str, current_tab: int = 1, lossless: bool = False) -> MarkdownSection:
     '''
     Generate markdown section data from string
 
-    markdown_data : Markdown data input
-    current_tab : Keep track of tab number for recursive runs
+    Walks the text once, keeping a stack of open sections. A heading opens a new
+    section when it is exactly one level below an open section, closing anything
+    nested deeper; any other line (including headings that do not fit the tree)
+    is body text of the innermost open section. Blank lines are dropped.
+
+    markdown_text : Markdown data input
+    current_tab : Heading level of the root section
+    lossless : Record where each section sits in the text, so unmodified
+               sections are written back exactly as they were read
     '''
-    per_line = markdown_text.split('\n')
-    title = None
-    contents = ''
-    subsection_contents = ''
-    sections = []
-    hit_sub_section = False
-    for line in per_line:
+    source = markdown_text if lossless else None
+    # Each frame is [title, level, body lines, child sections, start offset, head end offset, tainted];
+    # sections are only built once closed, since the root title may not be known until later
+    stack = [[None, current_tab, [], [], 0, None, False]]
+    offset = 0
+    for line in markdown_text.split('\n'):
+        line_start = offset
+        offset += len(line) + 1
         # Skip blank lines
         if not line:
             continue
         header_result = find_header(line)
-        # If title not set, set that
-        if header_result == current_tab and not title:
-            title = line.lstrip().lstrip('#').lstrip()
+        # Root title is the first heading at the root level
+        if header_result == current_tab and not stack[0][0]:
+            stack[0][0] = line.lstrip().lstrip('#').lstrip()
+            # A late root title sits inside the text of the open subsections, so
+            # none of them can be written back from the source as-is
+            if len(stack) > 1:
+                for frame in stack:
+                    frame[6] = True
+            continue
+        depth = header_result - current_tab
+        if 0 < depth <= len(stack):
+            # Close everything at or below the new section's depth
+            while len(stack) > depth:
+                closed = _close_section(stack.pop(), source, line_start)
+                stack[-1][3].append(closed)
+            if stack[-1][5] is None:
+                stack[-1][5] = line_start
+            stack.append([line.lstrip().lstrip('#').lstrip(), header_result, [], [], line_start, None, False])
             continue
-        # If we hit the next level in
-        if header_result == current_tab + 1:
-            # Mark were in the next level, if we have subsections, assume we generate now
-            hit_sub_section = True
-            if subsection_contents:
-                sections.append(generate_markdown_sections(subsection_contents, current_tab=current_tab+1))
-                subsection_contents = f'{line}\n'
-                hit_sub_section = True
-                continue
-        # Add to subsection or current contents
-        if hit_sub_section:
-            subsection_contents = f'{subsection_contents}{line}\n'
-        else:
-            contents = f'{contents}{line}\n'
-
-    # We probably ended in a subsection
-    if subsection_contents:
-        sections.append(generate_markdown_sections(subsection_contents, current_tab=current_tab+1))
-    ms = MarkdownSection(title, contents.rstrip('\n'), level=current_tab)
-    for section in sections:
-        ms.add_section(section)
-    return ms
-
-def from_file(file_path: Path) -> MarkdownFile:
+        stack[-1][2].append(line)
+    while len(stack) > 1:
+        closed = _close_section(stack.pop(), source, len(markdown_text))
+        stack[-1][3].append(closed)
+    return _close_section(stack[0], source, len(markdown_text))
+
+def from_file(file_path: Path, lossless: bool = False, cache=None) -> MarkdownFile:
     '''
     Generate Markdown file from file path
 
     file_path : New file path
+    lossless : Keep source offsets so unmodified sections are written back as they were read
+    cache : Optional ParseCache to reuse parsed trees from, not used in lossless mode
     '''
-    root_section = generate_markdown_sections(file_path.read_text())
+    if cache is not None and not lossless:
+        return MarkdownFile(file_path, cache.load(file_path))
+    root_section = generate_markdown_sections(file_path.read_text(), lossless=lossless)
     return MarkdownFile(file_path, root_section)
 
 MarkdownFile.from_file = from_file
@@ -1,32 +1,108 @@
 from copy import deepcopy
+from functools import cache
 from re import search
-from typing import Self, Union
+from typing import Any, Iterator, Optional, Self, TextIO, Tuple, Union
 
-from pydantic import Field
+from pydantic import ConfigDict, Field, GetCoreSchemaHandler, ValidatorFunctionWrapHandler
 from pydantic import TypeAdapter
 from pydantic.dataclasses import dataclass
+from pydantic_core import CoreSchema, core_schema
 
 from enheduanna.types.markdown.collate_section import CollateSection
+from enheduanna.types.markdown.section_list import SectionList
+from enheduanna.types.markdown.source_span import SourceSpan
 
 ALPHANUMERIC_REGEX = r'[a-zA-Z0-9]'
 
+def _separator(previous: str, previous_origin: Optional[tuple], origin: Optional[tuple]) -> str:
+    '''
+    Separator to write before a subsection heading
+
+    Rendered output always gets one blank line. After original source text, only
+    add what is missing for a blank line, and nothing at all when the next chunk
+    directly followed it in the same source.
+
+    previous : Last chunk written
+    previous_origin : (source, start, end) of the last chunk, or None if rendered
+    origin : (source, start, end) of the next chunk, or None if rendered
+    '''
+    if previous_origin is None:
+        return '\n'
+    if origin is not None and origin[0] is previous_origin[0] and origin[1] == previous_origin[2]:
+        return ''
+    if previous.endswith('\n\n'):
+        return ''
+    if previous.endswith('\n'):
+        return '\n'
+    return '\n\n'
+
 class MarkdownException(Exception):
     '''
     Generic class for exception errors
     '''
 
 @dataclass
-class MarkdownSection:
+class MarkdownSectionFields:
     '''
-    Markdown Sections for writing
+    Validation schema for MarkdownSection input
     '''
     title: str
     contents: str
     level: int = Field(default=1)
-    sections: list[Self] = Field(default_factory=list)
+    sections: list['MarkdownSection'] = Field(default_factory=list)
     rollover: bool = False
     auto_generate: bool = True
 
+class MarkdownSection:
+    '''
+    Markdown Sections for writing
+
+    A plain node with __slots__, so parsing and collation do not pay for
+    validation or per-instance dicts. Validation only happens where user input
+    enters: config entry sections and from_json.
+    '''
+    __slots__ = ('title', 'contents', 'level', 'sections', 'rollover', 'auto_generate', 'span')
+
+    def __init__(self, title: str, contents: str, level: int = 1, sections: list[Self] = None,
+                 rollover: bool = False, auto_generate: bool = True, span: Optional[SourceSpan] = None):
+        self.title = title
+        self.contents = contents
+        self.level = level
+        # Keep subsections in an indexed list so title lookups are constant time
+        self.sections = SectionList(sections or ())
+        self.rollover = rollover
+        self.auto_generate = auto_generate
+        self.span = span
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, _source: Any, handler: GetCoreSchemaHandler) -> CoreSchema:
+        '''
+        Validate sections from config or json input, passing existing sections through
+        '''
+        def validate(value: Any, inner: ValidatorFunctionWrapHandler) -> Self:
+            if isinstance(value, cls):
+                return value
+            fields = inner(value)
+            return cls(fields.title, fields.contents, level=fields.level, sections=fields.sections,
+                       rollover=fields.rollover, auto_generate=fields.auto_generate)
+
+        return core_schema.no_info_wrap_validator_function(
+            validate, handler.generate_schema(MarkdownSectionFields),
+            serialization=core_schema.plain_serializer_function_ser_schema(cls.to_dict))
+
+    def to_dict(self) -> dict:
+        '''
+        Get section and subsections as plain dicts
+        '''
+        return {
+            'title': self.title,
+            'contents': self.contents,
+            'level': self.level,
+            'sections': [section.to_dict() for section in self.sections],
+            'rollover': self.rollover,
+            'auto_generate': self.auto_generate,
+        }
+
     def is_empty(self) -> bool:
         '''
         Check if contents are empty of effectively empty
@@ -40,31 +116,30 @@ class MarkdownSection:
 
         section : MarkdownSection
         '''
-        TypeAdapter(MarkdownSection).validate_python(section)
         # Check if section level valid
         if self.level > section.level:
             raise MarkdownException('Cannot add section, has a lower level than this one')
         # Check if section name already exists
-        for existing_section in self.sections:
-            if section.title == existing_section.title:
-                raise MarkdownException(f'Cannot add section, a section with title "{existing_section.title}" already exists')
+        if self.sections.has_title(section.title):
+            raise MarkdownException(f'Cannot add section, a section with title "{section.title}" already exists')
         self.sections.append(section)
         return True
 
+    def get_section(self, title: str) -> Union[Self, None]:
+        '''
+        Get section with title
+
+        title: Title of section to find
+        '''
+        return self.sections.find(title)
+
     def remove_section(self, title: str) -> Union[Self, None]:
         '''
         Remove section with title
 
         title: Title of section to remove
         '''
-        index = None
-        for (count, section) in enumerate(self.sections):
-            if section.title == title:
-                index = count
-                break
-        if index is None:
-            return None
-        return self.sections.pop(index)
+        return self.sections.remove_title(title)
 
     def set_section_levels(self, level: int) -> bool:
         '''
@@ -91,16 +166,25 @@ class MarkdownSection:
         '''
         Merge this section with another one
 
+        Matching subsections are merged and removed from new_section, and the
+        remaining subsections of new_section are added to this one.
+
         new_section : New section to merge with
         '''
         if new_section.title == self.title and new_section.level == self.level:
             self.contents = f'{self.contents}\n{new_section.contents}\n'
-        # First see if any of our sub-sections are in the new one, remove and add
+        # First see if any of our sub-sections are in the new one, merge those
+        matched = []
+        occurrences = {}
         for section in self.sections:
-            result = new_section.remove_section(section.title)
-            if not result:
+            occurrence = occurrences.get(section.title, 0)
+            result = new_section.sections.find(section.title, occurrence)
+            if result is None:
                 continue
+            occurrences[section.title] = occurrence + 1
+            matched.append(result)
             section.merge(result)
+        new_section.sections.remove_all(matched)
         # Then add remaining sections to this one
         for section in new_section.sections:
             self.add_section(section)
@@ -117,43 +201,117 @@ class MarkdownSection:
             return False
         matching = {}
         non_matching = []
+        pattern = collate_section.pattern
         for item in self.contents.split('\n'):
             if not item:
                 continue
-            if collate_section.regex:
-                matcher = search(collate_section.regex, item)
+            if pattern:
+                matcher = pattern.search(item)
                 if matcher:
-                    key = matcher.group(collate_section.groupBy)
-                    matching.setdefault(key, [])
-                    matching[key].append(item)
+                    matching.setdefault(matcher.group(collate_section.groupBy), []).append(item)
                     continue
             non_matching.append(item)
-        new_contents = ''
-        for _key, value in matching.items():
-            for item in value:
-                new_contents = f'{new_contents}{item}\n'
-            new_contents = f'{new_contents}\n'
-        for item in non_matching:
-            new_contents = f'{new_contents}{item}\n'
-        new_contents = new_contents.rstrip()
+        # Each group is followed by a blank line, then the unmatched lines
+        parts = ['\n'.join(value) + '\n\n' for value in matching.values()]
+        parts.append('\n'.join(non_matching))
+        new_contents = ''.join(parts).rstrip()
         self.contents = new_contents
         for section in self.sections:
             section.group_contents(collate_section, force_grouping=True)
         return True
 
+    def _collect_clean(self, clean: set) -> bool:
+        '''
+        Collect ids of sections that are unchanged since parsing, including all subsections
+
+        clean : Set of section ids, updated in place
+        '''
+        children_clean = True
+        for section in self.sections:
+            children_clean = section._collect_clean(clean) and children_clean #pylint:disable=protected-access
+        if children_clean and self.span is not None and self.span.matches(self):
+            clean.add(id(self))
+            return True
+        return False
+
+    def _iter_chunks(self, clean: set) -> Iterator[Tuple[Union[str, None], Optional[tuple]]]:
+        '''
+        Yield (text, origin) chunks of markdown output, where origin is the
+        (source, start, end) the text was copied from or None if it was rendered.
+        None text marks where a separator goes before each subsection.
+
+        clean : Ids of sections that can be written from their source text
+        '''
+        span = self.span
+        if id(self) in clean:
+            yield span.text(), (span.source, span.start, span.end)
+            return
+        if span is not None and span.head_matches(self):
+            yield span.head(), (span.source, span.start, span.head_end)
+        else:
+            yield f'{"#" * self.level} {self.title}\n', None
+            if self.contents:
+                yield f'\n{self.contents}\n', None
+        for section in self.sections:
+            yield None, None
+            yield from section._iter_chunks(clean) #pylint:disable=protected-access
+
+    def _output(self) -> Iterator[str]:
+        '''
+        Yield markdown output chunks in order
+
+        Sections parsed in lossless mode that are unchanged are written back
+        exactly as they were read.
+        '''
+        clean = set()
+        self._collect_clean(clean)
+        last_chunk = ''
+        last_origin = None
+        pending_separator = False
+        for chunk, origin in self._iter_chunks(clean):
+            if chunk is None:
+                pending_separator = True
+                continue
+            if pending_separator:
+                yield _separator(last_chunk, last_origin, origin)
+                pending_separator = False
+            yield chunk
+            last_chunk = chunk
+            last_origin = origin
+
+    def write_to(self, stream: TextIO) -> None:
+        '''
+        Write markdown output to an open text stream, one chunk at a time
+
+        stream : Open file or other text stream
+        '''
+        for chunk in self._output():
+            stream.write(chunk)
+
     def write(self) -> str:
         '''
         Get markdown output as string
         '''
-        prefix = '#' * self.level
-        out = f'{prefix} {self.title}\n'
-        if self.contents:
-            out = f'{out}\n{self.contents}\n'
-        for section in self.sections:
-            out = f'{out}\n{section.write()}'
-        return out
+        return ''.join(self._output())
+
+    @staticmethod
+    def from_json(data: Union[str, bytes]) -> 'MarkdownSection':
+        '''
+        Validate a section and its subsections from json input
+
+        data : Json input
+        '''
+        return _json_adapter().validate_json(data)
 
     def __str__(self):
         return self.title
 
-MarkdownSection.from_json = TypeAdapter(MarkdownSection).validate_json
+    def __repr__(self):
+        return f'MarkdownSection(title={self.title!r}, level={self.level}, sections={len(self.sections)})'
+
+@cache
+def _json_adapter() -> TypeAdapter:
+    '''
+    Json validator for sections, built on first use so importing this module stays cheap
+    '''
+    return TypeAdapter(MarkdownSection, config=ConfigDict(title='MarkdownSection'))
@@ -0,0 +1,152 @@
+from itertools import compress, count, repeat
+from operator import is_
+from typing import Iterable, Union
+
+
+class SectionList(list):
+    '''
+    List of subsections that keeps an ordered title index in sync with its contents
+
+    Behaves like a normal list, but every mutation also updates a title -> sections
+    index so title lookups do not need to scan the list. Removing a section still
+    deletes it from the underlying list, so removal is linear in the number of
+    sections. Section titles must not change while the section is in the list.
+    '''
+    __slots__ = ('_index',)
+
+    def __init__(self, sections: Iterable = ()):
+        super().__init__(sections)
+        self._index = {}
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        '''
+        Rebuild the title index from the list contents
+        '''
+        self._index = {}
+        for section in self:
+            self._index.setdefault(section.title, []).append(section)
+
+    def _index_remove(self, section) -> None:
+        '''
+        Drop a single section from the title index
+
+        section : Section leaving the list
+        '''
+        bucket = self._index[section.title]
+        for (position, existing) in enumerate(bucket):
+            if existing is section:
+                del bucket[position]
+                break
+        if not bucket:
+            del self._index[section.title]
+
+    def _position(self, section) -> int:
+        '''
+        Position of a section in the list, matched by identity
+
+        section : Section to find
+        '''
+        # Compare by identity without a python level loop over the list
+        position = next(compress(count(), map(is_, self, repeat(section))), None)
+        if position is None:
+            raise ValueError(f'Section "{section.title}" not in list')
+        return position
+
+    def has_title(self, title: str) -> bool:
+        '''
+        Check if a section with the title exists
+
+        title : Section title
+        '''
+        return title in self._index
+
+    def find(self, title: str, occurrence: int = 0):
+        '''
+        Find a section by title
+
+        title : Section title
+        occurrence : Which of several same-titled sections to return, in list order
+
+        Returns the section, or None if there is no such section
+        '''
+        bucket = self._index.get(title)
+        if not bucket or occurrence >= len(bucket):
+            return None
+        return bucket[occurrence]
+
+    def remove_title(self, title: str):
+        '''
+        Remove and return the first section with the title
+
+        title : Section title
+
+        Returns the removed section, or None if there is no such section
+        '''
+        section = self.find(title)
+        if section is None:
+            return None
+        super().__delitem__(self._position(section))
+        self._index_remove(section)
+        return section
+
+    def remove_all(self, sections: Iterable) -> None:
+        '''
+        Remove several sections in a single pass
+
+        sections : Sections to remove, matched by identity
+        '''
+        remove_ids = {id(section) for section in sections}
+        if not remove_ids:
+            return
+        self[:] = [section for section in self if id(section) not in remove_ids]
+
+    def append(self, section) -> None:
+        super().append(section)
+        self._index.setdefault(section.title, []).append(section)
+
+    def extend(self, sections: Iterable) -> None:
+        for section in sections:
+            self.append(section)
+
+    def __iadd__(self, sections: Iterable) -> 'SectionList':
+        self.extend(sections)
+        return self
+
+    def insert(self, index: int, section) -> None:
+        super().insert(index, section)
+        # Keep same-titled sections in list order
+        self._index[section.title] = [existing for existing in self if existing.title == section.title]
+
+    def pop(self, index: int = -1):
+        section = super().pop(index)
+        self._index_remove(section)
+        return section
+
+    def remove(self, section) -> None:
+        super().__delitem__(self._position(section))
+        self._index_remove(section)
+
+    def clear(self) -> None:
+        super().clear()
+        self._index = {}
+
+    def __setitem__(self, index: Union[int, slice], value) -> None:
+        super().__setitem__(index, value)
+        self._rebuild_index()
+
+    def __delitem__(self, index: Union[int, slice]) -> None:
+        super().__delitem__(index)
+        self._rebuild_index()
+
+    def sort(self, *args, **kwargs) -> None:
+        super().sort(*args, **kwargs)
+        self._rebuild_index()
+
+    def reverse(self) -> None:
+        super().reverse()
+        self._rebuild_index()
+
+    def __reduce_ex__(self, protocol):
+        # Copy and pickle as the plain list of sections; the index is rebuilt on load
+        return (self.__class__, (list(self),))
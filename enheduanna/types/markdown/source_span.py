@@ -0,0 +1,54 @@
+class SourceSpan:
+    '''
+    Location of a parsed section within its source text, used to write
+    unmodified sections back exactly as they were read
+
+    source : Full source text the section was parsed from
+    start : Offset of the section's heading line
+    head_end : Offset where the first subsection starts (end of heading and body)
+    end : Offset where the section and all of its subsections end
+    title/contents/level : Values the section was parsed with
+    sections : Subsections the section was parsed with
+    '''
+    __slots__ = ('source', 'start', 'head_end', 'end', 'title', 'contents', 'level', 'sections')
+
+    def __init__(self, source: str, start: int, head_end: int, end: int,
+                 title: str, contents: str, level: int, sections: tuple):
+        self.source = source
+        self.start = start
+        self.head_end = head_end
+        self.end = end
+        self.title = title
+        self.contents = contents
+        self.level = level
+        self.sections = sections
+
+    def head_matches(self, section) -> bool:
+        '''
+        Check the section heading and body are unchanged since parsing
+
+        section : MarkdownSection this span belongs to
+        '''
+        return section.title == self.title and section.contents == self.contents and section.level == self.level
+
+    def matches(self, section) -> bool:
+        '''
+        Check the section heading, body and list of subsections are unchanged since parsing
+
+        section : MarkdownSection this span belongs to
+        '''
+        if not self.head_matches(section) or len(section.sections) != len(self.sections):
+            return False
+        return all(new is old for new, old in zip(section.sections, self.sections))
+
+    def head(self) -> str:
+        '''
+        Original text of the heading and body
+        '''
+        return self.source[self.start:self.head_end]
+
+    def text(self) -> str:
+        '''
+        Original text of the section and all of its subsections
+        '''
+        return self.source[self.start:self.end]
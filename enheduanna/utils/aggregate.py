@@ -0,0 +1,416 @@
+from collections import ChainMap, OrderedDict
+from datetime import datetime
+from hashlib import sha256
+from json import dumps, loads
+from pathlib import Path
+from secrets import token_hex
+from typing import List, Tuple, Union
+from urllib.parse import quote
+import os
+
+from enheduanna.defaults import DATE_OUTPUT_FORMAT_DEFAULT
+from enheduanna.types.config.file import AggregatorSharding
+from enheduanna.types.markdown.document_section import DocumentSection
+from enheduanna.types.markdown.markdown_file import find_header, generate_markdown_sections
+from enheduanna.types.markdown.markdown_section import MarkdownException, MarkdownSection
+from enheduanna.utils.write_plan import WritePlan
+
+# Bump when the index layout or the way sections are fingerprinted changes
+AGGREGATE_INDEX_VERSION = 1
+# Section of a sharded aggregator that links to its shards
+SHARD_INDEX_TITLE = 'Shards'
+
+def root_title(head: str) -> Union[str, None]:
+    '''
+    Title of markdown text that opens with a level 1 heading
+
+    head : Start of the markdown text
+
+    Returns the title, or None if the text does not open with a titled level 1 heading
+    '''
+    for line in head.split('\n'):
+        if line.strip():
+            title = line.lstrip().lstrip('#').strip()
+            return title if find_header(line) == 1 and title else None
+    return None
+
+def append_separator(tail: str) -> str:
+    '''
+    Text needed after existing text to leave one blank line before a new section,
+    the same as the lossless writer leaves
+
+    tail : Last characters of the existing text
+    '''
+    if tail.endswith('\n\n'):
+        return ''
+    if tail.endswith('\n'):
+        return '\n'
+    return '\n\n'
+
+def section_fingerprint(section: MarkdownSection) -> str:
+    '''
+    Content hash of a section as it is written to an aggregator
+
+    section : Section to hash
+    '''
+    return sha256(section.write().encode('utf-8')).hexdigest()
+
+def section_spans(text: str) -> List[Tuple[str, int, int]]:
+    '''
+    Find the level 2 sections of an aggregator without building its section tree
+
+    Aggregators can hold several sections with the same title, which the parser rejects,
+    so sections are located by their heading lines instead.
+
+    text : Aggregator text
+
+    Returns list of (title, start offset, end offset), in order
+    '''
+    spans = []
+    offset = 0
+    for line in text.split('\n'):
+        if find_header(line) == 2:
+            if spans:
+                spans[-1][2] = offset
+            spans.append([line.lstrip().lstrip('#').lstrip(), offset, len(text)])
+        offset += len(line) + 1
+    return [tuple(span) for span in spans]
+
+def splice_section(text: str, span: Tuple[str, int, int], section: MarkdownSection) -> str:
+    '''
+    Replace the text of one section, leaving the rest of the text as-is
+
+    text : Aggregator text
+    span : (title, start, end) of the section to replace, from section_spans
+    section : New section
+    '''
+    _title, start, end = span
+    return text[:start] + section.write() + ('\n' if end < len(text) else '') + text[end:]
+
+class _IndexFile:
+    '''
+    Records read from an aggregator index file, and how far into the file they were read
+    '''
+    def __init__(self, header: bytes = b''):
+        self.header = header
+        self.offset = 0
+        self.valid = False
+        self.size = None
+        self.records = {}
+
+    def feed(self, text: str) -> None:
+        '''
+        Read complete lines of the index file, the latest record for an entry winning
+        '''
+        for line in text.splitlines():
+            try:
+                value = loads(line)
+            except ValueError:
+                value = None
+            if isinstance(value, dict):
+                # The header opens the file, so records are only trusted after a matching one
+                self.valid = value.get('version') == AGGREGATE_INDEX_VERSION
+                self.size = value.get('size')
+            elif self.valid and isinstance(value, list) and len(value) == 4:
+                entry, base, digest, self.size = value
+                self.records[(entry, base)] = digest
+            else:
+                self.valid = False
+
+    def overlay(self) -> '_IndexFile':
+        '''
+        Copy to add staged records to, sharing the records read so far
+        '''
+        view = _IndexFile(self.header)
+        view.valid = self.valid
+        view.size = self.size
+        view.records = ChainMap({}, self.records)
+        return view
+
+# Index files known to this process by path. Each rewrite gets a header with a new id, so while
+# the header on disk is the same the file has only been appended to, and is read from where it was left
+_INDEX_FILES: 'OrderedDict[Path, _IndexFile]' = OrderedDict()
+# Index files kept, least recently used first out, so a long running daemon does not keep them all
+INDEX_FILES_MAX = 64
+
+def _remember(path: Path, index_file: _IndexFile) -> _IndexFile:
+    '''
+    Keep an index file as the most recently used, dropping the least recently used past INDEX_FILES_MAX
+    '''
+    _INDEX_FILES[path] = index_file
+    _INDEX_FILES.move_to_end(path)
+    while len(_INDEX_FILES) > INDEX_FILES_MAX:
+        _INDEX_FILES.popitem(last=False)
+    return index_file
+
+def _read_index_file(path: Path) -> _IndexFile:
+    '''
+    Records of an index file as it is on disk, reading only what was added since the last read
+    '''
+    try:
+        stream = path.open('rb')
+    except FileNotFoundError:
+        return _IndexFile()
+    with stream:
+        header = stream.readline()
+        size = os.fstat(stream.fileno()).st_size
+        index_file = _INDEX_FILES.get(path)
+        if index_file is None or index_file.header != header or index_file.offset > size:
+            index_file = _IndexFile(header)
+        _remember(path, index_file)
+        stream.seek(index_file.offset)
+        data = stream.read()
+    # Leave a partly written last line for the next read
+    data = data[:data.rfind(b'\n') + 1]
+    index_file.feed(data.decode('utf-8', errors='replace'))
+    index_file.offset += len(data)
+    return index_file
+
+class AggregateIndex:
+    '''
+    Fingerprints of the dated sections appended to an aggregator document
+
+    The index is kept next to the aggregator as a hidden json lines file. It opens with a
+    header holding the index version, followed by one [entry title, base title, content hash,
+    aggregator size] record per appended section. Records are only ever appended, the latest
+    one for an entry winning, and a file that only grew since this process last read it is
+    read from where it was left, so the cost of an append does not depend on the size of the
+    aggregator. When the aggregator size no longer matches the last record, because it was
+    edited outside of collate, the index is rebuilt from the aggregator text once.
+
+    aggregate_path : Aggregator document path
+    base_title : Section title the aggregator collects
+    '''
+    def __init__(self, aggregate_path: Path, base_title: str):
+        self.path = aggregate_path.with_name(f'.{aggregate_path.stem}.index.jsonl')
+        self.aggregate_path = aggregate_path
+        self.base_title = base_title
+        self.sections = {}
+        self._pending = []
+        self._rewrite = False
+
+    @classmethod
+    def load(cls, aggregate_path: Path, base_title: str, write_plan: WritePlan) -> 'AggregateIndex':
+        '''
+        Load the index of an aggregator, rebuilding it if it is missing or out of date
+
+        aggregate_path : Aggregator document path
+        base_title : Section title the aggregator collects
+        write_plan : Write plan the aggregator and index are staged with
+        '''
+        index = cls(aggregate_path, base_title)
+        appended = write_plan.appended(index.path)
+        if appended is None:
+            index_file = _IndexFile()
+            index_file.feed(write_plan.read(index.path))
+        else:
+            index_file = _read_index_file(index.path).overlay()
+            index_file.feed(appended)
+        if index_file.valid and index_file.size == write_plan.size(aggregate_path):
+            index.sections = index_file.records
+        else:
+            index.rebuild(write_plan.read(aggregate_path))
+        return index
+
+    def rebuild(self, text: str) -> None:
+        '''
+        Fingerprint every section of the aggregator titled "<entry title> <base title>"
+
+        text : Aggregator text
+        '''
+        suffix = f' {self.base_title}'
+        self.sections = {}
+        self._pending = []
+        self._rewrite = True
+        for title, start, end in section_spans(text):
+            if not title.endswith(suffix):
+                continue
+            try:
+                section = generate_markdown_sections(text[start:end], current_tab=2)
+            except MarkdownException:
+                # Hand-written sections that do not parse can never match a collated one
+                continue
+            self.sections[(title.removesuffix(suffix), self.base_title)] = section_fingerprint(section)
+
+    def find(self, entry_title: str) -> Union[str, None]:
+        '''
+        Content hash of the latest section appended from an entry
+
+        entry_title : Root title of the source entry
+
+        Returns the hash, or None if no section from the entry was appended
+        '''
+        return self.sections.get((entry_title, self.base_title))
+
+    def record(self, entry_title: str, digest: str) -> None:
+        '''
+        Record a section written to the aggregator, either added or replacing the latest one from the entry
+
+        entry_title : Root title of the source entry
+        digest : Content hash of the section
+        '''
+        self.sections[(entry_title, self.base_title)] = digest
+        self._pending.append((entry_title, self.base_title))
+
+    def save(self, write_plan: WritePlan) -> None:
+        '''
+        Stage new records, along with the size the aggregator will have once the plan is committed
+
+        write_plan : Write plan the aggregator is staged with
+        '''
+        size = write_plan.size(self.aggregate_path)
+        keys = self.sections if self._rewrite else self._pending
+        lines = [dumps([entry, base, self.sections[(entry, base)], size], separators=(',', ':')) + '\n'
+                 for entry, base in keys]
+        if self._rewrite:
+            header = dumps({'version': AGGREGATE_INDEX_VERSION, 'id': token_hex(8), 'size': size},
+                           separators=(',', ':')) + '\n'
+            text = header + ''.join(lines)
+            write_plan.stage_text(self.path, text)
+            # Known in full already, so the next load after the plan is committed reads nothing
+            index_file = _remember(self.path, _IndexFile(header.encode('utf-8')))
+            index_file.feed(text)
+            index_file.offset = len(text.encode('utf-8'))
+        elif lines:
+            write_plan.stage_append(self.path, ''.join(lines))
+        self._pending = []
+        self._rewrite = False
+
+def shard_folder(aggregate_path: Path) -> Path:
+    '''
+    Folder holding the shards of an aggregator, named after it without the extension
+
+    aggregate_path : Aggregator document path
+    '''
+    return aggregate_path.with_suffix('')
+
+def list_shards(aggregate_path: Path, write_plan: WritePlan) -> List[Path]:
+    '''
+    Shards of an aggregator, newest first
+
+    aggregate_path : Aggregator document path
+    write_plan : Write plan shards are staged with
+    '''
+    return sorted(write_plan.list_markdown(shard_folder(aggregate_path)), key=lambda path: path.stem, reverse=True)
+
+def _entry_year(entry_title: str, date_format: str) -> str:
+    '''
+    Year of an entry from the date its title starts with, or the current year if it has none
+    '''
+    words = entry_title.split(' ')
+    # Date formats can hold spaces, so try the longest run of leading words first
+    for count in range(len(words), 0, -1):
+        try:
+            return str(datetime.strptime(' '.join(words[:count]), date_format).year)
+        except ValueError:
+            continue
+    return str(datetime.now().year)
+
+def update_shard_index(aggregate_path: Path, write_plan: WritePlan) -> None:
+    '''
+    Point the shards section of an aggregator at every shard, newest first
+
+    aggregate_path : Aggregator document path, kept as the index of its shards
+    write_plan : Write plan shards are staged with
+    '''
+    links = [f'- [{shard.stem}](./{quote(shard.relative_to(aggregate_path.parent).as_posix())})'
+             for shard in list_shards(aggregate_path, write_plan)]
+    section = MarkdownSection(SHARD_INDEX_TITLE, '\n'.join(links), level=2)
+    text = write_plan.read(aggregate_path)
+    spans = [span for span in section_spans(text) if span[0] == SHARD_INDEX_TITLE]
+    if spans:
+        text = splice_section(text, spans[-1], section)
+    else:
+        text = text + append_separator(text[-2:]) + section.write()
+    write_plan.stage_text(aggregate_path, text)
+
+def _stage_shard(shard_path: Path, base_title: str, chunks: List[str], write_plan: WritePlan) -> None:
+    '''
+    Stage a new shard holding the given section texts, along with its fingerprint index
+    '''
+    text = '\n'.join([f'# {base_title} {shard_path.stem}\n', *chunks])
+    write_plan.stage_text(shard_path, text)
+    index = AggregateIndex(shard_path, base_title)
+    index.rebuild(text)
+    index.save(write_plan)
+
+def split_aggregator(aggregate_path: Path, base_title: str, sharding: AggregatorSharding,
+                     shard_size: int, write_plan: WritePlan, date_format: str = DATE_OUTPUT_FORMAT_DEFAULT) -> List[Path]:
+    '''
+    Move the dated sections of an aggregator into shards, keeping the rest as an index of them
+
+    aggregate_path : Aggregator document path
+    base_title : Section title the aggregator collects
+    sharding : Shard by entry year or by size
+    shard_size : Size in bytes a shard is rotated at, when sharding by size
+    write_plan : Write plan to stage the shards and index with
+    date_format : Date format entry titles start with, for sharding by year
+
+    Returns list of shard paths, oldest first, or an empty list if there was nothing to move
+    '''
+    text = write_plan.read(aggregate_path)
+    suffix = f' {base_title}'
+    dated = [span for span in section_spans(text) if span[0].endswith(suffix)]
+    folder = shard_folder(aggregate_path)
+    shards = {}
+    current_size = shard_size
+    for title, start, end in dated:
+        chunk = text[start:end].rstrip('\n') + '\n'
+        if sharding == AggregatorSharding.YEAR:
+            shard_path = folder / f'{_entry_year(title.removesuffix(suffix), date_format)}.md'
+        else:
+            # Same rule as appends: rotate once a shard has reached the size
+            if current_size >= shard_size:
+                shard_path = folder / f'{len(shards) + 1:03d}.md'
+                current_size = len(f'# {base_title} {shard_path.stem}\n'.encode('utf-8'))
+            current_size += len(chunk.encode('utf-8')) + 1
+        shards.setdefault(shard_path, []).append(chunk)
+    if not shards:
+        return []
+    for shard_path, chunks in shards.items():
+        _stage_shard(shard_path, base_title, chunks, write_plan)
+    kept = []
+    cursor = 0
+    for _title, start, end in dated:
+        kept.append(text[cursor:start])
+        cursor = end
+    kept.append(text[cursor:])
+    write_plan.stage_text(aggregate_path, ''.join(kept))
+    update_shard_index(aggregate_path, write_plan)
+    return sorted(shards)
+
+def select_shard(aggregate_path: Path, document: DocumentSection, sharding: AggregatorSharding,
+                 shard_size: int, write_plan: WritePlan, date_format: str = DATE_OUTPUT_FORMAT_DEFAULT) -> Path:
+    '''
+    Shard of an aggregator a document section belongs in
+
+    The aggregator is split the first time, and a new shard is started (and linked from the
+    aggregator) when the section belongs to a new year or the newest shard is full. Sharding by
+    size only reads the newest shard's index, so a changed section from an entry in an older
+    shard is written to the newest one.
+
+    aggregate_path : Aggregator document path
+    document : DocumentSection being written
+    sharding : Shard by entry year or by size
+    shard_size : Size in bytes a shard is rotated at, when sharding by size
+    write_plan : Write plan to stage the shards and index with
+    date_format : Date format entry titles start with, for sharding by year
+    '''
+    shards = list_shards(aggregate_path, write_plan)
+    if not shards:
+        shards = split_aggregator(aggregate_path, document.base_title, sharding, shard_size, write_plan,
+                                  date_format)[::-1]
+    folder = shard_folder(aggregate_path)
+    if sharding == AggregatorSharding.YEAR:
+        shard_path = folder / f'{_entry_year(document.entry_title, date_format)}.md'
+    elif shards and (write_plan.size(shards[0]) < shard_size
+                     or AggregateIndex.load(shards[0], document.base_title, write_plan).find(document.entry_title) is not None):
+        # Only the newest shard is looked at: a section from an entry already in it stays with it,
+        # even once it is full, and older shards are closed
+        shard_path = shards[0]
+    else:
+        shard_path = folder / f'{len(shards) + 1:03d}.md'
+    if not write_plan.exists(shard_path):
+        _stage_shard(shard_path, document.base_title, [], write_plan)
+        update_shard_index(aggregate_path, write_plan)
+    return shard_path
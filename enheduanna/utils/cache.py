@@ -0,0 +1,271 @@
+from hashlib import sha256
+from json import dumps, loads
+from pathlib import Path
+from shutil import rmtree
+from threading import Lock
+from typing import Tuple, Union
+
+from enheduanna.types.config.cache import CacheConfig
+from enheduanna.types.markdown.markdown_file import generate_markdown_sections
+from enheduanna.types.markdown.markdown_section import MarkdownSection
+from enheduanna.types.markdown.section_list import SectionList
+
+# Bump when the parser or the packed format changes, so stale trees are not reused
+CACHE_VERSION = 1
+
+def pack_section(section: MarkdownSection) -> list:
+    '''
+    Pack a parsed section tree into nested lists
+
+    section : Section to pack
+    '''
+    return [section.title, section.contents, section.level, [pack_section(child) for child in section.sections]]
+
+def unpack_section(data: list) -> MarkdownSection:
+    '''
+    Rebuild a section tree from pack_section output
+
+    data : Packed [title, contents, level, children] list
+    '''
+    title, contents, level, children = data
+    section = MarkdownSection(title, contents, level=level)
+    # Trees come from the parser, so skip the duplicate checks of add_section
+    section.sections = SectionList(unpack_section(child) for child in children)
+    return section
+
+class ParseCache:
+    '''
+    On-disk cache of parsed markdown section trees
+
+    Entries are keyed by file path and validated against the file size and
+    mtime; when those change, the content hash decides whether the cached tree
+    can still be used. The least recently used entries are evicted once there
+    are more than max_entries.
+
+    folder : Cache folder
+    max_entries : Maximum number of cached files
+    '''
+    def __init__(self, folder: Path, max_entries: int = 10000):
+        self.folder = Path(folder).expanduser() / 'parse'
+        self.max_entries = max_entries
+        self._index = None
+        self._pending = {}
+        self._dirty = False
+        # Collating several folders at once shares one cache between threads
+        self._lock = Lock()
+
+    @classmethod
+    def from_config(cls, config: CacheConfig) -> Union['ParseCache', None]:
+        '''
+        Build a parse cache from config, or None when caching is disabled
+
+        config : Cache config
+        '''
+        if not config.enabled:
+            return None
+        return cls(config.folder, max_entries=config.max_entries)
+
+    @property
+    def index_path(self) -> Path:
+        '''
+        Path of the cache index file
+        '''
+        return self.folder / 'index.json'
+
+    def _load_index(self) -> dict:
+        '''
+        Read the cache index, starting fresh if it is missing, unreadable or from another version
+        '''
+        if self._index is not None:
+            return self._index
+        index = None
+        if self.index_path.exists():
+            try:
+                index = loads(self.index_path.read_text())
+            except ValueError:
+                index = None
+        if not isinstance(index, dict) or index.get('version') != CACHE_VERSION:
+            index = {'version': CACHE_VERSION, 'tick': 0, 'entries': {}}
+        self._index = index
+        return index
+
+    def _touch(self, entry: dict) -> None:
+        '''
+        Mark an entry as most recently used
+        '''
+        self._index['tick'] += 1
+        entry['used'] = self._index['tick']
+        self._dirty = True
+
+    def _read_blob(self, digest: str) -> Union[MarkdownSection, None]:
+        '''
+        Load a cached tree by content hash, or None if it is missing or unreadable
+        '''
+        blob_path = self.folder / f'{digest}.json'
+        if not blob_path.exists():
+            return None
+        try:
+            return unpack_section(loads(blob_path.read_text()))
+        except (ValueError, TypeError):
+            return None
+
+    def get(self, file_path: Path) -> Tuple[Union[MarkdownSection, None], Union[str, None]]:
+        '''
+        Look up the parsed root section for a file
+
+        file_path : Markdown file to look up
+
+        Returns (section, None) on a cache hit, or (None, text) with the file text on a miss.
+        Pass the parsed text to put to store it.
+        '''
+        with self._lock:
+            index = self._load_index()
+            key = str(Path(file_path).resolve())
+            stat = file_path.stat()
+            entry = index['entries'].get(key)
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                section = self._read_blob(entry['hash'])
+                if section is not None:
+                    self._touch(entry)
+                    return section, None
+            text = file_path.read_text()
+            digest = sha256(text.encode('utf-8')).hexdigest()
+            fresh = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': digest}
+            if entry and entry['hash'] == digest:
+                section = self._read_blob(digest)
+                if section is not None:
+                    index['entries'][key] = fresh
+                    self._touch(fresh)
+                    return section, None
+            self._pending[key] = fresh
+            return None, text
+
+    def put(self, file_path: Path, section: MarkdownSection) -> None:
+        '''
+        Store the parsed root section for a file after a get miss
+
+        file_path : Markdown file that was parsed
+        section : Root section parsed from the text get returned
+        '''
+        with self._lock:
+            key = str(Path(file_path).resolve())
+            entry = self._pending.pop(key)
+            self.folder.mkdir(parents=True, exist_ok=True)
+            (self.folder / f'{entry["hash"]}.json').write_text(dumps(pack_section(section), separators=(',', ':')))
+            self._index['entries'][key] = entry
+            self._touch(entry)
+
+    def load(self, file_path: Path) -> MarkdownSection:
+        '''
+        Get the parsed root section for a file, from the cache when it is still valid
+
+        file_path : Markdown file to parse
+        '''
+        section, text = self.get(file_path)
+        if section is None:
+            section = generate_markdown_sections(text)
+            self.put(file_path, section)
+        return section
+
+    def _evict(self) -> set:
+        '''
+        Drop least recently used entries past max_entries
+
+        Returns the set of content hashes still referenced
+        '''
+        entries = self._index['entries']
+        if len(entries) > self.max_entries:
+            keep = sorted(entries.items(), key=lambda item: item[1]['used'])[-self.max_entries:]
+            self._index['entries'] = dict(keep)
+        return {entry['hash'] for entry in self._index['entries'].values()}
+
+    def save(self) -> None:
+        '''
+        Evict least recently used entries and write the index back to disk
+        '''
+        if not self._dirty:
+            return
+        evicting = len(self._index['entries']) > self.max_entries
+        referenced = self._evict()
+        if evicting:
+            for blob_path in self.folder.glob('*.json'):
+                if blob_path.name != self.index_path.name and blob_path.stem not in referenced:
+                    blob_path.unlink()
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.index_path.write_text(dumps(self._index, separators=(',', ':')))
+        self._dirty = False
+
+    def clear(self) -> None:
+        '''
+        Remove every cached entry
+        '''
+        if self.folder.exists():
+            rmtree(self.folder)
+        self._index = None
+        self._pending = {}
+        self._dirty = False
+
+class MemoryParseCache(ParseCache):
+    '''
+    In-memory cache of parsed markdown section trees, kept by the daemon between commands
+
+    Entries are validated the same way as ParseCache, by size and mtime and then
+    content hash. Trees are kept packed and rebuilt on every hit, so commands can
+    modify the sections they get without changing the cached copy.
+
+    max_entries : Maximum number of cached files
+    '''
+    def __init__(self, max_entries: int = 10000):
+        # Nothing is written to disk, so the folder is never used
+        super().__init__(Path(), max_entries=max_entries)
+        self._trees = {}
+
+    def _load_index(self) -> dict:
+        '''
+        Get the in-memory index, starting empty
+        '''
+        if self._index is None:
+            self._index = {'version': CACHE_VERSION, 'tick': 0, 'entries': {}}
+        return self._index
+
+    def _read_blob(self, digest: str) -> Union[MarkdownSection, None]:
+        '''
+        Rebuild a cached tree by content hash, or None if it is not cached
+        '''
+        packed = self._trees.get(digest)
+        return unpack_section(packed) if packed is not None else None
+
+    def put(self, file_path: Path, section: MarkdownSection) -> None:
+        '''
+        Store the parsed root section for a file after a get miss
+
+        file_path : Markdown file that was parsed
+        section : Root section parsed from the text get returned
+        '''
+        with self._lock:
+            key = str(Path(file_path).resolve())
+            entry = self._pending.pop(key)
+            self._trees[entry['hash']] = pack_section(section)
+            self._index['entries'][key] = entry
+            self._touch(entry)
+
+    def save(self) -> None:
+        '''
+        Evict least recently used entries and the trees only they referenced
+        '''
+        with self._lock:
+            if not self._dirty:
+                return
+            referenced = self._evict()
+            self._trees = {digest: tree for digest, tree in self._trees.items() if digest in referenced}
+            self._dirty = False
+
+    def clear(self) -> None:
+        '''
+        Remove every cached entry
+        '''
+        with self._lock:
+            self._index = None
+            self._pending = {}
+            self._trees = {}
+            self._dirty = False
@@ -1,10 +1,13 @@
-from datetime import date
+from datetime import date, datetime
 from pathlib import Path
+from typing import List, Union
 
 from enheduanna.types.config import Config
 from enheduanna.types.config.collation import CollationType
 from enheduanna.types.markdown.markdown_file import MarkdownFile
 from enheduanna.types.markdown.markdown_section import MarkdownSection
+from enheduanna.utils.files import find_last_markdown_file
+from enheduanna.utils.media import parse_collation_folder_name
 from enheduanna.utils.collation.days import get_end_of_month, get_end_of_week, get_start_of_month, get_start_of_week
 
 def create_parent_folder(config: Config, today: date) -> Path:
@@ -25,3 +28,42 @@ def create_parent_folder(config: Config, today: date) -> Path:
             parent_folder = config.file.entries_folder / f'{start.strftime(config.file.date_output_format)}_{end.strftime(config.file.date_output_format)}'
     parent_folder.mkdir(exist_ok=True)
     return parent_folder
+
+def list_collation_folders(entries_folder: Path, date_format: str, since: datetime = None) -> List[Path]:
+    '''
+    List collation folders in the entries folder, oldest first
+
+    entries_folder : Folder holding all collation subfolders
+    date_format : Date format used in folder names
+    since : Only include folders whose period ends on or after this date
+    '''
+    folders = []
+    if not entries_folder.exists():
+        return folders
+    for child in entries_folder.iterdir():
+        if not child.is_dir():
+            continue
+        date_range = parse_collation_folder_name(child.name, date_format)
+        if not date_range:
+            continue
+        if since and date_range[1] < since:
+            continue
+        folders.append((date_range[0], child))
+    return [folder for _start, folder in sorted(folders)]
+
+def find_latest_entry(entries_folder: Path, date_format: str) -> Union[Path, None]:
+    '''
+    Find the newest entry file without listing every entry
+
+    Collation folders are checked newest first and the search stops at the first one
+    holding an entry. The whole entries folder is only scanned when no collation
+    folder has an entry, for example when entries are kept in some other layout.
+
+    entries_folder : Folder holding all collation subfolders
+    date_format : Date format used in folder names
+    '''
+    for folder in reversed(list_collation_folders(entries_folder, date_format)):
+        entry = find_last_markdown_file(folder)
+        if entry:
+            return entry
+    return find_last_markdown_file(entries_folder)
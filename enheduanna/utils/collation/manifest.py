@@ -0,0 +1,208 @@
+from hashlib import sha256
+from json import dumps, loads
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from pydantic import TypeAdapter
+
+from enheduanna.types.markdown.collate_section import CollateSection
+from enheduanna.types.markdown.collation_plan import CollationPlan
+from enheduanna.types.markdown.markdown_file import generate_markdown_sections
+from enheduanna.types.markdown.markdown_section import MarkdownSection
+from enheduanna.utils.cache import pack_section, unpack_section
+from enheduanna.utils.markdown import collect_collate_fragments, combine_collate_fragments
+
+MANIFEST_NAME = '.collate-manifest.json'
+# Bump when the manifest layout or the way fragments are gathered changes
+MANIFEST_VERSION = 1
+
+def collation_fingerprint(collation_plan: CollationPlan) -> str:
+    '''
+    Hash of the config that decides which fragments each entry contributes
+
+    collation_plan: Compiled collate sections and ignored titles
+    '''
+    data = TypeAdapter(List[CollateSection]).dump_json(list(collation_plan.collate_sections)).decode('utf-8')
+    return sha256(dumps([MANIFEST_VERSION, data, sorted(collation_plan.ignore_sections)]).encode('utf-8')).hexdigest()
+
+def read_manifest(path: Path, fingerprint: str) -> Union[dict, None]:
+    '''
+    Read a manifest file, or None if it is missing, unreadable or for other config
+
+    path : Manifest file path
+    fingerprint : Expected config fingerprint
+    '''
+    if not path.exists():
+        return None
+    try:
+        data = loads(path.read_text())
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or data.get('fingerprint') != fingerprint:
+        return None
+    return data
+
+class CollationManifest:
+    '''
+    Record of what each entry in a collation folder contributed to its summary
+
+    Each entry is stored with its size, mtime and content hash as of the end of
+    the last collate run, along with its collate section fragments. Entries that
+    still match are not parsed again, and combined sections are only rebuilt when
+    one of their fragments changed.
+
+    file_dir : Collation folder
+    collation_plan : Compiled collate sections and ignored titles
+    '''
+    def __init__(self, file_dir: Path, collation_plan: CollationPlan):
+        self.path = file_dir / MANIFEST_NAME
+        self.file_dir = file_dir
+        self.collation_plan = collation_plan
+        self.fingerprint = collation_fingerprint(collation_plan)
+        self.entries = {}
+        self.combined = {}
+        self._used = {}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, file_dir: Path, collation_plan: CollationPlan) -> 'CollationManifest':
+        '''
+        Load the manifest for a collation folder, starting empty if it is missing, unreadable or for other config
+
+        file_dir : Collation folder
+        collation_plan : Compiled collate sections and ignored titles
+        '''
+        manifest = cls(file_dir, collation_plan)
+        data = read_manifest(manifest.path, manifest.fingerprint)
+        if data is None:
+            return manifest
+        manifest.entries = data['entries']
+        manifest.combined = data['combined']
+        return manifest
+
+    def _key(self, path: Path) -> str:
+        '''
+        Manifest key of an entry path
+        '''
+        return path.relative_to(self.file_dir).as_posix()
+
+    def is_current(self, path: Path) -> bool:
+        '''
+        Check an entry is unchanged since the last run
+
+        path : Entry file path
+        '''
+        entry = self.entries.get(self._key(path))
+        if not entry:
+            return False
+        stat = path.stat()
+        if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return True
+        if entry['hash'] != sha256(path.read_bytes()).hexdigest():
+            return False
+        # Touched but not changed, remember the new stat so it is not hashed again
+        entry['size'] = stat.st_size
+        entry['mtime'] = stat.st_mtime_ns
+        self._dirty = True
+        return True
+
+    def title(self, path: Path) -> str:
+        '''
+        Root title of an unchanged entry
+
+        path : Entry file path
+        '''
+        return self.entries[self._key(path)]['title']
+
+    def _unpack_fragments(self, packed: list) -> List[Tuple[CollateSection, MarkdownSection]]:
+        '''
+        Rebuild (CollateSection, section) fragments from manifest data
+        '''
+        return [(self.collation_plan.collate_sections[index], unpack_section(section)) for index, section in packed]
+
+    def _pack_fragments(self, fragments: List[Tuple[CollateSection, MarkdownSection]]) -> list:
+        '''
+        Pack (CollateSection, section) fragments for the manifest
+        '''
+        return [[self.collation_plan.index(collate_section), pack_section(section)] for collate_section, section in fragments]
+
+    def combine(self, paths: List[Path], changed: Dict[Path, List[Tuple[CollateSection, MarkdownSection]]]) -> List[MarkdownSection]:
+        '''
+        Build the combined collate sections, only re-grouping titles with changed fragments
+
+        paths : All entry file paths in collation order
+        changed : Freshly gathered fragments of each changed entry
+
+        returns list of combined sections, in order of first appearance
+        '''
+        keys = {self._key(path) for path in paths}
+        affected = set()
+        for key in [key for key in self.entries if key not in keys]:
+            affected.update(section[0] for _index, section in self.entries.pop(key)['fragments'])
+            self._dirty = True
+        packed = {}
+        for path in paths:
+            key = self._key(path)
+            if path in changed:
+                packed[key] = self._pack_fragments(changed[path])
+                if key in self.entries:
+                    affected.update(section[0] for _index, section in self.entries[key]['fragments'])
+                affected.update(section[0] for _index, section in packed[key])
+            else:
+                packed[key] = self.entries[key]['fragments']
+        self._used = packed
+        titles = list(dict.fromkeys(section[0] for path in paths for _index, section in packed[self._key(path)]))
+        rebuild = {title for title in titles if title in affected or title not in self.combined}
+        fragments = []
+        for path in paths:
+            if path in changed:
+                fragments.extend(fragment for fragment in changed[path] if fragment[1].title in rebuild)
+            else:
+                fragments.extend(self._unpack_fragments(fragment for fragment in packed[self._key(path)] if fragment[1][0] in rebuild))
+        rebuilt = {section.title: section for section in combine_collate_fragments(fragments)}
+        if rebuild or set(self.combined) != set(titles):
+            self.combined = {title: pack_section(rebuilt[title]) if title in rebuilt else self.combined[title] for title in titles}
+            self._dirty = True
+        return [rebuilt[title] if title in rebuilt else unpack_section(self.combined[title]) for title in titles]
+
+    def refresh(self, paths: List[Path]) -> None:
+        '''
+        Record the final state of every entry changed during this run
+
+        paths : All entry file paths in collation order
+        '''
+        for path in paths:
+            if self.is_current(path):
+                continue
+            key = self._key(path)
+            data = path.read_bytes()
+            root_section = generate_markdown_sections(data.decode('utf-8'))
+            fragments = self._pack_fragments(collect_collate_fragments(root_section, self.collation_plan))
+            # The summary was built from the fragments as they were before cleanup; if the
+            # cleaned-up file differs, rebuild those titles next run
+            used = self._used.get(key, [])
+            if fragments != used:
+                stale = {section[0] for _index, section in fragments + used}
+                self.combined = {title: value for title, value in self.combined.items() if title not in stale}
+            stat = path.stat()
+            self.entries[key] = {
+                'size': stat.st_size,
+                'mtime': stat.st_mtime_ns,
+                'hash': sha256(data).hexdigest(),
+                'title': root_section.title,
+                'fragments': fragments,
+            }
+            self._dirty = True
+
+    def save(self) -> None:
+        '''
+        Write the manifest back to the collation folder if anything changed
+        '''
+        if not self._dirty:
+            return
+        self.path.write_text(dumps({
+            'fingerprint': self.fingerprint,
+            'entries': self.entries,
+            'combined': self.combined,
+        }, separators=(',', ':')))
+        self._dirty = False
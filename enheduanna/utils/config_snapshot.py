@@ -0,0 +1,120 @@
+from hashlib import sha256
+from json import dumps
+from pathlib import Path
+from re import findall
+from typing import Union
+import os
+# Only snapshots written by this module are loaded, see read_snapshot
+import pickle # nosec B403
+
+from enheduanna import defaults, types as types_package
+from enheduanna.defaults import CONFIG_SNAPSHOT_DEFAULT
+from enheduanna.types.config import Config
+
+# Bump when the snapshot layout changes
+CONFIG_SNAPSHOT_VERSION = 1
+# Environment variable to point at another snapshot file
+SNAPSHOT_ENV = 'ENHEDUANNA_CONFIG_SNAPSHOT'
+# Environment variables pyaml_env substitutes, as ${NAME} or ${NAME:default}
+ENV_REFERENCE_REGEX = r'\$\{([^}{:]+)'
+
+def snapshot_path(config_path: Path) -> Path:
+    '''
+    Snapshot path of a config file, named after the snapshot path from the environment or
+    the default with a hash of the config path, so each config file keeps its own snapshot
+
+    config_path : Config file path
+    '''
+    base = Path(os.environ.get(SNAPSHOT_ENV, CONFIG_SNAPSHOT_DEFAULT)).expanduser()
+    digest = sha256(str(config_path.resolve()).encode('utf-8')).hexdigest()[:16]
+    return base.with_name(f'{base.stem}-{digest}{base.suffix}')
+
+def snapshot_key(config_path: Path) -> bytes:
+    '''
+    Key a snapshot of a config file is valid for
+
+    Covers the config file path, size and mtime, the values of the environment variables
+    it references, the home folder and the defaults module that default paths are built
+    from, and the modules defining the pickled config types, so upgrading enheduanna never
+    loads a snapshot of an older config layout.
+
+    config_path : Config file path
+    '''
+    types_folder = Path(types_package.__file__).parent
+    defaults_path = Path(defaults.__file__)
+    key = {
+        'version': CONFIG_SNAPSHOT_VERSION,
+        'path': str(config_path.resolve()),
+        'types': [[path.name, path.stat().st_size, path.stat().st_mtime_ns]
+                  for path in sorted(types_folder.glob('*/*.py'))],
+        'defaults': [defaults_path.stat().st_size, defaults_path.stat().st_mtime_ns],
+        'home': str(Path.home()),
+    }
+    if config_path.exists():
+        stat = config_path.stat()
+        key['size'] = stat.st_size
+        key['mtime'] = stat.st_mtime_ns
+        names = sorted(set(findall(ENV_REFERENCE_REGEX, config_path.read_text())))
+        key['env'] = {name: os.environ.get(name) for name in names}
+    return dumps(key, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+def read_snapshot(path: Path, key: bytes) -> Union[Config, None]:
+    '''
+    Load a config snapshot, or None if it is missing, unreadable or was taken under another key
+
+    The key is compared before anything is unpickled.
+
+    path : Snapshot path
+    key : Expected key, from snapshot_key
+    '''
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    header, _newline, payload = data.partition(b'\n')
+    if header != key:
+        return None
+    try:
+        # Snapshots are written by write_snapshot to the user's own cache folder with 0600 permissions
+        config = pickle.loads(payload) # nosec B301
+    except Exception: #pylint:disable=broad-exception-caught
+        return None
+    return config if isinstance(config, Config) else None
+
+def write_snapshot(path: Path, key: bytes, config: Config) -> None:
+    '''
+    Write a config snapshot, readable only by its owner
+
+    path : Snapshot path
+    key : Key the snapshot is valid for, from snapshot_key
+    config : Validated config
+    '''
+    temp_path = path.with_name(f'.{path.name}.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as stream:
+            stream.write(key + b'\n')
+            pickle.dump(config, stream, protocol=pickle.HIGHEST_PROTOCOL)
+        temp_path.replace(path)
+    except OSError:
+        # The snapshot is only a shortcut, so a folder that cannot be written to is skipped
+        pass
+
+def load_config(config_path: Path, rebuild: bool = False) -> Config:
+    '''
+    Load config, from the snapshot while the config file and the environment variables it uses are unchanged
+
+    Otherwise the YAML is parsed and validated, and the snapshot is written again.
+
+    config_path : Config file path
+    rebuild : Always parse the config file and rewrite the snapshot
+    '''
+    path = snapshot_path(config_path)
+    key = snapshot_key(config_path)
+    if not rebuild:
+        config = read_snapshot(path, key)
+        if config is not None:
+            return config
+    config = Config.from_yaml(config_path)
+    write_snapshot(path, key, config)
+    return config
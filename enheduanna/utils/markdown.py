@@ -1,14 +1,21 @@
 from copy import deepcopy
+from itertools import chain
 from json import dumps
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterable, List, Tuple
 
-from enheduanna.types.markdown.markdown_file import MarkdownFile
+from enheduanna.defaults import DATE_OUTPUT_FORMAT_DEFAULT
+from enheduanna.types.markdown.markdown_file import MarkdownFile, generate_markdown_sections
 from enheduanna.types.markdown.markdown_section import MarkdownSection
 from enheduanna.types.markdown.collate_section import CollateSection
+from enheduanna.types.markdown.collation_plan import CollationPlan
 from enheduanna.types.markdown.document_section import DocumentSection
+from enheduanna.types.config.file import AggregatorSharding, AggregatorUpdate
+from enheduanna.utils.aggregate import AggregateIndex, append_separator, root_title, section_fingerprint, section_spans
+from enheduanna.utils.aggregate import select_shard, splice_section
 from enheduanna.utils.files import normalize_file_name
 from enheduanna.utils.links import rewrite_section_links
+from enheduanna.utils.write_plan import WritePlan
 
 def section_generate_from_json(data_input: List[dict]) -> List[MarkdownSection]:
     '''
@@ -33,47 +40,37 @@ def collate_section_generate_from_json(data_input: List[dict]) -> List[CollateSe
     return return_data
 
 def _gather_all_section_data(markdown_file: MarkdownFile, parent_section: MarkdownSection,
-                             collate_sections: List[str], ignore_sections: List[str],
-                             collate_mapping: dict, document_list: list,
-                             document_folder: Path) -> bool:
+                             collation_plan: CollationPlan, fragment_list: list, document_list: list,
+                             document_folder: Path, write_plan: WritePlan) -> bool:
     '''
     Recursively gather all section data in collate section names
 
     markdown_file : Original markdown file
     parent_section : Section before this call
-    markdown_sections: Sections within parent
-    collate_sections: Collate sections to run
-    ignore_sections: Ignore these sections for doc collation
+    collation_plan: Compiled collate sections and ignored titles
     document_folder: Destination folder for extracted document sections
+    write_plan: Write plan the trimmed markdown file is staged with
 
-    collate_mapping/document_list: Kept here for loop to return in main function
+    fragment_list/document_list: Kept here for loop to return in main function
     '''
     doc_sections = []
     for section in parent_section.sections:
-        if section.title in ignore_sections:
+        if section.title in collation_plan.ignore_sections:
             continue
-        match_found = False
-        for collate_section in collate_sections:
-            if section.title == collate_section.title and section.level == collate_section.level:
-                if section.title not in collate_mapping:
-                    collate_mapping[section.title] = {
-                        'section': deepcopy(section),
-                        'collate': collate_section,
-                    }
-                else:
-                    collate_mapping[section.title]['section'].merge(section)
-                match_found = True
-                continue
+        matches = collation_plan.match(section)
+        for collate_section in matches:
+            # Copy so combining fragments later never modifies the entry itself
+            fragment_list.append((collate_section, deepcopy(section)))
 
-        if not match_found:
+        if not matches:
             if section.level > 1:
                 doc_sections.append(section.title)
                 continue
-            _gather_all_section_data(markdown_file, section, collate_sections, ignore_sections, collate_mapping, document_list, document_folder)
+            _gather_all_section_data(markdown_file, section, collation_plan, fragment_list, document_list, document_folder, write_plan)
     # Remove these at the end since it cant muck with the order of sections
     for title in doc_sections:
         document_section = parent_section.remove_section(title)
-        markdown_file.write()
+        write_plan.stage(markdown_file)
         new_root = document_section.generate_root(prefix=f'{markdown_file.root_section.title} ')
         # Relative links resolve against the source file's dir; fix them for the new location.
         # Pass the (already-trimmed) source root so anchors to headings that stayed behind
@@ -81,65 +78,170 @@ def _gather_all_section_data(markdown_file: MarkdownFile, parent_section: Markdo
         rewrite_section_links(new_root, markdown_file.file_path, document_folder, markdown_file.root_section)
         # Keep the un-prefixed title alongside the dated root so the writer can match an
         # existing aggregator file (e.g. "Greg Weekly.md") named after the base section.
-        document_list.append(DocumentSection(base_title=title, root=new_root))
+        document_list.append(DocumentSection(base_title=title, root=new_root, entry_title=markdown_file.root_section.title))
 
     return True
 
-def generate_markdown_collation(markdown_files: List[MarkdownFile], collate_sections: List[CollateSection],
-                             ignore_sections: List[str], document_folder: Path) -> Tuple[List[MarkdownSection], List[DocumentSection]]:
+def gather_markdown_collation(markdown_files: List[MarkdownFile], collation_plan: CollationPlan, document_folder: Path,
+                              write_plan: WritePlan = None) -> Tuple[List[List[Tuple[CollateSection, MarkdownSection]]], List[DocumentSection]]:
     '''
-    Combine markdown sections by the collate titles
+    Gather the collate section fragments of each file and extract document sections
 
-    markdown_sections: Sections of markdown
-    collate_sections: List of collate sections
-    ignore_sections: Ignore sections when making new documents
+    markdown_files: Markdown files in collation order
+    collation_plan: Compiled collate sections and titles to ignore when making new documents
     document_folder: Destination folder for extracted document sections
+    write_plan: Stage trimmed files here instead of writing them straight away
 
-    returns tupe of [List of combined sections] [List of DocumentSections]
+    returns tuple of [List of (CollateSection, section copy) fragments per file] [List of DocumentSections]
     '''
-    section_mapping = {}
+    plan = write_plan or WritePlan()
+    fragments = []
     document_list = []
     for markdown_file in markdown_files:
-        _gather_all_section_data(markdown_file, markdown_file.root_section, collate_sections, ignore_sections, section_mapping, document_list, document_folder)
+        file_fragments = []
+        _gather_all_section_data(markdown_file, markdown_file.root_section, collation_plan, file_fragments, document_list, document_folder, plan)
+        fragments.append(file_fragments)
+    if write_plan is None:
+        plan.commit()
+    return fragments, document_list
+
+def collect_collate_fragments(parent_section: MarkdownSection, collation_plan: CollationPlan) -> List[Tuple[CollateSection, MarkdownSection]]:
+    '''
+    Find the collate section fragments of a section tree without modifying it
+
+    parent_section: Root section to search
+    collation_plan: Compiled collate sections and titles to ignore
+
+    returns list of (CollateSection, section) pairs, in the order gather_markdown_collation finds them
+    '''
+    fragments = []
+    for section in parent_section.sections:
+        if section.title in collation_plan.ignore_sections:
+            continue
+        matches = collation_plan.match(section)
+        fragments.extend((collate_section, section) for collate_section in matches)
+        if not matches and section.level <= 1:
+            fragments.extend(collect_collate_fragments(section, collation_plan))
+    return fragments
+
+def combine_collate_fragments(fragments: Iterable[Tuple[CollateSection, MarkdownSection]]) -> List[MarkdownSection]:
+    '''
+    Merge collate section fragments by title and group their contents
+
+    fragments: (CollateSection, section) pairs in collation order, the sections are modified in place
+
+    returns list of combined sections, in order of first appearance
+    '''
+    section_mapping = {}
+    for collate_section, section in fragments:
+        if section.title not in section_mapping:
+            section_mapping[section.title] = {
+                'section': section,
+                'collate': collate_section,
+            }
+        else:
+            section_mapping[section.title]['section'].merge(section)
     new_sections = []
     for _key, values in section_mapping.items():
         section = values['section']
         section.group_contents(values['collate'])
         new_sections.append(section)
-    return new_sections, document_list
+    return new_sections
+
+def generate_markdown_collation(markdown_files: List[MarkdownFile], collation_plan: CollationPlan, document_folder: Path,
+                             write_plan: WritePlan = None) -> Tuple[List[MarkdownSection], List[DocumentSection]]:
+    '''
+    Combine markdown sections by the collate titles
 
-def write_document_section(document: DocumentSection, document_folder: Path) -> Tuple[Path, bool]:
+    markdown_sections: Sections of markdown
+    collation_plan: Compiled collate sections and titles to ignore when making new documents
+    document_folder: Destination folder for extracted document sections
+    write_plan: Stage trimmed files here instead of writing them straight away
+
+    returns tupe of [List of combined sections] [List of DocumentSections]
+    '''
+    fragments, document_list = gather_markdown_collation(markdown_files, collation_plan, document_folder, write_plan=write_plan)
+    return combine_collate_fragments(chain.from_iterable(fragments)), document_list
+
+def write_document_section(document: DocumentSection, document_folder: Path, lossless: bool = False,
+                           write_plan: WritePlan = None,
+                           update: AggregatorUpdate = AggregatorUpdate.APPEND,
+                           sharding: AggregatorSharding = AggregatorSharding.OFF,
+                           shard_size: int = 1_000_000,
+                           date_format: str = DATE_OUTPUT_FORMAT_DEFAULT) -> Tuple[Path, str]:
     '''
     Write an extracted document section to the document folder
 
     If an aggregator file named "<base_title>.md" already exists in the folder, the dated
     section is appended to the bottom of it as a new sub-section. Otherwise a standalone
-    "<date> <base_title>.md" file is written (the original behaviour).
+    "<date> <base_title>.md" file is written (the original behaviour). Aggregators that open
+    with a title are appended to without being parsed, so existing text is kept as-is.
+
+    Sections already in the aggregator are tracked by an AggregateIndex, so a section from
+    the same entry with the same content is skipped, and one with changed content is
+    appended again or replaces the earlier one depending on update. With sharding on, the
+    aggregator becomes an index of shard files in a folder named after it, and sections are
+    written to the shard for their year or to the newest shard under the size limit.
 
     document : DocumentSection to write
     document_folder : Destination folder for documents
+    lossless : Keep the existing aggregator text as-is rather than re-rendering it
+    write_plan : Stage the file here instead of writing it straight away
+    update : What to do when the entry's section is already in the aggregator with other content
+    sharding : Split the aggregator into shards by entry year or by size
+    shard_size : Size in bytes a shard is rotated at, when sharding by size
+    date_format : Date format entry titles start with, for sharding by year
 
-    returns tuple of (written path, whether it was appended to an existing aggregator)
+    returns tuple of (path, action), where action is "written", "appended", "replaced" or "unchanged"
     '''
+    plan = write_plan or WritePlan()
     aggregate_path = document_folder / f'{normalize_file_name(document.base_title)}.md'
-    if aggregate_path.exists():
+    if not plan.exists(aggregate_path):
+        standalone_path = document_folder / f'{normalize_file_name(document.root.title)}.md'
+        plan.stage(MarkdownFile(standalone_path, document.root))
+        if write_plan is None:
+            plan.commit()
+        return standalone_path, 'written'
+    section = document.root
+    section.level = 2
+    section.set_section_levels(3)
+    if sharding != AggregatorSharding.OFF:
+        aggregate_path = select_shard(aggregate_path, document, sharding, shard_size, plan, date_format)
+    index = AggregateIndex.load(aggregate_path, document.base_title, plan)
+    previous = index.find(document.entry_title)
+    digest = section_fingerprint(section)
+    if previous == digest:
+        if write_plan is None:
+            plan.commit()
+        return aggregate_path, 'unchanged'
+    replace = previous is not None and update == AggregatorUpdate.REPLACE
+    text = plan.read(aggregate_path) if replace else ''
+    spans = [span for span in section_spans(text) if span[0] == section.title]
+    if spans:
+        # Swap the text of the latest copy of the section, leaving the rest of the aggregator as-is
+        plan.stage_text(aggregate_path, splice_section(text, spans[-1], section))
+    elif root_title(plan.head(aggregate_path)):
+        # The new section always lands at the end under the root title, so it can be
+        # appended without reading or rewriting the rest of the aggregator
+        plan.stage_append(aggregate_path, append_separator(plan.tail(aggregate_path)) + section.write())
+    else:
+        # Read through the plan so several appends to one aggregator in a run all land
+        text = plan.read(aggregate_path)
         # An empty aggregator file (e.g. freshly `touch`ed) has no title to parse, so seed a
         # root titled after the base section instead of parsing it into a section-less root.
-        if aggregate_path.read_text().strip():
-            markdown_file = MarkdownFile.from_file(aggregate_path)
+        if text.strip():
+            markdown_file = MarkdownFile(aggregate_path, generate_markdown_sections(text, lossless=lossless))
         else:
             markdown_file = MarkdownFile(aggregate_path, MarkdownSection(document.base_title, ''))
-        section = document.root
-        section.level = markdown_file.root_section.level + 1
-        section.set_section_levels(section.level + 1)
-        # Append directly rather than via add_section: re-running collate can legitimately add
-        # a second section with the same "<date> <base_title>" title, which add_section rejects.
+        # Append directly rather than via add_section: the aggregator can legitimately hold
+        # several sections with the same "<date> <base_title>" title, which add_section rejects.
         markdown_file.root_section.sections.append(section)
-        markdown_file.write()
-        return aggregate_path, True
-    standalone_path = document_folder / f'{normalize_file_name(document.root.title)}.md'
-    MarkdownFile(standalone_path, document.root).write()
-    return standalone_path, False
+        plan.stage(markdown_file)
+    index.record(document.entry_title, digest)
+    index.save(plan)
+    if write_plan is None:
+        plan.commit()
+    return aggregate_path, 'replaced' if spans else 'appended'
 
 def __remove_empty(markdown_file: MarkdownFile, parent_section: MarkdownSection) -> bool:
     remove_sections = []
@@ -179,12 +281,16 @@ def generate_markdown_merge(markdown_files: List[MarkdownFile], title: str, outp
 
     return merged_root
 
-def remove_empty_sections(markdown_files: List[MarkdownFile]) -> bool:
+def remove_empty_sections(markdown_files: List[MarkdownFile], write_plan: WritePlan = None) -> bool:
     '''
     Remove empty exections from markdown files
 
     markdown_files : List of markdown files
+    write_plan : Stage the files here instead of writing them straight away
     '''
+    plan = write_plan or WritePlan()
     for mf in markdown_files:
         __remove_empty(mf, mf.root_section)
-        mf.write()
+        plan.stage(mf)
+    if write_plan is None:
+        plan.commit()
@@ -1,11 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from time import perf_counter
 from typing import Dict, List, Tuple
 import re
 import shutil
 
 from enheduanna.types.config.media import MediaConfig
 from enheduanna.types.markdown.markdown_file import MarkdownFile
+from enheduanna.types.markdown.markdown_section import MarkdownSection
+from enheduanna.utils.media_index import MediaSourceIndex
+from enheduanna.utils.media_manifest import MediaManifest
+from enheduanna.utils.media_store import MediaStore
+from enheduanna.utils.write_plan import WritePlan
+
+# Markdown images ![alt](target) and HTML <img ... src="target"> tags
+MEDIA_REFERENCE_REGEX = re.compile(r'(!\[[^\]]*\]\()([^)]*)(\))|(<img\s+[^>]*src=")([^"]*)(")')
 
 def parse_collation_folder_name(folder_name: str, date_format: str) -> Tuple[datetime, datetime] | None:
     '''
@@ -31,15 +41,31 @@ def parse_collation_folder_name(folder_name: str, date_format: str) -> Tuple[dat
     except ValueError:
         return None
 
+def _transfer(file_path: Path, new_path: Path, digest: str, move: bool, store: MediaStore) -> None:
+    '''
+    Move or copy one media file into the collation directory, through the store when there is one
+    '''
+    if store:
+        store.place(store.add(file_path, digest, move=move), new_path)
+    elif move:
+        shutil.move(str(file_path), str(new_path))
+    else:
+        shutil.copy2(str(file_path), str(new_path))
+
 def organize_media_for_collation(collation_dir: Path, start_date: datetime,
-                                  end_date: datetime, config: MediaConfig) -> Dict[str, str]:
+                                  end_date: datetime, config: MediaConfig, store: MediaStore = None) -> Dict[str, str]:
     '''
     Organize media files for a specific collation period
 
+    Files already ingested into the collation folder, as recorded in its media manifest,
+    are not copied again while their copy is still there, but are still included in the
+    returned mapping.
+
     collation_dir: The collation directory (e.g., 2025-01-20_2025-01-26/)
     start_date: Start of the collation period (inclusive)
     end_date: End of the collation period (inclusive)
     config: Media configuration
+    store: Optional media store, files are kept there once and placed in the collation directory
 
     Returns: Dictionary mapping old filenames to new filenames with subfolder info
              Format: {old_filename: (subfolder, new_filename)}
@@ -48,6 +74,10 @@ def organize_media_for_collation(collation_dir: Path, start_date: datetime,
         return {}
 
     filename_mapping = {}
+    manifest = MediaManifest.load(collation_dir)
+    transferred = 0
+    transferred_bytes = 0
+    elapsed = 0.0
 
     # Process each source folder
     for source in config.sources:
@@ -58,89 +88,140 @@ def organize_media_for_collation(collation_dir: Path, start_date: datetime,
         media_dir = collation_dir / source.subfolder
         media_dir.mkdir(parents=True, exist_ok=True)
 
-        # Scan source folder for media files
-        for file_path in source_dir.iterdir():
-            if not file_path.is_file():
-                continue
-
-            # Check if file has matching extension
-            if file_path.suffix.lower() not in [ext.lower() for ext in config.extensions]:
-                continue
-
-            # Get file modified time
-            file_mtime = datetime.fromtimestamp(file_path.stat().st_mtime)
-
-            # Check if file is within date range
-            if start_date > file_mtime or file_mtime > end_date:
-                continue
-
-            # Create new filename: YYYY-MM-DD_HH-MM-SS.ext
-            new_filename = f"{file_mtime.strftime('%Y-%m-%d_%H-%M-%S')}{file_path.suffix}"
-            new_path = media_dir / new_filename
-
-            # Handle potential filename conflicts
-            counter = 1
-            while new_path.exists():
-                new_filename = f"{file_mtime.strftime('%Y-%m-%d_%H-%M-%S')}_{counter}{file_path.suffix}"
-                new_path = media_dir / new_filename
-                counter += 1
-
-            # Move or copy file
-            if source.operation == "move":
-                shutil.move(str(file_path), str(new_path))
-                print(f'Moved {file_path.name} -> {new_path}')
-            else:
-                shutil.copy2(str(file_path), str(new_path))
-                print(f'Copied {file_path.name} -> {new_path}')
+        # Find media files in the date range from the source index
+        index = MediaSourceIndex.load(source_dir, config.extensions, config.index_folder if config.index else None)
+        index.scan()
+        source_root = source_dir.resolve()
+        move = source.operation == "move"
+        # Name every file first, in index order, so names do not depend on which transfer finishes first
+        pending = []
+        duplicates = []
+        scheduled = set()
+        for mtime, name in index.select(start_date, end_date):
+            file_path = source_root / name
+            record = manifest.check(file_path, source.subfolder)
+            if record['name'] is None:
+                # New content: name it after its modified time, YYYY-MM-DD_HH-MM-SS.ext
+                file_mtime = datetime.fromtimestamp(mtime / 1_000_000_000)
+                record['name'] = manifest.new_name(source.subfolder, file_mtime.strftime('%Y-%m-%d_%H-%M-%S'), file_path.suffix)
+            if record['name'] not in scheduled and not (media_dir / record['name']).exists():
+                # New content, or content whose earlier copy was deleted from the collation folder
+                scheduled.add(record['name'])
+                pending.append((file_path, media_dir / record['name'], record))
+            elif move:
+                # Content already in the collation folder, the source only needs to go
+                duplicates.append((file_path, media_dir / record['name'], record))
+            manifest.add(file_path, record)
 
             # Store mapping with subfolder information
-            filename_mapping[file_path.name] = (source.subfolder, new_filename)
+            filename_mapping[file_path.name] = (source.subfolder, record['name'])
+
+        # Move or copy the new files, several at a time
+        started = perf_counter()
+        with ThreadPoolExecutor(max_workers=source.workers) as executor:
+            futures = [executor.submit(_transfer, file_path, new_path, record['hash'], move, store)
+                       for file_path, new_path, record in pending]
+            for (file_path, new_path, record), future in zip(pending, futures):
+                future.result()
+                print(f'{"Moved" if move else "Copied"} {file_path.name} -> {new_path}')
+                transferred += 1
+                transferred_bytes += record['size']
+        elapsed += perf_counter() - started
+        for file_path, new_path, _record in duplicates:
+            file_path.unlink()
+            print(f'Removed {file_path.name}, already in {new_path}')
+        if move:
+            index.discard(file_path.name for file_path, _new_path, _record in pending + duplicates)
+        index.save()
+    manifest.save()
+    if transferred:
+        print(f'Media files transferred: {transferred} ({transferred_bytes} bytes) in {elapsed:.2f}s, '
+              f'{transferred_bytes / max(elapsed, 1e-6) / 1_000_000:.1f} MB/s')
 
     return filename_mapping
 
-def update_markdown_media_references(markdown_files: List[MarkdownFile],
-                                      filename_mapping: Dict[str, Tuple[str, str]]):
+def rewrite_media_references(text: str, filename_mapping: Dict[str, Tuple[str, str]]) -> str:
     '''
-    Update markdown image references to point to new media locations
+    Point markdown images and HTML img tags at their new media locations, in one pass
 
-    markdown_files: List of markdown files to update
+    text: Markdown text
     filename_mapping: Mapping of old filenames to (subfolder, new_filename) tuples
-    '''
-    if not filename_mapping:
-        return
 
-    for markdown_file in markdown_files:
-        content = markdown_file.file_path.read_text()
-        original_content = content
+    Returns the text with every image whose file name is in the mapping rewritten
+    '''
+    def replace(match):
+        # Markdown images fill the first three groups, img tags the last three
+        head, target, tail = match.group(1, 2, 3) if match.group(1) is not None else match.group(4, 5, 6)
+        mapped = filename_mapping.get(target.rsplit('/', 1)[-1])
+        if mapped is None:
+            return match.group(0)
+        subfolder, new_filename = mapped
+        return f'{head}./{subfolder}/{new_filename}{tail}'
+
+    if '![' not in text and '<img' not in text:
+        return text
+    return MEDIA_REFERENCE_REGEX.sub(replace, text)
+
+def update_section_media_references(root_section: MarkdownSection, filename_mapping: Dict[str, Tuple[str, str]]) -> bool:
+    '''
+    Rewrite media references in the contents of a section tree, in place
 
-        # Update markdown image syntax: ![alt](path)
-        for old_filename, (subfolder, new_filename) in filename_mapping.items():
-            # Pattern to match image references with the old filename
-            # Matches: ![...](~/path/to/old_filename) or ![...](/path/to/old_filename) or ![...](.../old_filename)
-            markdown_pattern = rf'(!\[([^\]]*)\]\()([^)]*{re.escape(old_filename)})(\))'
+    root_section: Root section of a markdown file
+    filename_mapping: Mapping of old filenames to (subfolder, new_filename) tuples
 
-            def replace_markdown_ref(match, subfolder=subfolder, new_filename=new_filename):
-                alt_start = match.group(1)  # ![alt](
-                end_paren = match.group(4)  # )
+    Returns whether any section changed
+    '''
+    changed = False
+    stack = [root_section]
+    while stack:
+        section = stack.pop()
+        contents = rewrite_media_references(section.contents, filename_mapping)
+        if contents != section.contents:
+            section.contents = contents
+            changed = True
+        stack.extend(section.sections)
+    return changed
 
-                # Replace with relative path to media directory
-                new_path = f'./{subfolder}/{new_filename}'
-                return f'{alt_start}{new_path}{end_paren}'
+def update_markdown_media_references(markdown_files: List[MarkdownFile],
+                                      filename_mapping: Dict[str, Tuple[str, str]],
+                                      write_plan: WritePlan = None):
+    '''
+    Update markdown image references to point to new media locations
 
-            content = re.sub(markdown_pattern, replace_markdown_ref, content)
+    The section trees are updated in memory and only files that changed are staged,
+    so they are written once along with any other changes in the plan.
 
-            # Also handle HTML img tags: <img src="path">
-            html_pattern = rf'(<img\s+[^>]*src=")([^"]*{re.escape(old_filename)})(")'
+    markdown_files: List of parsed markdown files to update
+    filename_mapping: Mapping of old filenames to (subfolder, new_filename) tuples
+    write_plan: Stage the files here instead of writing them straight away
+    '''
+    if not filename_mapping:
+        return
 
-            def replace_html_ref(match, subfolder=subfolder, new_filename=new_filename):
-                start = match.group(1)  # <img ... src="
-                end_quote = match.group(3)  # "
+    plan = write_plan or WritePlan()
+    for markdown_file in markdown_files:
+        if update_section_media_references(markdown_file.root_section, filename_mapping):
+            plan.stage(markdown_file)
+    if write_plan is None:
+        plan.commit()
 
-                new_path = f'./{subfolder}/{new_filename}'
-                return f'{start}{new_path}{end_quote}'
+def update_media_reference_files(paths: List[Path], filename_mapping: Dict[str, Tuple[str, str]],
+                                  write_plan: WritePlan = None):
+    '''
+    Update media references in files that were not parsed, by their text
 
-            content = re.sub(html_pattern, replace_html_ref, content)
+    paths: Markdown file paths
+    filename_mapping: Mapping of old filenames to (subfolder, new_filename) tuples
+    write_plan: Read and stage the files here instead of writing them straight away
+    '''
+    if not filename_mapping:
+        return
 
-        # Write back if changed
-        if content != original_content:
-            markdown_file.file_path.write_text(content)
+    plan = write_plan or WritePlan()
+    for path in paths:
+        content = plan.read(path)
+        updated = rewrite_media_references(content, filename_mapping)
+        if updated != content:
+            plan.stage_text(path, updated)
+    if write_plan is None:
+        plan.commit()
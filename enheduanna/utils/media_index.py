@@ -0,0 +1,144 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from hashlib import sha256
+from json import dumps, loads
+from pathlib import Path
+from time import time_ns
+from typing import Iterable, List, Tuple
+import os
+
+# Bump when the layout of the index file changes
+MEDIA_INDEX_VERSION = 1
+# A folder mtime this recent is not trusted, a file added in the same tick would not change it
+RACY_WINDOW_NS = 2_000_000_000
+
+def timestamp_ns(value: datetime) -> int:
+    '''
+    Nanosecond timestamp of a local datetime, without float rounding
+
+    value : Datetime to convert
+    '''
+    return int(value.replace(microsecond=0).timestamp()) * 1_000_000_000 + value.microsecond * 1000
+
+class MediaSourceIndex:
+    '''
+    Media files of a source folder, sorted by modification time
+
+    Files are kept as a table of [mtime, name, inode] rows. When the index is persisted,
+    the folder mtime is saved along with it: while the folder mtime is unchanged no file
+    was added, removed or renamed, so the folder is not listed at all. Otherwise the folder
+    is listed again, and only names that are new or now point at another inode are stat'd.
+    Files edited in place keep the time they were first indexed with.
+
+    folder : Source folder
+    extensions : Media file extensions, matched case insensitively
+    path : Json file the index is kept in, or None to list the folder every scan
+    '''
+    def __init__(self, folder: Path, extensions: Iterable[str], path: Path = None):
+        self.folder = Path(folder).expanduser()
+        self.extensions = frozenset(extension.lower() for extension in extensions)
+        self.path = path
+        self.folder_mtime = None
+        self.mtimes = []
+        self.rows = []
+
+    @classmethod
+    def load(cls, folder: Path, extensions: Iterable[str], index_folder: Path = None) -> 'MediaSourceIndex':
+        '''
+        Load the index of a source folder, starting an empty one if it is missing or out of date
+
+        folder : Source folder
+        extensions : Media file extensions, matched case insensitively
+        index_folder : Folder index files are kept in, or None to not persist the index
+        '''
+        index = cls(folder, extensions)
+        if index_folder is None:
+            return index
+        digest = sha256(str(index.folder.resolve()).encode('utf-8')).hexdigest()[:16]
+        index.path = Path(index_folder).expanduser() / f'{digest}.json'
+        try:
+            data = loads(index.path.read_text())
+        except (OSError, ValueError):
+            return index
+        if isinstance(data, dict) and data.get('version') == MEDIA_INDEX_VERSION \
+                and data.get('folder') == str(index.folder.resolve()) \
+                and data.get('extensions') == sorted(index.extensions):
+            index.folder_mtime = data['folder_mtime']
+            index.rows = [tuple(row) for row in data['files']]
+            index.mtimes = [row[0] for row in index.rows]
+        return index
+
+    def scan(self) -> int:
+        '''
+        Bring the table up to date with the folder
+
+        Returns the number of files that were stat'd
+        '''
+        folder_mtime = self.folder.stat().st_mtime_ns
+        if folder_mtime == self.folder_mtime:
+            return 0
+        known = {name: (mtime, inode) for mtime, name, inode in self.rows}
+        rows = []
+        checked = 0
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if os.path.splitext(entry.name)[1].lower() not in self.extensions or not entry.is_file():
+                    continue
+                mtime, inode = known.get(entry.name, (None, None))
+                if inode != entry.inode():
+                    mtime = entry.stat().st_mtime_ns
+                    checked += 1
+                rows.append((mtime, entry.name, entry.inode()))
+        rows.sort()
+        self.rows = rows
+        self.mtimes = [row[0] for row in rows]
+        self.folder_mtime = folder_mtime if time_ns() - folder_mtime > RACY_WINDOW_NS else None
+        return checked
+
+    def select(self, start_date: datetime, end_date: datetime) -> List[Tuple[int, str]]:
+        '''
+        Files modified within a date range
+
+        start_date : Start of the range (inclusive)
+        end_date : End of the range (inclusive)
+
+        Returns list of (mtime in nanoseconds, file name), oldest first
+        '''
+        low = bisect_left(self.mtimes, timestamp_ns(start_date))
+        high = bisect_right(self.mtimes, timestamp_ns(end_date))
+        return [(mtime, name) for mtime, name, _inode in self.rows[low:high]]
+
+    def discard(self, names: Iterable[str]) -> None:
+        '''
+        Drop files that were moved out of the folder
+
+        names : File names to drop
+        '''
+        names = set(names)
+        if not names:
+            return
+        self.rows = [row for row in self.rows if row[1] not in names]
+        self.mtimes = [row[0] for row in self.rows]
+        # Moving the files changed the folder mtime, so the folder is listed again on the next scan
+        self.folder_mtime = None
+
+    def save(self) -> None:
+        '''
+        Write the index file, if the index is persisted
+        '''
+        if self.path is None:
+            return
+        temp_path = self.path.with_name(f'.{self.path.name}.tmp')
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path.write_text(dumps({
+                'version': MEDIA_INDEX_VERSION,
+                'folder': str(self.folder.resolve()),
+                'extensions': sorted(self.extensions),
+                'folder_mtime': self.folder_mtime,
+                'files': self.rows,
+            }, separators=(',', ':')))
+            temp_path.replace(self.path)
+        except OSError:
+            # The index is only a shortcut, so a folder that cannot be written to is skipped
+            pass
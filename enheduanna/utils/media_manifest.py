@@ -0,0 +1,135 @@
+from hashlib import file_digest
+from json import dumps, loads
+from pathlib import Path
+from typing import Set
+import os
+
+MEDIA_MANIFEST_NAME = '.media-manifest.json'
+# Bump when the manifest layout changes
+MEDIA_MANIFEST_VERSION = 1
+
+def media_hash(path: Path) -> str:
+    '''
+    Content hash of a media file, read in chunks
+
+    path : Media file path
+    '''
+    with open(path, 'rb') as stream:
+        return file_digest(stream, 'sha256').hexdigest()
+
+class MediaManifest:
+    '''
+    Record of the media files ingested into a collation folder
+
+    Each source file is stored under its path with its size, mtime and content hash, along
+    with the subfolder and name it was ingested as. Files that still match are not copied
+    again, and content already ingested into a subfolder from another path reuses its name.
+    New names are numbered against the names in the manifest and one listing of the
+    subfolder, rather than probing for each candidate name.
+
+    collation_dir : Collation folder
+    '''
+    def __init__(self, collation_dir: Path):
+        self.path = collation_dir / MEDIA_MANIFEST_NAME
+        self.collation_dir = collation_dir
+        self.files = {}
+        self._hashes = {}
+        self._names = {}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, collation_dir: Path) -> 'MediaManifest':
+        '''
+        Load the media manifest of a collation folder, starting empty if it is missing or unreadable
+
+        collation_dir : Collation folder
+        '''
+        manifest = cls(collation_dir)
+        try:
+            data = loads(manifest.path.read_text())
+        except (OSError, ValueError):
+            return manifest
+        if isinstance(data, dict) and data.get('version') == MEDIA_MANIFEST_VERSION:
+            manifest.files = data['files']
+            manifest._hashes = {(record['subfolder'], record['hash']): record['name'] for record in manifest.files.values()}
+        return manifest
+
+    def check(self, source_path: Path, subfolder: str) -> dict:
+        '''
+        Record of a source file as it is now
+
+        The file is only hashed when its size or mtime changed since it was recorded.
+
+        source_path : Resolved source file path
+        subfolder : Subfolder the file is ingested into
+
+        Returns dict of size, mtime, hash, subfolder and name, where name is None if the content is new to the subfolder
+        '''
+        stat = source_path.stat()
+        record = self.files.get(str(source_path))
+        if record and record['subfolder'] == subfolder \
+                and record['size'] == stat.st_size and record['mtime'] == stat.st_mtime_ns:
+            return record
+        digest = media_hash(source_path)
+        return {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'hash': digest,
+            'subfolder': subfolder,
+            'name': self._hashes.get((subfolder, digest)),
+        }
+
+    def _taken(self, subfolder: str) -> Set[str]:
+        '''
+        Names used in a subfolder, from the manifest and a listing of the subfolder
+        '''
+        if subfolder not in self._names:
+            names = {record['name'] for record in self.files.values() if record['subfolder'] == subfolder}
+            media_dir = self.collation_dir / subfolder
+            if media_dir.is_dir():
+                names.update(os.listdir(media_dir))
+            self._names[subfolder] = names
+        return self._names[subfolder]
+
+    def new_name(self, subfolder: str, stem: str, suffix: str) -> str:
+        '''
+        Free name in a subfolder, numbering the stem when it is taken
+
+        subfolder : Subfolder the file is ingested into
+        stem : Preferred name without the extension
+        suffix : File extension
+        '''
+        taken = self._taken(subfolder)
+        name = f'{stem}{suffix}'
+        counter = 1
+        while name in taken:
+            name = f'{stem}_{counter}{suffix}'
+            counter += 1
+        taken.add(name)
+        return name
+
+    def add(self, source_path: Path, record: dict) -> None:
+        '''
+        Record a source file once it is ingested
+
+        source_path : Resolved source file path
+        record : Record from check, with the name it was ingested as
+        '''
+        key = str(source_path)
+        if self.files.get(key) == record:
+            return
+        self.files[key] = record
+        self._hashes[(record['subfolder'], record['hash'])] = record['name']
+        self._dirty = True
+
+    def save(self) -> None:
+        '''
+        Write the manifest to the collation folder if anything changed
+        '''
+        if not self._dirty:
+            return
+        self.path.write_text(dumps({
+            'version': MEDIA_MANIFEST_VERSION,
+            'files': self.files,
+        }, separators=(',', ':')))
+        self._dirty = False
@@ -0,0 +1,141 @@
+from pathlib import Path
+from typing import Tuple, Union
+import os
+import shutil
+
+from enheduanna.types.config.file import FileConfig
+from enheduanna.utils.media_manifest import MEDIA_MANIFEST_NAME, MediaManifest
+
+MEDIA_STORE_NAME = '.media-store'
+# ioctl request to clone a file's extents on Linux, from linux/fs.h
+FICLONE = 0x40049409
+
+def reflink(source: Path, target: Path) -> None:
+    '''
+    Clone a file so both share their data until one is written to
+
+    source : Existing file
+    target : New file path
+
+    Raises OSError where the platform or filesystem does not support it
+    '''
+    try:
+        import fcntl #pylint:disable=import-outside-toplevel
+    except ImportError as e: # pragma: no cover
+        raise OSError('Reflinks are not supported on this platform') from e
+    with open(source, 'rb') as source_stream, open(target, 'xb') as target_stream:
+        try:
+            fcntl.ioctl(target_stream.fileno(), FICLONE, source_stream.fileno())
+        except OSError:
+            target_stream.close()
+            target.unlink()
+            raise
+    shutil.copystat(source, target)
+
+class MediaStore:
+    '''
+    Content addressed store of ingested media, kept in the entries folder
+
+    Each file is stored once as a blob named after its content hash, and placed in
+    collation folders as a reflink where the filesystem supports them, as a hard link
+    otherwise, and as a copy when neither works. Hard linked media share their data
+    with the blob, so editing one in place edits every collation it was placed in.
+
+    folder : Store folder
+    '''
+    def __init__(self, folder: Path):
+        self.folder = folder
+
+    @classmethod
+    def from_config(cls, config: FileConfig) -> Union['MediaStore', None]:
+        '''
+        Build the media store from config, or None when the store is disabled
+
+        config : File config
+        '''
+        if not config.media.store:
+            return None
+        return cls(config.entries_folder / MEDIA_STORE_NAME)
+
+    def blob_path(self, digest: str, suffix: str) -> Path:
+        '''
+        Path of the blob holding some content
+
+        digest : Content hash
+        suffix : File extension
+        '''
+        return self.folder / digest[:2] / f'{digest}{suffix.lower()}'
+
+    def add(self, source_path: Path, digest: str, move: bool = False) -> Path:
+        '''
+        Store a file, unless its content is already stored
+
+        source_path : Media file path
+        digest : Content hash of the file
+        move : Remove the source file once it is stored
+
+        Returns the blob path
+        '''
+        blob = self.blob_path(digest, source_path.suffix)
+        if blob.exists():
+            if move:
+                source_path.unlink()
+            return blob
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = blob.with_name(f'.{blob.name}.tmp')
+        if move:
+            shutil.move(str(source_path), str(temp_path))
+        else:
+            shutil.copy2(str(source_path), str(temp_path))
+        temp_path.replace(blob)
+        return blob
+
+    def place(self, blob: Path, target: Path) -> str:
+        '''
+        Place a stored blob in a collation folder
+
+        blob : Blob path
+        target : New file path
+
+        Returns how the file was placed, "reflinked", "linked" or "copied"
+        '''
+        try:
+            reflink(blob, target)
+            return 'reflinked'
+        except OSError:
+            pass
+        try:
+            os.link(blob, target)
+            return 'linked'
+        except OSError:
+            shutil.copy2(str(blob), str(target))
+            return 'copied'
+
+    def gc(self, entries_folder: Path) -> Tuple[int, int]:
+        '''
+        Remove blobs no collation folder uses anymore
+
+        A blob is in use while a collation folder's media manifest records a file with its
+        hash, and that file is still in the collation folder.
+
+        entries_folder : Folder holding all collation subfolders
+
+        Returns tuple of (blobs removed, bytes freed)
+        '''
+        used = set()
+        for manifest_path in entries_folder.glob(f'*/{MEDIA_MANIFEST_NAME}'):
+            manifest = MediaManifest.load(manifest_path.parent)
+            used.update(record['hash'] for record in manifest.files.values()
+                        if (manifest.collation_dir / record['subfolder'] / record['name']).exists())
+        removed = 0
+        freed = 0
+        for blob in sorted(self.folder.glob('*/*')):
+            if blob.name.split('.')[0] in used:
+                continue
+            freed += blob.stat().st_size
+            blob.unlink()
+            removed += 1
+        for shard in self.folder.glob('*'):
+            if shard.is_dir() and not any(shard.iterdir()):
+                shard.rmdir()
+        return removed, freed
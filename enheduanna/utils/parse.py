@@ -0,0 +1,58 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_all_start_methods, get_context
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from enheduanna.types.markdown.markdown_file import MarkdownFile, generate_markdown_sections
+from enheduanna.types.markdown.markdown_section import MarkdownSection
+
+# Below this many files to parse, process startup costs more than it saves
+PARALLEL_MIN_FILES = 32
+# Files are parsed from threads (collate --all) and the daemon, and forking a process that
+# runs threads can deadlock, so workers start from a clean server process where there is one
+START_METHOD = 'forkserver' if 'forkserver' in get_all_start_methods() else 'spawn'
+
+def _parse_text(job: Tuple[str, bool]) -> MarkdownSection:
+    '''
+    Parse markdown text, run in worker processes
+
+    job : Tuple of markdown text and lossless flag
+    '''
+    text, lossless = job
+    return generate_markdown_sections(text, lossless=lossless)
+
+def parse_markdown_files(paths: Iterable[Path], lossless: bool = False, cache=None, jobs: int = 1) -> List[MarkdownFile]:
+    '''
+    Parse markdown files, optionally across a process pool
+
+    Cache lookups and file reads happen in this process; only the parsing is
+    handed to workers. Results keep the order of paths, so output matches a serial run.
+
+    paths : Markdown file paths in order
+    lossless : Keep source offsets so unmodified sections are written back as they were read
+    cache : Optional ParseCache to reuse parsed trees from, not used in lossless mode
+    jobs : Number of worker processes
+    '''
+    paths = list(paths)
+    sections = [None] * len(paths)
+    pending = []
+    texts = []
+    for (count, path) in enumerate(paths):
+        if cache is not None and not lossless:
+            sections[count], text = cache.get(path)
+            if sections[count] is not None:
+                continue
+        else:
+            text = path.read_text()
+        pending.append(count)
+        texts.append((text, lossless))
+    if jobs > 1 and len(texts) >= PARALLEL_MIN_FILES:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=get_context(START_METHOD)) as executor:
+            parsed = list(executor.map(_parse_text, texts, chunksize=max(1, len(texts) // (jobs * 4))))
+    else:
+        parsed = [_parse_text(job) for job in texts]
+    for (count, section) in zip(pending, parsed):
+        sections[count] = section
+        if cache is not None and not lossless:
+            cache.put(paths[count], section)
+    return [MarkdownFile(path, section) for (path, section) in zip(paths, sections)]
@@ -0,0 +1,241 @@
+from datetime import datetime
+from hashlib import sha256
+from json import dumps
+from pathlib import Path
+from typing import Dict, List, Tuple
+import os
+
+from enheduanna.types.config.file import FileConfig
+from enheduanna.types.markdown.collate_section import CollateSection
+from enheduanna.types.markdown.collation_plan import CollationPlan
+from enheduanna.types.markdown.markdown_file import MarkdownFile, generate_markdown_sections
+from enheduanna.types.markdown.markdown_section import MarkdownSection
+from enheduanna.utils.cache import pack_section, unpack_section
+from enheduanna.utils.collation import list_collation_folders
+from enheduanna.utils.collation.manifest import collation_fingerprint, read_manifest
+from enheduanna.utils.markdown import combine_collate_fragments
+from enheduanna.utils.media import parse_collation_folder_name
+from enheduanna.utils.write_plan import WritePlan
+
+ROLLUP_MANIFEST_NAME = '.rollup-manifest.json'
+
+def summary_fragments(root_section: MarkdownSection, collation_plan: CollationPlan) -> List[Tuple[CollateSection, MarkdownSection]]:
+    '''
+    Find the collate section fragments of a summary
+
+    Summaries write every combined section at level 2, whatever level it is collated from,
+    so sections are matched by title.
+
+    root_section : Summary root section
+    collation_plan : Compiled collate sections and titles ignored in summaries
+    '''
+    return [(collate_section, section) for section in root_section.sections
+            if section.level == 2 and section.title not in collation_plan.ignore_sections
+            for collate_section in collation_plan.match_title(section.title)]
+
+def period_names(start: datetime) -> Tuple[str, str]:
+    '''
+    Quarter and year names for the period a collation folder starts in
+
+    start : Start date of the collation folder
+    '''
+    return f'{start.year}-Q{(start.month - 1) // 3 + 1}', f'{start.year}'
+
+class RollupManifest:
+    '''
+    Record of the summaries and combined sections behind each rollup
+
+    Summaries are stored with their size, mtime, hash and collate section fragments,
+    and each period with the sources it was built from and its combined sections, so
+    a rollup is only rebuilt when one of its sources changed and a year is built from
+    its quarters without reading any summaries.
+
+    output_dir : Folder the rollups are written to
+    collation_plan : Compiled collate sections and titles ignored in summaries
+    '''
+    def __init__(self, output_dir: Path, collation_plan: CollationPlan):
+        self.path = output_dir / ROLLUP_MANIFEST_NAME
+        self.collation_plan = collation_plan
+        self.fingerprint = collation_fingerprint(collation_plan)
+        self.summaries = {}
+        self.periods = {}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, output_dir: Path, collation_plan: CollationPlan) -> 'RollupManifest':
+        '''
+        Load the rollup manifest, starting empty if it is missing, unreadable or for other config
+
+        output_dir : Folder the rollups are written to
+        collation_plan : Compiled collate sections and titles ignored in summaries
+        '''
+        manifest = cls(output_dir, collation_plan)
+        data = read_manifest(manifest.path, manifest.fingerprint)
+        if data is None:
+            return manifest
+        manifest.summaries = data['summaries']
+        manifest.periods = data['periods']
+        return manifest
+
+    def refresh_summary(self, key: str, summary_path: Path) -> bool:
+        '''
+        Bring the fragments recorded for a summary up to date
+
+        key : Name the summary is recorded under
+        summary_path : Summary file path
+
+        Returns whether the summary changed since it was last recorded
+        '''
+        stat = summary_path.stat()
+        record = self.summaries.get(key)
+        if record and record['size'] == stat.st_size and record['mtime'] == stat.st_mtime_ns:
+            return False
+        data = summary_path.read_bytes()
+        digest = sha256(data).hexdigest()
+        changed = not record or record['hash'] != digest
+        if changed:
+            root_section = generate_markdown_sections(data.decode('utf-8'))
+            fragments = [[self.collation_plan.index(collate_section), pack_section(section)]
+                         for collate_section, section in summary_fragments(root_section, self.collation_plan)]
+        else:
+            fragments = record['fragments']
+        self.summaries[key] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': digest, 'fragments': fragments}
+        self._dirty = True
+        return changed
+
+    def fragments(self, packed: list) -> List[Tuple[CollateSection, MarkdownSection]]:
+        '''
+        Rebuild (CollateSection, section) fragments from manifest data
+
+        packed : List of [collate section index, packed section] pairs
+        '''
+        return [(self.collation_plan.collate_sections[index], unpack_section(section)) for index, section in packed]
+
+    def needs_build(self, period: str, sources: List[str], changed: bool, output_path: Path) -> bool:
+        '''
+        Check a rollup has to be rebuilt
+
+        period : Period name
+        sources : Names of the summaries or periods it is built from
+        changed : Whether any of its sources changed
+        output_path : Rollup file path
+        '''
+        return changed or period not in self.periods or self.periods[period]['sources'] != sources or not output_path.exists()
+
+    def set_period(self, period: str, sources: List[str], combined: List[MarkdownSection]) -> None:
+        '''
+        Record the combined sections of a rebuilt rollup
+
+        period : Period name
+        sources : Names of the summaries or periods it was built from
+        combined : Combined sections
+        '''
+        self.periods[period] = {
+            'sources': sources,
+            'combined': [[self.collation_plan.title_index(section.title), pack_section(section)] for section in combined],
+        }
+        self._dirty = True
+
+    def prune(self, entries_folder: Path) -> None:
+        '''
+        Forget summaries whose collation folder no longer exists
+
+        entries_folder : Folder holding the collation folders
+        '''
+        removed = [key for key in self.summaries if not (entries_folder / key).is_dir()]
+        for key in removed:
+            del self.summaries[key]
+        self._dirty = self._dirty or bool(removed)
+
+    def save(self) -> None:
+        '''
+        Write the manifest if anything changed
+        '''
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(dumps({
+            'fingerprint': self.fingerprint,
+            'summaries': self.summaries,
+            'periods': self.periods,
+        }, separators=(',', ':')))
+        self._dirty = False
+
+def _stage_rollup(title: str, combined: List[MarkdownSection], links: List[Tuple[str, Path]],
+                  output_path: Path, file_config: FileConfig, write_plan: WritePlan) -> None:
+    '''
+    Stage a rollup document with links to its sources and the combined sections
+    '''
+    document = MarkdownSection(title, '')
+    if file_config.toc.enabled and links:
+        lines = []
+        for name, path in links:
+            link = os.path.relpath(path, output_path.parent)
+            lines.append(f'- [{name}]({link if link.startswith("..") else f"./{link}"})')
+        document.add_section(MarkdownSection(file_config.toc.summary_title, '\n'.join(lines), level=2))
+    for section in combined:
+        section.level = 2
+        document.add_section(section)
+    write_plan.stage(MarkdownFile(output_path, document))
+
+def build_rollups(manifest: RollupManifest, output_dir: Path, collate_name: str, file_config: FileConfig,
+                  write_plan: WritePlan, year: int = None) -> List[Tuple[Path, bool]]:
+    '''
+    Build quarter and year rollups from the collation summaries in the entries folder
+
+    Quarters are combined from the summaries of the folders starting in them, and years from
+    their quarters. Only rollups whose sources changed are rebuilt.
+
+    manifest : Rollup manifest
+    output_dir : Folder the rollups are written to
+    collate_name : Name of the summary file within each collation folder
+    file_config : File config
+    write_plan : Write plan the rebuilt rollups are staged in
+    year : Only build rollups for this year
+
+    Returns list of (rollup path, whether it was rebuilt), quarters before their year
+    '''
+    manifest.prune(file_config.entries_folder)
+    quarters: Dict[str, List[Path]] = {}
+    for folder in list_collation_folders(file_config.entries_folder, file_config.date_output_format):
+        summary_path = folder / collate_name
+        if not summary_path.exists():
+            continue
+        start, _end = parse_collation_folder_name(folder.name, file_config.date_output_format)
+        if year and start.year != year:
+            continue
+        quarters.setdefault(period_names(start)[0], []).append(summary_path)
+
+    results = []
+    years: Dict[str, List[str]] = {}
+    changed_periods = set()
+    for quarter, summary_paths in quarters.items():
+        sources = [path.parent.name for path in summary_paths]
+        changed = [manifest.refresh_summary(name, path) for name, path in zip(sources, summary_paths)]
+        output_path = output_dir / f'{quarter}.md'
+        rebuild = manifest.needs_build(quarter, sources, any(changed), output_path)
+        if rebuild:
+            fragments = []
+            for name in sources:
+                fragments.extend(manifest.fragments(manifest.summaries[name]['fragments']))
+            combined = combine_collate_fragments(fragments)
+            manifest.set_period(quarter, sources, combined)
+            links = [(name.replace('_', ' -> '), path) for name, path in zip(sources, summary_paths)]
+            _stage_rollup(f'Rollup | {quarter.replace("-", " ")}', combined, links, output_path, file_config, write_plan)
+            changed_periods.add(quarter)
+        results.append((output_path, rebuild))
+        years.setdefault(quarter[:4], []).append(quarter)
+
+    for year_name, quarter_names in years.items():
+        output_path = output_dir / f'{year_name}-Year.md'
+        rebuild = manifest.needs_build(year_name, quarter_names, bool(changed_periods.intersection(quarter_names)), output_path)
+        if rebuild:
+            fragments = []
+            for quarter in quarter_names:
+                fragments.extend(manifest.fragments(manifest.periods[quarter]['combined']))
+            combined = combine_collate_fragments(fragments)
+            manifest.set_period(year_name, quarter_names, combined)
+            links = [(quarter.replace('-', ' '), output_dir / f'{quarter}.md') for quarter in quarter_names]
+            _stage_rollup(f'Rollup | {year_name}', combined, links, output_path, file_config, write_plan)
+        results.append((output_path, rebuild))
+    return results
@@ -5,6 +5,7 @@ import os
 from enheduanna.types.config.toc import TocConfig
 from enheduanna.types.markdown.markdown_file import MarkdownFile
 from enheduanna.types.markdown.markdown_section import MarkdownSection
+from enheduanna.utils.write_plan import WritePlan
 
 
 def _relative_link(target: Path, base_dir: Path) -> str:
@@ -52,18 +53,23 @@ def build_summary_toc_section(file_dir: Path, markdown_files: List[MarkdownFile]
     return toc_section
 
 
-def update_root_index(entries_folder: Path, collate_name: str, toc_config: TocConfig) -> Union[Path, None]:
+def update_root_index(entries_folder: Path, collate_name: str, toc_config: TocConfig,
+                      write_plan: WritePlan = None, summary_folders: List[Path] = None) -> Union[Path, None]:
     '''
     Create or refresh the root index file that links to each collation summary
 
     entries_folder : Folder holding all collation subfolders
     collate_name : Name of the summary file within each collation folder
     toc_config : Table of contents configuration
+    write_plan : Stage the index here instead of writing it straight away, summaries staged in it count as existing
+    summary_folders : Folders to check for summaries, for example from the workspace index, instead of listing entries_folder
 
     Returns the path to the written index file, or None when there is nothing to index
     '''
-    folders = sorted((child for child in entries_folder.iterdir()
-                      if child.is_dir() and (child / collate_name).exists()), reverse=True)
+    plan = write_plan or WritePlan()
+    if summary_folders is None:
+        summary_folders = [child for child in entries_folder.iterdir() if child.is_dir()]
+    folders = sorted((folder for folder in summary_folders if plan.exists(folder / collate_name)), reverse=True)
     if not folders:
         return None
     lines = []
@@ -72,5 +78,7 @@ def update_root_index(entries_folder: Path, collate_name: str, toc_config: TocCo
         lines.append(f'- [{pretty}](./{folder.name}/{collate_name})')
     index_section = MarkdownSection(toc_config.root_index_title, '\n'.join(lines), level=1)
     index_path = entries_folder / toc_config.root_index_name
-    index_path.write_text(index_section.write())
+    plan.stage(MarkdownFile(index_path, index_section))
+    if write_plan is None:
+        plan.commit()
     return index_path
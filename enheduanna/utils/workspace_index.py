@@ -0,0 +1,271 @@
+from contextlib import closing
+from datetime import datetime
+from hashlib import sha256
+from pathlib import Path
+from re import match
+from typing import Iterable, List, Tuple, Union
+import sqlite3
+import sys
+
+from enheduanna.types.config.file import FileConfig
+from enheduanna.types.markdown.collation_plan import CollationPlan
+from enheduanna.types.markdown.markdown_file import generate_markdown_sections
+from enheduanna.types.markdown.markdown_section import MarkdownException, MarkdownSection
+from enheduanna.utils.files import MATCH_ENTRY
+
+# Bump when the schema or what gets indexed changes, the index is then rebuilt from scratch
+INDEX_VERSION = 1
+
+DROP_SCHEMA = '''
+DROP TABLE IF EXISTS items;
+DROP TABLE IF EXISTS sections;
+DROP TABLE IF EXISTS files;
+'''
+
+SCHEMA = '''
+CREATE TABLE files (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_entry INTEGER NOT NULL,
+    entry_date TEXT,
+    title TEXT,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE INDEX files_folder ON files (folder, name);
+CREATE INDEX files_entry ON files (is_entry, name);
+CREATE TABLE sections (
+    path TEXT NOT NULL REFERENCES files (path) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    parent INTEGER,
+    title TEXT,
+    level INTEGER NOT NULL,
+    start INTEGER,
+    end INTEGER,
+    PRIMARY KEY (path, position)
+);
+CREATE TABLE items (
+    path TEXT NOT NULL REFERENCES files (path) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    collate_title TEXT NOT NULL,
+    key TEXT NOT NULL,
+    line TEXT NOT NULL
+);
+CREATE INDEX items_key ON items (key);
+'''
+
+class WorkspaceIndex:
+    '''
+    SQLite index of the markdown files in the entries and document folders
+
+    Each file is stored with its folder, entry date, size, mtime and content hash,
+    its section tree with titles, levels and source offsets, and the group keys of
+    the lines matched by collate section regexes. Files are updated as commands
+    write them; run reindex to pick up changes made outside of enheduanna.
+
+    path : SQLite database path
+    entries_folder : Folder holding all collation subfolders
+    document_folder : Folder holding extracted documents
+    collation_plan : Compiled collate sections, used to find line item keys
+    date_format : Date format used in entry file names
+    '''
+    def __init__(self, path: Path, entries_folder: Path, document_folder: Path,
+                 collation_plan: CollationPlan, date_format: str):
+        self.path = Path(path).expanduser()
+        self.entries_folder = Path(entries_folder)
+        self.document_folder = Path(document_folder)
+        self.collation_plan = collation_plan
+        self.date_format = date_format
+        self._connection = None
+
+    @classmethod
+    def from_config(cls, config: FileConfig) -> Union['WorkspaceIndex', None]:
+        '''
+        Build a workspace index from config, or None when the index is disabled
+
+        config : File config
+        '''
+        if not config.index.enabled:
+            return None
+        return cls(config.index.path, config.entries_folder, config.document_folder,
+                   config.collation_plan, config.date_output_format)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        '''
+        Open database connection, creating the schema on first use
+        '''
+        if self._connection is not None:
+            return self._connection
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        connection.execute('PRAGMA foreign_keys = ON')
+        self._connection = connection
+        if connection.execute('PRAGMA user_version').fetchone()[0] != INDEX_VERSION:
+            connection.executescript(DROP_SCHEMA + SCHEMA)
+            connection.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+            connection.commit()
+            # A new or outdated index is filled from the folders on first use
+            self.reindex()
+        return connection
+
+    def close(self) -> None:
+        '''
+        Commit pending changes and close the connection
+        '''
+        if self._connection is None:
+            return
+        self._connection.commit()
+        self._connection.close()
+        self._connection = None
+
+    def _entry_date(self, path: Path) -> Union[str, None]:
+        '''
+        ISO date of an entry file, from its name
+        '''
+        try:
+            return datetime.strptime(path.stem, self.date_format).date().isoformat()
+        except ValueError:
+            return None
+
+    def _is_tracked(self, path: Path) -> bool:
+        '''
+        Check if a resolved path is inside the entries or document folder
+        '''
+        return any(folder.resolve() in path.parents for folder in (self.entries_folder, self.document_folder))
+
+    def _section_rows(self, key: str, root_section: MarkdownSection) -> Tuple[list, list]:
+        '''
+        Rows for the sections and line items of a parsed file
+        '''
+        sections = []
+        items = []
+        stack = [(root_section, None)]
+        while stack:
+            section, parent = stack.pop()
+            position = len(sections)
+            span = section.span
+            sections.append((key, position, parent, section.title, section.level,
+                             span.start if span else None, span.end if span else None))
+            for collate_section in self.collation_plan.match(section):
+                if not collate_section.pattern:
+                    continue
+                for line in section.contents.split('\n'):
+                    matcher = collate_section.pattern.search(line)
+                    # An optional group that did not take part in the match has no key to group on
+                    if matcher and matcher.group(collate_section.groupBy) is not None:
+                        items.append((key, position, collate_section.title, matcher.group(collate_section.groupBy), line))
+            stack.extend((child, position) for child in reversed(section.sections))
+        return sections, items
+
+    def update(self, paths: Iterable[Path]) -> int:
+        '''
+        Bring the index up to date for the given files, removing files that no longer exist
+
+        paths : Markdown file paths, paths outside the entries and document folders are skipped
+
+        Returns the number of files that were parsed
+        '''
+        parsed = 0
+        connection = self.connection
+        for path in paths:
+            path = Path(path).resolve()
+            key = str(path)
+            if path.suffix != '.md' or not self._is_tracked(path):
+                continue
+            if not path.is_file():
+                connection.execute('DELETE FROM files WHERE path = ?', (key,))
+                continue
+            stat = path.stat()
+            row = connection.execute('SELECT size, mtime, hash FROM files WHERE path = ?', (key,)).fetchone()
+            if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+                continue
+            data = path.read_bytes()
+            digest = sha256(data).hexdigest()
+            if row and row[2] == digest:
+                connection.execute('UPDATE files SET size = ?, mtime = ? WHERE path = ?', (stat.st_size, stat.st_mtime_ns, key))
+                continue
+            try:
+                text = data.decode('utf-8')
+            except UnicodeDecodeError:
+                print(f'Warning: skipping {path}, it is not valid UTF-8', file=sys.stderr)
+                connection.execute('DELETE FROM files WHERE path = ?', (key,))
+                continue
+            try:
+                root_section = generate_markdown_sections(text, lossless=True)
+            except MarkdownException:
+                # Files the parser rejects are still listed, just without sections
+                root_section = None
+            is_entry = bool(match(MATCH_ENTRY, path.name)) and self.entries_folder.resolve() in path.parents
+            connection.execute('DELETE FROM files WHERE path = ?', (key,))
+            connection.execute('INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                key, str(path.parent), path.name, is_entry, self._entry_date(path) if is_entry else None,
+                root_section.title if root_section else None, stat.st_size, stat.st_mtime_ns, digest))
+            if root_section:
+                sections, items = self._section_rows(key, root_section)
+                connection.executemany('INSERT INTO sections VALUES (?, ?, ?, ?, ?, ?, ?)', sections)
+                connection.executemany('INSERT INTO items VALUES (?, ?, ?, ?, ?)', items)
+            parsed += 1
+        connection.commit()
+        return parsed
+
+    def reindex(self) -> Tuple[int, int]:
+        '''
+        Index every markdown file in the entries and document folders, and drop files that are gone
+
+        Returns tuple of (files indexed, files parsed)
+        '''
+        paths = set()
+        for folder in (self.entries_folder, self.document_folder):
+            if folder.exists():
+                paths.update(path.resolve() for path in folder.rglob('*.md') if path.is_file())
+        with closing(self.connection.execute('SELECT path FROM files')) as cursor:
+            known = {Path(row[0]) for row in cursor}
+        parsed = self.update(sorted(paths | known))
+        return len(paths), parsed
+
+    def latest_entry(self) -> Union[Path, None]:
+        '''
+        Newest entry file in the index, or None if it has none
+        '''
+        row = self.connection.execute('SELECT path FROM files WHERE is_entry AND entry_date IS NOT NULL '
+                                      'ORDER BY entry_date DESC, name DESC LIMIT 1').fetchone()
+        return Path(row[0]) if row else None
+
+    def entries(self, folder: Path) -> List[Path]:
+        '''
+        Entry files in a folder, in name order
+
+        folder : Collation folder
+        '''
+        rows = self.connection.execute('SELECT path FROM files WHERE folder = ? AND is_entry ORDER BY name',
+                                       (str(Path(folder).resolve()),))
+        return [Path(row[0]) for row in rows]
+
+    def summary_folders(self, collate_name: str, staged: Iterable[Path] = ()) -> List[Path]:
+        '''
+        Folders directly under the entries folder holding a summary file
+
+        collate_name : Summary file name
+        staged : Extra folders whose summary is staged but not written yet
+        '''
+        rows = self.connection.execute('SELECT folder FROM files WHERE name = ?', (collate_name,))
+        entries_folder = self.entries_folder.resolve()
+        folders = {Path(row[0]) for row in rows} | {Path(folder).resolve() for folder in staged}
+        return sorted(folder for folder in folders if folder.parent == entries_folder)
+
+    def find_items(self, key: str) -> List[Tuple[Path, str, str]]:
+        '''
+        Lines whose collate section regex matched a group key
+
+        key : Group key, for example a ticket number
+
+        Returns list of (file path, section title, line), in file and section order
+        '''
+        rows = self.connection.execute(
+            'SELECT items.path, sections.title, items.line FROM items '
+            'JOIN sections ON sections.path = items.path AND sections.position = items.position '
+            'WHERE items.key = ? ORDER BY items.path, items.position, items.rowid', (key,))
+        return [(Path(path), title, line) for path, title, line in rows]
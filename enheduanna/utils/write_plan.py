@@ -0,0 +1,206 @@
+from contextlib import nullcontext
+from itertools import chain
+from pathlib import Path
+from shutil import copymode
+from typing import Dict, Iterable, List, Union
+import os
+
+from enheduanna.types.markdown.markdown_file import MarkdownFile
+
+def _replace_if_changed(path: Path, chunks: Iterable[str]) -> Union[int, None]:
+    '''
+    Stream text to a temp file, comparing it with the file on disk as it goes, and replace
+    the file only if anything differs
+
+    path : File path
+    chunks : Text of the file, in order
+
+    Returns the number of bytes written, or None if the file already matched
+    '''
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f'.{path.name}.tmp')
+    exists = path.exists()
+    size = 0
+    with (path.open('rb') if exists else nullcontext()) as current, temp_path.open('wb') as stream:
+        matches = exists
+        for chunk in chunks:
+            data = chunk.encode('utf-8')
+            stream.write(data)
+            size += len(data)
+            matches = matches and current.read(len(data)) == data
+        # Anything left on disk past the new text is a difference too
+        matches = matches and not current.read(1)
+        if not matches:
+            stream.flush()
+            os.fsync(stream.fileno())
+    if matches:
+        temp_path.unlink()
+        return None
+    if exists:
+        copymode(path, temp_path)
+    os.replace(temp_path, path)
+    return size
+
+class WritePlan:
+    '''
+    Collect the file writes of a command and commit them together
+
+    Each path is written at most once, with the content it was last staged with.
+    Every write is streamed to a temp file and renamed over the path, so a file is never
+    left half written, and the temp file is thrown away if its content matches what is
+    already on disk.
+    Text appended to a file that is otherwise unchanged is written with a single
+    append instead, so the cost does not depend on the size of the file.
+    '''
+    def __init__(self):
+        self._staged: Dict[Path, Union[MarkdownFile, str]] = {}
+        self._appends: Dict[Path, List[str]] = {}
+        self.files_written = 0
+        self.bytes_written = 0
+
+    def stage(self, markdown_file: MarkdownFile) -> None:
+        '''
+        Stage a markdown file, rendered from its section tree at commit time
+
+        markdown_file : Markdown file to write
+        '''
+        self._appends.pop(markdown_file.file_path, None)
+        self._staged[markdown_file.file_path] = markdown_file
+
+    def stage_text(self, path: Path, text: str) -> None:
+        '''
+        Stage text for a path, replacing anything staged for it before
+
+        path : File path
+        text : Full file contents
+        '''
+        self._appends.pop(path, None)
+        self._staged[path] = text
+
+    def stage_append(self, path: Path, text: str) -> None:
+        '''
+        Stage text to add to the end of a file
+
+        path : File path, either staged or existing on disk
+        text : Text to append
+        '''
+        if path in self._staged:
+            self._staged[path] = self.read(path) + text
+            return
+        self._appends.setdefault(path, []).append(text)
+
+    def appended(self, path: Path) -> Union[str, None]:
+        '''
+        Text staged to add to the end of a path as it is on disk
+
+        path : File path
+
+        Returns the text, or None if the full contents of the path are staged
+        '''
+        if path in self._staged:
+            return None
+        return ''.join(self._appends.get(path, []))
+
+    def exists(self, path: Path) -> bool:
+        '''
+        Check a path exists on disk or will once the plan is committed
+
+        path : File path
+        '''
+        return path in self._staged or path.exists()
+
+    def read(self, path: Path) -> str:
+        '''
+        Read a path as it will be once the plan is committed
+
+        path : File path
+        '''
+        content = self._staged.get(path)
+        if content is None:
+            return path.read_text() + ''.join(self._appends.get(path, []))
+        if isinstance(content, str):
+            return content
+        return content.root_section.write()
+
+    def size(self, path: Path) -> int:
+        '''
+        Size in bytes of a path as it will be once the plan is committed
+
+        path : File path
+        '''
+        if path in self._staged:
+            return len(self.read(path).encode('utf-8'))
+        return path.stat().st_size + sum(len(text.encode('utf-8')) for text in self._appends.get(path, []))
+
+    def list_markdown(self, folder: Path) -> List[Path]:
+        '''
+        Markdown files in a folder as it will be once the plan is committed
+
+        folder : Folder to list
+        '''
+        paths = set(folder.glob('*.md')) if folder.is_dir() else set()
+        paths.update(path for path in chain(self._staged, self._appends)
+                     if path.parent == folder and path.suffix == '.md')
+        return sorted(paths)
+
+    def head(self, path: Path, size: int = 4096) -> str:
+        '''
+        Read the start of a path as it will be once the plan is committed
+
+        path : File path
+        size : Number of bytes to read from disk
+        '''
+        if path in self._staged:
+            return self.read(path)[:size]
+        with path.open('rb') as stream:
+            return stream.read(size).decode('utf-8', errors='ignore')
+
+    def tail(self, path: Path, size: int = 2) -> str:
+        '''
+        Read the end of a path as it will be once the plan is committed
+
+        path : File path
+        size : Number of bytes to read from disk
+        '''
+        if path in self._staged:
+            return self.read(path)[-size:]
+        with path.open('rb') as stream:
+            stream.seek(max(path.stat().st_size - size, 0))
+            text = stream.read().decode('utf-8', errors='ignore')
+        return (text + ''.join(self._appends.get(path, [])))[-size:]
+
+    def commit(self) -> List[Path]:
+        '''
+        Write every staged path that changed
+
+        Returns the list of paths written
+        '''
+        written = []
+        for path, content in self._staged.items():
+            # Markdown files are streamed from their section tree rather than rendered in one piece
+            chunks = [content] if isinstance(content, str) else content.root_section._output() #pylint:disable=protected-access
+            size = _replace_if_changed(path, chunks)
+            if size is None:
+                continue
+            self.files_written += 1
+            self.bytes_written += size
+            written.append(path)
+        for path, texts in self._appends.items():
+            data = ''.join(texts).encode('utf-8')
+            # Append mode opens with O_APPEND, so only the new text is written
+            with path.open('ab') as stream:
+                stream.write(data)
+                stream.flush()
+                os.fsync(stream.fileno())
+            self.files_written += 1
+            self.bytes_written += len(data)
+            written.append(path)
+        self._staged = {}
+        self._appends = {}
+        return written
+
+    def summary(self) -> str:
+        '''
+        Short report of what was written
+        '''
+        return f'Files written: {self.files_written} ({self.bytes_written} bytes)'
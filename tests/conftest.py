@@ -0,0 +1,8 @@
+import pytest
+
+from enheduanna.utils.config_snapshot import SNAPSHOT_ENV
+
+@pytest.fixture(autouse=True)
+def isolate_config_snapshot(tmp_path, monkeypatch):
+    # Keep config snapshots out of the real home directory
+    monkeypatch.setenv(SNAPSHOT_ENV, str(tmp_path / 'config.snapshot'))
@@ -3,6 +3,8 @@ from datetime import datetime
 from distutils.dir_util import copy_tree
 from json import dumps
 from pathlib import Path
+from subprocess import run
+from sys import executable
 from tempfile import TemporaryDirectory, NamedTemporaryFile
 import os
 
@@ -14,11 +16,15 @@ from yaml import dump
 from enheduanna.cli import main
 
 from enheduanna.types.config import Config
+from enheduanna.types.config.cache import CacheConfig
 from enheduanna.types.config.collation import CollationConfig
 from enheduanna.types.config.file import FileConfig
+from enheduanna.types.config.index import IndexConfig
 from enheduanna.types.config.media import MediaConfig, MediaSource
 from enheduanna.types.config.toc import TocConfig
 from enheduanna.types.markdown.markdown_section import MarkdownSection
+from enheduanna.utils.config_snapshot import snapshot_path
+from enheduanna.utils.workspace_index import WorkspaceIndex
 
 DATA_PATH = Path(__file__).parent / 'data'
 
@@ -44,6 +50,19 @@ def temp_config_with_sections(sections):
                 config_path.write_text(dump(RootModel[Config](config).model_dump_json()))
                 yield config_path, config
 
+@contextmanager
+def temp_config_with_index():
+    with NamedTemporaryFile() as tmp_config:
+        config_path = Path(tmp_config.name)
+        with TemporaryDirectory() as note_dir:
+            with TemporaryDirectory() as doc_dir:
+                with TemporaryDirectory() as cache_dir:
+                    file_config = FileConfig(entries_folder=note_dir, document_folder=doc_dir,
+                                             index=IndexConfig(enabled=True, path=Path(cache_dir) / 'index.sqlite3'))
+                    config = Config(file_config, {})
+                    config_path.write_text(dump(RootModel[Config](config).model_dump_json()))
+                    yield config_path, config
+
 @freeze_time('2025-03-01 12:00:00', tz_offset=0)
 def test_new_entry():
     data_dir = DATA_PATH / '2025-02-24_2025-03-02'
@@ -51,7 +70,7 @@ def test_new_entry():
         copy_tree(data_dir, config.file.entries_folder / '2025-02-24_2025-03-02')
         runner = CliRunner()
         result = runner.invoke(main, ['-c', config_file, 'new-entry'])
-        assert result.output == f'Created entry file {config.file.entries_folder}/2025-02-24_2025-03-02/2025-03-01.md\n'
+        assert result.output == f'Created entry file {config.file.entries_folder}/2025-02-24_2025-03-02/2025-03-01.md\nFiles written: 2 (579 bytes)\n'
         expected_path = config.file.entries_folder / '2025-02-24_2025-03-02' / '2025-03-01.md'
         assert expected_path.exists()
         assert expected_path.read_text() == '# 2025-03-01\n\n## Work Done\n\n- \n\n## Meetings\n\n| Time | Meeting Name |\n| ---- | ------------ |\n| | |\n\n## Follow Ups\n\n### Short Term\n\n- Grab that report for the boss\n- Email back Jon\n\n### Long Term\n\n- Remind Jon that he knows nothing\n\n## Scratch\n\n- \n'
@@ -68,7 +87,7 @@ def test_collate():
         runner = CliRunner()
         result = runner.invoke(main, ['-c', config_file, 'collate', str(config.file.entries_folder / '2025-02-24_2025-03-02')])
 
-        assert result.output == f'Collation data written to file {config.file.entries_folder}/2025-02-24_2025-03-02/summary.md\nWriting document to file {config.file.document_folder}/2025-02-27 How to Answer Question.md\nWriting document to file {config.file.document_folder}/2025-02-27 Another Specific Question.md\nUpdated root index {config.file.entries_folder}/index.md\nCleaning up files in dir {config.file.entries_folder}/2025-02-24_2025-03-02\n'
+        assert result.output == f'Collation data written to file {config.file.entries_folder}/2025-02-24_2025-03-02/summary.md\nWriting document to file {config.file.document_folder}/2025-02-27 How to Answer Question.md\nWriting document to file {config.file.document_folder}/2025-02-27 Another Specific Question.md\nUpdated root index {config.file.entries_folder}/index.md\nCleaning up files in dir {config.file.entries_folder}/2025-02-24_2025-03-02\nFiles written: 6 (1395 bytes)\n'
         expected_summary = config.file.entries_folder / '2025-02-24_2025-03-02' / 'summary.md'
         assert expected_summary.exists()
         assert expected_summary.read_text() == '# Summary | 2025-02-24 -> 2025-03-02\n\n## Contents\n\n### Entries\n\n- [2025-02-27](./2025-02-27.md)\n- [2025-02-28](./2025-02-28.md)\n\n## Work Done\n\n- Writing up customer support (ABC-1234)\n- Doing some testing for customer fix (ABC-1234)\n\n- Helping Arya fix up her test suite\n- Doing self-reviews for the year\n'
@@ -89,6 +108,77 @@ def test_collate():
         assert scratch_file.exists()
         assert scratch_file.read_text() == '# 2025-02-27\n\n## Work Done\n\n- Writing up customer support (ABC-1234)\n\n## Meetings\n\n| Time | Summary |\n| ---- | ------- |\n| 0900 -> 1000 | Standup |\n| 1300 -> 1500 | Sync w/ Boss |\n'
 
+@freeze_time('2025-03-01 12:00:00', tz_offset=0)
+def test_collate_incremental():
+    data_dir = DATA_PATH / '2025-02-24_2025-03-02'
+    with temp_config() as (config_file, config):
+        entry_dir = config.file.entries_folder / '2025-02-24_2025-03-02'
+        copy_tree(data_dir, entry_dir)
+        runner = CliRunner()
+        result = runner.invoke(main, ['-c', config_file, 'collate', str(entry_dir)])
+        assert result.exit_code == 0
+        assert (entry_dir / '.collate-manifest.json').exists()
+        mtimes = {path: path.stat().st_mtime_ns for path in entry_dir.iterdir()}
+        mtimes[config.file.entries_folder / 'index.md'] = (config.file.entries_folder / 'index.md').stat().st_mtime_ns
+
+        # Nothing changed, so nothing is parsed or written
+        result = runner.invoke(main, ['-c', config_file, 'collate', str(entry_dir)])
+        assert result.output == f'Collation data unchanged in file {entry_dir}/summary.md\nFiles written: 0 (0 bytes)\n'
+        assert mtimes == {path: path.stat().st_mtime_ns for path in mtimes}
+
+        # A changed entry is picked up and matches a full rebuild
+        entry = entry_dir / '2025-02-28.md'
+        entry.write_text(entry.read_text().replace('- Doing self-reviews for the year', '- Doing self-reviews for the year\n- Follow up (ABC-1234)'))
+        result = runner.invoke(main, ['-c', config_file, 'collate', str(entry_dir)])
+        assert result.output == f'Collation data written to file {entry_dir}/summary.md\nUpdated root index {config.file.entries_folder}/index.md\nCleaning up files in dir {entry_dir}\nFiles written: 1 (328 bytes)\n'
+        incremental = (entry_dir / 'summary.md').read_text()
+        assert '- Follow up (ABC-1234)' in incremental
+        result = runner.invoke(main, ['-c', config_file, 'collate', '--full', str(entry_dir)])
+        assert (entry_dir / 'summary.md').read_text() == incremental
+
+def test_collate_all_folders():
+    with temp_config() as (config_file, config):
+        entries = config.file.entries_folder
+        for folder, day in [('2025-02-17_2025-02-23', '2025-02-18'), ('2025-02-24_2025-03-02', '2025-02-25'),
+                            ('2025-03-03_2025-03-09', '2025-03-04')]:
+            (entries / folder).mkdir()
+            (entries / folder / f'{day}.md').write_text(f'# {day}\n\n## Work Done\n\n- Work on {day}\n\n## Greg Weekly\n\n- Notes from {day}\n')
+        (config.file.document_folder / 'Greg Weekly.md').write_text('# Greg Weekly\n')
+        runner = CliRunner()
+        result = runner.invoke(main, ['-c', config_file, 'collate', '--all', '--workers', '2'])
+        assert result.exit_code == 0
+        assert result.output.count('Collation data written') == 3
+        assert result.output.endswith(f'Collated 3 folders\nUpdated root index {entries}/index.md\n')
+        # Aggregator appends land in date order even though folders are prepared concurrently
+        aggregate = (config.file.document_folder / 'Greg Weekly.md').read_text()
+        assert aggregate.index('2025-02-18') < aggregate.index('2025-02-25') < aggregate.index('2025-03-04')
+        assert (entries / 'index.md').read_text() == ('# Notes Index\n\n- [2025-03-03 -> 2025-03-09](./2025-03-03_2025-03-09/summary.md)\n'
+                                                      '- [2025-02-24 -> 2025-03-02](./2025-02-24_2025-03-02/summary.md)\n'
+                                                      '- [2025-02-17 -> 2025-02-23](./2025-02-17_2025-02-23/summary.md)\n')
+
+        # Nothing changed, so the index is left alone
+        result = runner.invoke(main, ['-c', config_file, 'collate', '--since', '2025-03-01'])
+        assert result.exit_code == 0
+        assert result.output.count('Collation data unchanged') == 2
+        assert result.output.endswith('Collated 2 folders\n')
+
+def test_collate_folder_arguments():
+    with temp_config() as (config_file, config):
+        runner = CliRunner()
+        result = runner.invoke(main, ['-c', config_file, 'collate'])
+        assert result.exit_code == 2
+        assert 'Give a FILE_DIR, or use --all or --since' in result.output
+        result = runner.invoke(main, ['-c', config_file, 'collate', '--all', '-t', 'Title'])
+        assert result.exit_code == 2
+        assert 'FILE_DIR and --title cannot be used with --all or --since' in result.output
+        result = runner.invoke(main, ['-c', config_file, 'collate', '--since', 'last week'])
+        assert result.exit_code == 2
+        assert 'Expected a date in format "%Y-%m-%d"' in result.output
+        result = runner.invoke(main, ['-c', config_file, 'collate', '--all'])
+        assert result.exit_code == 0
+        assert result.output == 'Collated 0 folders\n'
+        assert not (config.file.entries_folder / 'index.md').exists()
+
 @freeze_time('2025-03-01 12:00:00', tz_offset=0)
 def test_collate_appends_to_existing_document():
     # A pre-existing aggregator file in the document folder makes collate fold the matching
@@ -115,6 +205,118 @@ def test_collate_appends_to_existing_document():
         assert '## 2025-02-27 How to Answer Question' in content
         assert 'How to answer a specific question Sansa asked' in content
 
+@freeze_time('2025-03-01 12:00:00', tz_offset=0)
+def test_collate_preserve_formatting():
+    # With preserve_formatting the cleanup pass only re-renders sections it changed
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        note_dir = tmpdir / 'notes'
+        doc_dir = tmpdir / 'docs'
+        doc_dir.mkdir()
+        entry_dir = note_dir / '2025-02-24_2025-03-02'
+        entry_dir.mkdir(parents=True)
+        entry = entry_dir / '2025-02-27.md'
+        entry.write_text('# 2025-02-27\n## Work Done\n- Tight list (ABC-1234)\n\n\n## Scratch\n\n- \n\n## Meetings\n| a | b |\n')
+
+        file_config = FileConfig(entries_folder=note_dir, document_folder=doc_dir, preserve_formatting=True)
+        config = Config(file_config, CollationConfig())
+        with NamedTemporaryFile() as tmp_config:
+            config_path = Path(tmp_config.name)
+            config_path.write_text(dump(RootModel[Config](config).model_dump_json()))
+            runner = CliRunner()
+            result = runner.invoke(main, ['-c', str(config_path), 'collate', str(entry_dir)])
+            assert result.exit_code == 0
+            assert entry.read_text() == '# 2025-02-27\n## Work Done\n- Tight list (ABC-1234)\n\n\n## Meetings\n| a | b |\n'
+
+def test_collate_with_cache():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        note_dir = tmpdir / 'notes'
+        doc_dir = tmpdir / 'docs'
+        doc_dir.mkdir()
+        cache_dir = tmpdir / 'cache'
+        entry_dir = note_dir / '2025-02-24_2025-03-02'
+        entry_dir.mkdir(parents=True)
+        (entry_dir / '2025-02-27.md').write_text('# 2025-02-27\n\n## Work Done\n\n- Cached work\n')
+
+        file_config = FileConfig(entries_folder=note_dir, document_folder=doc_dir,
+                                 cache=CacheConfig(enabled=True, folder=cache_dir))
+        config = Config(file_config, CollationConfig())
+        with NamedTemporaryFile() as tmp_config:
+            config_path = Path(tmp_config.name)
+            config_path.write_text(dump(RootModel[Config](config).model_dump_json()))
+            runner = CliRunner()
+            result = runner.invoke(main, ['-c', str(config_path), '--no-cache', 'collate', str(entry_dir)])
+            assert result.exit_code == 0
+            assert not cache_dir.exists()
+            result = runner.invoke(main, ['-c', str(config_path), 'collate', '--jobs', '2', '--full', str(entry_dir)])
+            assert result.exit_code == 0
+            assert (cache_dir / 'parse' / 'index.json').exists()
+            assert '- Cached work' in (entry_dir / 'summary.md').read_text()
+            result = runner.invoke(main, ['-c', str(config_path), 'collate', '--all', '--full'])
+            assert result.exit_code == 0
+            assert 'Collated 1 folders' in result.output
+            result = runner.invoke(main, ['-c', str(config_path), 'merge', '-j', '2', str(entry_dir), str(tmpdir / 'merged.md')])
+            assert result.exit_code == 0
+            assert '- Cached work' in (tmpdir / 'merged.md').read_text()
+            with freeze_time('2025-02-28 12:00:00', tz_offset=0):
+                result = runner.invoke(main, ['-c', str(config_path), 'new-entry'])
+            assert result.exit_code == 0
+            result = runner.invoke(main, ['-c', str(config_path), 'cache', 'clear'])
+            assert result.exit_code == 0
+            assert result.output == f'Cleared parse cache in {cache_dir}\n'
+            assert not (cache_dir / 'parse').exists()
+
+def test_media_gc():
+    with temp_config() as (config_file, config):
+        store = config.file.entries_folder / '.media-store'
+        (store / 'ab').mkdir(parents=True)
+        (store / 'ab' / 'abcd.png').write_bytes(b'data')
+        runner = CliRunner()
+        result = runner.invoke(main, ['-c', config_file, 'media', 'gc'])
+        assert result.exit_code == 0
+        assert result.output == f'Removed 1 unused media files (4 bytes) from {store}\n'
+        assert not (store / 'ab').exists()
+
+def test_rollup():
+    with temp_config() as (config_file, config):
+        entries = config.file.entries_folder
+        for folder, ticket in [('2025-01-06_2025-01-12', 'ABC-1'), ('2025-04-07_2025-04-13', 'ABC-2')]:
+            (entries / folder).mkdir()
+            (entries / folder / 'summary.md').write_text(f'# Summary | {folder}\n\n## Work Done\n\n- Work ({ticket})\n')
+        runner = CliRunner()
+        result = runner.invoke(main, ['-c', config_file, 'rollup'])
+        assert result.exit_code == 0
+        rollups = entries / 'rollups'
+        assert result.output == (f'Rollup written to file {rollups}/2025-Q1.md\nRollup written to file {rollups}/2025-Q2.md\n'
+                                 f'Rollup written to file {rollups}/2025-Year.md\nFiles written: 3 (386 bytes)\n')
+        year = (rollups / '2025-Year.md').read_text()
+        assert '- Work (ABC-1)' in year and '- Work (ABC-2)' in year
+        result = runner.invoke(main, ['-c', config_file, 'rollup', '--year', '2025', '-o', str(rollups)])
+        assert result.output.count('Rollup unchanged in file') == 3
+        result = runner.invoke(main, ['-c', config_file, 'rollup', '--full', '--year', '2024'])
+        assert result.output == 'Files written: 0 (0 bytes)\n'
+
+def test_split_aggregators():
+    with temp_config() as (config_file, config):
+        documents = config.file.document_folder
+        sections = ''.join(f'## 2024-0{month}-01 Greg Weekly\n\n- {"x" * 400000}\n\n' for month in range(1, 4))
+        (documents / 'Greg Weekly.md').write_text(f'# Greg Weekly\n\n{sections}## 2025-01-01 Greg Weekly\n\n- notes\n')
+        (documents / 'Untitled.md').write_text('x' * 1_000_001)
+        (documents / 'Small.md').write_text('# Small\n')
+        runner = CliRunner()
+        result = runner.invoke(main, ['-c', config_file, 'split-aggregators'])
+        assert result.exit_code == 2
+        assert 'Set aggregator_sharding in the config or use --by' in result.output
+        result = runner.invoke(main, ['-c', config_file, 'split-aggregators', '--by', 'year'])
+        assert result.exit_code == 0
+        assert result.output.startswith(f'Split {documents}/Greg Weekly.md into 2 shards\nFiles written: 5 (')
+        assert sorted(path.name for path in (documents / 'Greg Weekly').iterdir()) == ['.2024.index.jsonl', '.2025.index.jsonl',
+                                                                                      '2024.md', '2025.md']
+        # Already split aggregators are left alone
+        result = runner.invoke(main, ['-c', config_file, 'split-aggregators', '--by', 'size'])
+        assert result.output == 'Files written: 0 (0 bytes)\n'
+
 @freeze_time('2025-03-01 12:00:00', tz_offset=0)
 def test_merge():
     # Simulate documentation files that were extracted from previous collate operations
@@ -181,7 +383,7 @@ If deployment fails:
                                      str(output_file),
                                      '-t', 'Complete Operations Runbook'])
 
-        assert result.output == f'Merged data written to file {output_file}\n'
+        assert result.output == f'Merged data written to file {output_file}\nFiles written: 1 (779 bytes)\n'
         assert output_file.exists()
 
         content = output_file.read_text()
@@ -323,6 +525,34 @@ def test_collate_with_media():
             assert (note_dir / 'index.md').exists()
 
 
+@freeze_time('2025-03-01 12:00:00', tz_offset=0)
+def test_collate_media_in_unchanged_entries():
+    data_dir = DATA_PATH / '2025-02-24_2025-03-02'
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        media_source_dir = tmpdir / 'media_source'
+        media_source_dir.mkdir()
+        media_file = media_source_dir / 'screenshot.png'
+        media_file.write_bytes(b'fake image data')
+        mtime = datetime(2025, 2, 26, 12, 0, 0).timestamp()
+        os.utime(media_file, (mtime, mtime))
+        note_dir = tmpdir / 'notes'
+        copy_tree(str(data_dir), str(note_dir / '2025-02-24_2025-03-02'))
+        embed = note_dir / '2025-02-24_2025-03-02' / '2025-02-25.md'
+        embed.write_text('# 2025-02-25\n\n## Work Done\n\n- Fixed it ![shot](~/media_source/screenshot.png)\n')
+
+        with NamedTemporaryFile() as tmp_config:
+            config_path = Path(tmp_config.name)
+            runner = CliRunner()
+            for media_config in (MediaConfig(), MediaConfig(sources=[MediaSource(folder=media_source_dir)], extensions=['.png'], enabled=True)):
+                file_config = FileConfig(entries_folder=note_dir, document_folder=tmpdir / 'docs', media=media_config)
+                config_path.write_text(dump(RootModel[Config](Config(file_config, CollationConfig())).model_dump_json()))
+                result = runner.invoke(main, ['-c', str(config_path), 'collate', str(note_dir / '2025-02-24_2025-03-02')])
+                assert result.exit_code == 0
+            # The entry was not parsed again, its text is updated instead
+            assert 'Cleaning up files' not in result.output
+            assert embed.read_text() == '# 2025-02-25\n\n## Work Done\n\n- Fixed it ![shot](./media/2025-02-26_12-00-00.png)\n'
+
 @freeze_time('2025-03-01 12:00:00', tz_offset=0)
 def test_collate_toc_disabled():
     data_dir = DATA_PATH / '2025-02-24_2025-03-02'
@@ -350,3 +580,107 @@ def test_collate_toc_disabled():
             assert '## Contents' not in summary
             assert not (note_dir / 'index.md').exists()
             assert 'Updated root index' not in result.output
+
+def test_reindex():
+    with temp_config() as (config_file, _config):
+        runner = CliRunner()
+        result = runner.invoke(main, ['-c', config_file, 'reindex'])
+        assert result.exit_code == 2
+        assert 'Enable the workspace index in the config first' in result.output
+    data_dir = DATA_PATH / '2025-02-24_2025-03-02'
+    with temp_config_with_index() as (config_file, config):
+        copy_tree(data_dir, config.file.entries_folder / '2025-02-24_2025-03-02')
+        runner = CliRunner()
+        result = runner.invoke(main, ['-c', config_file, 'reindex'])
+        assert result.exit_code == 0
+        assert result.output == f'Indexed 2 files in {config.file.index.path}\n'
+
+@freeze_time('2025-03-01 12:00:00', tz_offset=0)
+def test_new_entry_with_entry_missing_from_index():
+    data_dir = DATA_PATH / '2025-02-24_2025-03-02'
+    with temp_config_with_index() as (config_file, config):
+        folder = config.file.entries_folder / '2025-02-24_2025-03-02'
+        copy_tree(data_dir, folder)
+        runner = CliRunner()
+        assert runner.invoke(main, ['-c', config_file, 'reindex']).exit_code == 0
+        # Made outside of enheduanna, so newer than anything in the index
+        (folder / '2025-02-29.md').write_text('# 2025-02-29\n\n## Follow Ups\n\n- Synced from the laptop\n')
+        result = runner.invoke(main, ['-c', config_file, 'new-entry'])
+        assert result.exit_code == 0
+        assert '- Synced from the laptop' in (folder / '2025-03-01.md').read_text()
+        workspace_index = WorkspaceIndex.from_config(config.file)
+        assert workspace_index.latest_entry() == folder.resolve() / '2025-03-01.md'
+        assert folder.resolve() / '2025-02-29.md' in workspace_index.entries(folder)
+        workspace_index.close()
+
+@freeze_time('2025-03-01 12:00:00', tz_offset=0)
+def test_commands_update_workspace_index():
+    data_dir = DATA_PATH / '2025-02-24_2025-03-02'
+    with temp_config_with_index() as (config_file, config):
+        folder = config.file.entries_folder / '2025-02-24_2025-03-02'
+        copy_tree(data_dir, folder)
+        runner = CliRunner()
+        result = runner.invoke(main, ['-c', config_file, 'new-entry'])
+        assert result.exit_code == 0
+        assert '- Email back Jon' in (folder / '2025-03-01.md').read_text()
+        workspace_index = WorkspaceIndex.from_config(config.file)
+        assert workspace_index.latest_entry() == folder.resolve() / '2025-03-01.md'
+        workspace_index.close()
+
+        # A stale index entry falls back to scanning the folders
+        (folder / '2025-03-01.md').unlink()
+        result = runner.invoke(main, ['-c', config_file, 'new-entry'])
+        assert result.exit_code == 0
+        assert (folder / '2025-03-01.md').exists()
+
+        result = runner.invoke(main, ['-c', config_file, 'collate', str(folder)])
+        assert result.exit_code == 0
+        assert (config.file.entries_folder / 'index.md').read_text() == '# Notes Index\n\n- [2025-02-24 -> 2025-03-02](./2025-02-24_2025-03-02/summary.md)\n'
+        workspace_index = WorkspaceIndex.from_config(config.file)
+        assert workspace_index.summary_folders('summary.md') == [folder.resolve()]
+        assert len(workspace_index.find_items('ABC-1234')) == 4
+        workspace_index.close()
+
+        result = runner.invoke(main, ['-c', config_file, 'collate', '--all'])
+        assert result.exit_code == 0
+        (config.file.entries_folder / 'index.md').unlink()
+        result = runner.invoke(main, ['-c', config_file, 'collate', '--all'])
+        assert result.exit_code == 0
+        assert result.output.endswith(f'Collated 1 folders\nUpdated root index {config.file.entries_folder}/index.md\n')
+
+        output_file = config.file.document_folder / 'merged.md'
+        result = runner.invoke(main, ['-c', config_file, 'merge', str(folder), str(output_file)])
+        assert result.exit_code == 0
+        workspace_index = WorkspaceIndex.from_config(config.file)
+        assert workspace_index.connection.execute('SELECT title FROM files WHERE name = ?', ('merged.md',)).fetchone() == \
+            ('Merged | 2025-02-24 -> 2025-03-02',)
+        workspace_index.close()
+
+def test_help_skips_command_imports():
+    # Startup budget: listing commands must not pay for pydantic or any command's modules
+    script = ('import sys\n'
+              'from enheduanna.cli import main\n'
+              'try:\n'
+              '    main(["--help"])\n'
+              'except SystemExit:\n'
+              '    pass\n'
+              'print(sorted(name for name in sys.modules if name == "pydantic" or name.startswith("enheduanna.")))\n')
+    result = run([executable, '-c', script], capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines()[-1] == "['enheduanna.cli', 'enheduanna.defaults']"
+
+def test_config_check(tmp_path, monkeypatch):
+    monkeypatch.setenv('ENHEDUANNA_CONFIG_SNAPSHOT', str(tmp_path / 'config.snapshot'))
+    config_path = tmp_path / 'config.yml'
+    config_path.write_text('---\nfile:\n  aggregator_updates: replace\n')
+    runner = CliRunner()
+    result = runner.invoke(main, ['-c', str(config_path), 'config', 'check'])
+    assert result.exit_code == 0
+    assert result.output == f'Config file {config_path} is valid\nWrote config snapshot {snapshot_path(config_path)}\n'
+    assert snapshot_path(config_path).parent == tmp_path
+    assert snapshot_path(config_path).exists()
+
+    config_path.write_text('---\nfile:\n  aggregator_updates: sometimes\n')
+    result = runner.invoke(main, ['-c', str(config_path), 'config', 'check'])
+    assert result.exit_code == 1
+    assert result.output.startswith(f'Error: Invalid config file {config_path}\n')
+    assert 'aggregator_updates' in result.output
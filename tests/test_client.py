@@ -0,0 +1,26 @@
+from pathlib import Path
+import socket
+
+from enheduanna.client import read_message, send_command, send_message, socket_path
+from enheduanna.defaults import SOCKET_PATH_DEFAULT
+
+def test_socket_path(monkeypatch):
+    monkeypatch.delenv('ENHEDUANNA_SOCKET', raising=False)
+    assert socket_path() == SOCKET_PATH_DEFAULT
+    monkeypatch.setenv('ENHEDUANNA_SOCKET', '~/daemon.sock')
+    assert socket_path() == Path.home() / 'daemon.sock'
+
+def test_messages():
+    for data, expected in [(b'{"argv":["new-entry"]}', {'argv': ['new-entry']}), (b'not json', None), (b'[1]', None)]:
+        left, right = socket.socketpair(socket.AF_UNIX)
+        with left, right:
+            left.sendall(data)
+            left.shutdown(socket.SHUT_WR)
+            assert read_message(right) == expected
+    left, right = socket.socketpair(socket.AF_UNIX)
+    with left, right:
+        send_message(left, {'code': 0})
+        assert read_message(right) == {'code': 0}
+
+def test_send_command_without_daemon(tmp_path):
+    assert send_command(tmp_path / 'missing.sock', ['new-entry'], tmp_path) is None
@@ -0,0 +1,233 @@
+from contextlib import contextmanager
+from distutils.dir_util import copy_tree
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+import os
+import socket
+import stat
+import time
+
+import click
+import pytest
+from click.testing import CliRunner
+from freezegun import freeze_time
+
+from enheduanna import daemon
+from enheduanna.cli import main
+from enheduanna.client import is_running, main as client_main, read_message, send_command, send_message
+from enheduanna.daemon import DaemonException, ResidentState, run_command, serve
+
+DATA_PATH = Path(__file__).parent / 'data'
+
+@contextmanager
+def temp_workspace():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        config_path = tmpdir / 'config.yml'
+        config_path.write_text(f'---\nfile:\n  entries_folder: {tmpdir / "notes"}\n  document_folder: {tmpdir / "docs"}\n')
+        (tmpdir / 'docs').mkdir()
+        copy_tree(str(DATA_PATH / '2025-02-24_2025-03-02'), str(tmpdir / 'notes' / '2025-02-24_2025-03-02'))
+        yield tmpdir, config_path
+
+@contextmanager
+def running_daemon(socket_path: Path, state: ResidentState = None):
+    thread = Thread(target=serve, args=(main, socket_path, state))
+    thread.start()
+    for _ in range(500):
+        if is_running(socket_path):
+            break
+        time.sleep(0.01)
+    try:
+        yield thread
+    finally:
+        if is_running(socket_path):
+            send_command(socket_path, ['daemon', 'stop'], Path.cwd())
+        thread.join()
+
+def test_resident_config():
+    with temp_workspace() as (tmpdir, config_path):
+        state = ResidentState()
+        first = state.config(config_path)
+        second = state.config(config_path)
+        assert first is not second
+        assert first.file.entries_folder == tmpdir / 'notes'
+        config_path.write_text(f'---\nfile:\n  entries_folder: {tmpdir / "other"}\n')
+        assert state.config(config_path).file.entries_folder == tmpdir / 'other'
+        assert state.config(tmpdir / 'missing.yml').file.date_output_format == '%Y-%m-%d'
+
+def test_resident_config_follows_environment(monkeypatch):
+    with temp_workspace() as (tmpdir, config_path):
+        config_path.write_text('---\nfile:\n  entries_folder: !ENV ${NOTES_DIR}\n')
+        state = ResidentState()
+        monkeypatch.setenv('NOTES_DIR', str(tmpdir / 'notes'))
+        assert state.config(config_path).file.entries_folder == tmpdir / 'notes'
+        monkeypatch.setenv('NOTES_DIR', str(tmpdir / 'other'))
+        assert state.config(config_path).file.entries_folder == tmpdir / 'other'
+
+def test_run_command():
+    @click.group()
+    def group():
+        pass
+
+    @group.command('abort')
+    def abort():
+        raise click.Abort()
+
+    @group.command('fail')
+    def fail():
+        raise ValueError('broken')
+
+    with TemporaryDirectory() as tmpdir:
+        cwd = Path.cwd()
+        state = ResidentState()
+        code, stdout, _stderr = run_command(group, ['--help'], Path(tmpdir), state)
+        assert code == 0
+        assert 'Usage: enheduanna' in stdout
+        code, _stdout, stderr = run_command(group, ['missing'], Path(tmpdir), state)
+        assert code == 2
+        assert 'No such command' in stderr
+        assert run_command(group, ['abort'], Path(tmpdir), state) == (1, '', 'Aborted!\n')
+        code, _stdout, stderr = run_command(group, ['fail'], Path(tmpdir), state)
+        assert code == 1
+        assert 'ValueError: broken' in stderr
+        assert Path.cwd() == cwd
+
+    @group.command('env')
+    def env():
+        click.echo(os.environ.get('CLIENT_ONLY'))
+
+    with TemporaryDirectory() as tmpdir:
+        # Commands see the environment they are given, and the daemon's own is put back
+        assert run_command(group, ['env'], Path(tmpdir), state, env={'CLIENT_ONLY': 'yes'}) == (0, 'yes\n', '')
+        assert 'CLIENT_ONLY' not in os.environ
+
+def test_daemon_drops_bad_connections(monkeypatch, capsys):
+    monkeypatch.setattr(daemon, 'REQUEST_TIMEOUT', 0.1)
+    with temp_workspace() as (tmpdir, _config_path):
+        socket_path = tmpdir / 'daemon.sock'
+        with running_daemon(socket_path):
+            # A client that connects and never sends anything times out
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as silent:
+                silent.connect(str(socket_path))
+                response = send_command(socket_path, ['--help'], tmpdir)
+                assert response['code'] == 0
+            # As does one that sends a request and goes away before the response
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as gone:
+                gone.connect(str(socket_path))
+                send_message(gone, {'argv': ['--help'], 'cwd': str(tmpdir), 'env': {}})
+            assert send_command(socket_path, ['--help'], tmpdir)['code'] == 0
+        assert 'Dropped connection: timed out' in capsys.readouterr().err
+
+@freeze_time('2025-03-01 12:00:00', tz_offset=0)
+def test_daemon_serves_commands():
+    with temp_workspace() as (tmpdir, config_path):
+        socket_path = tmpdir / 'daemon.sock'
+        state = ResidentState()
+        umask = os.umask(0o022)
+        os.umask(umask)
+        with running_daemon(socket_path, state) as thread:
+            # Created owner only, and the umask is put back afterwards
+            assert stat.S_IMODE(socket_path.stat().st_mode) == 0o600
+            assert os.umask(umask) == umask
+            # Relative paths resolve against the client's folder
+            response = send_command(socket_path, ['-c', 'config.yml', 'new-entry'], tmpdir)
+            assert response['code'] == 0
+            assert response['stdout'].startswith(f'Created entry file {tmpdir}/notes/2025-02-24_2025-03-02/2025-03-01.md\n')
+            assert str((tmpdir / 'notes' / '2025-02-24_2025-03-02' / '2025-02-28.md').resolve()) in state.parse_cache._load_index()['entries'] #pylint:disable=protected-access
+
+            response = send_command(socket_path, ['-c', str(config_path), 'collate', str(tmpdir / 'notes' / '2025-02-24_2025-03-02')], tmpdir)
+            assert response['code'] == 0
+            assert 'Collation data written' in response['stdout']
+
+            response = send_command(socket_path, ['-c', str(config_path), 'cache', 'clear'], tmpdir)
+            assert response['code'] == 0
+            assert state.parse_cache._load_index()['entries'] == {} #pylint:disable=protected-access
+
+            response = send_command(socket_path, ['-c', str(config_path), '--no-cache', 'new-entry'], tmpdir)
+            assert response['code'] == 0
+            assert state.parse_cache._load_index()['entries'] == {} #pylint:disable=protected-access
+
+            # Connections that send nothing are ignored
+            raw = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            raw.connect(str(socket_path))
+            raw.close()
+
+            # Malformed requests get an error back and the daemon keeps serving
+            for request, error in (({'cwd': str(tmpdir)}, 'argv must be a list of strings'),
+                                   ({'argv': ['--help', 1], 'cwd': str(tmpdir)}, 'argv must be a list of strings'),
+                                   ({'argv': ['--help']}, 'cwd must be a string'),
+                                   ({'argv': ['--help'], 'cwd': 5}, 'cwd must be a string'),
+                                   ({'argv': ['--help'], 'cwd': str(tmpdir)}, 'env must be a mapping of strings'),
+                                   ({'argv': ['--help'], 'cwd': str(tmpdir), 'env': {'A': 1}}, 'env must be a mapping of strings')):
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as raw:
+                    raw.connect(str(socket_path))
+                    send_message(raw, request)
+                    assert read_message(raw) == {'code': 2, 'stdout': '', 'stderr': f'Invalid request: {error}\n'}
+            assert is_running(socket_path)
+
+            # Config placeholders resolve against the client's environment
+            config_path.write_text('---\nfile:\n  entries_folder: !ENV ${NOTES_DIR}\n')
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as raw:
+                raw.connect(str(socket_path))
+                send_message(raw, {'argv': ['-c', str(config_path), 'new-entry'], 'cwd': str(tmpdir),
+                                   'env': dict(os.environ, NOTES_DIR=str(tmpdir / 'client'))})
+                response = read_message(raw)
+            assert response['code'] == 0
+            assert (tmpdir / 'client' / '2025-02-24_2025-03-02' / '2025-03-01.md').exists()
+            assert 'NOTES_DIR' not in os.environ
+
+            response = send_command(socket_path, ['daemon', 'start'], tmpdir)
+            assert response['code'] == 2
+            assert 'Already running in the daemon' in response['stderr']
+            with pytest.raises(DaemonException) as error:
+                serve(main, socket_path)
+            assert str(error.value) == f'A daemon is already running on {socket_path}'
+
+            result = CliRunner().invoke(main, ['-c', str(config_path), 'daemon', 'stop', '--socket', str(socket_path)])
+            assert result.exit_code == 0
+            assert result.output == 'Stopping daemon\n'
+            thread.join()
+        assert not socket_path.exists()
+
+def test_daemon_start_and_stop_commands():
+    with temp_workspace() as (tmpdir, config_path):
+        socket_path = tmpdir / 'daemon.sock'
+        # A socket left behind by a daemon that did not shut down is replaced
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(str(socket_path))
+        stale.close()
+        runner = CliRunner()
+        result = runner.invoke(main, ['-c', str(config_path), 'daemon', 'stop', '--socket', str(socket_path)])
+        assert result.exit_code == 1
+        assert f'No daemon running on {socket_path}' in result.output
+
+        thread = Thread(target=main.main, kwargs={'args': ['-c', str(config_path), 'daemon', 'start', '--socket', str(socket_path)],
+                                                  'standalone_mode': False})
+        thread.start()
+        for _ in range(500):
+            if is_running(socket_path):
+                break
+            time.sleep(0.01)
+        result = runner.invoke(main, ['-c', str(config_path), 'daemon', 'start', '--socket', str(socket_path)])
+        assert result.exit_code == 1
+        assert f'A daemon is already running on {socket_path}' in result.output
+        send_command(socket_path, ['daemon', 'stop'], tmpdir)
+        thread.join()
+        assert not socket_path.exists()
+
+@freeze_time('2025-03-01 12:00:00', tz_offset=0)
+def test_client(monkeypatch, capsys):
+    with temp_workspace() as (tmpdir, config_path):
+        socket_path = tmpdir / 'daemon.sock'
+        monkeypatch.setenv('ENHEDUANNA_SOCKET', str(socket_path))
+        # Without a daemon the command runs in this process
+        with pytest.raises(SystemExit) as exit_info:
+            client_main(['-c', str(config_path), 'new-entry'])
+        assert exit_info.value.code == 0
+        assert 'Created entry file' in capsys.readouterr().out
+        with running_daemon(socket_path):
+            with pytest.raises(SystemExit) as exit_info:
+                client_main(['-c', str(config_path), 'collate'])
+            assert exit_info.value.code == 2
+            assert 'Give a FILE_DIR' in capsys.readouterr().err
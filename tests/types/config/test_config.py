@@ -1,8 +1,11 @@
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 
+import pytest
+
 from enheduanna.types.config.collation import CollationType
 from enheduanna.types.config import Config
+from enheduanna.types.config.file import AggregatorUpdate
 
 def test_load_yaml_basic_file():
     test_data = '''---
@@ -115,3 +118,79 @@ file:
         assert c.file.entry_sections[0].auto_generate is True
         assert c.file.entry_sections[1].title == 'Notes'
         assert c.file.entry_sections[1].auto_generate is False
+
+def test_load_yaml_preserve_formatting():
+    test_data = '''---
+file:
+  preserve_formatting: true
+'''
+    with NamedTemporaryFile() as tmp:
+        path = Path(tmp.name)
+        path.write_text(test_data)
+        c = Config.from_yaml(path)
+        assert c.file.preserve_formatting is True
+
+def test_load_yaml_cache():
+    test_data = '''---
+file:
+  cache:
+    enabled: true
+    folder: /tmp/enheduanna-cache
+    max_entries: 50
+'''
+    with NamedTemporaryFile() as tmp:
+        path = Path(tmp.name)
+        path.write_text(test_data)
+        c = Config.from_yaml(path)
+        assert c.file.cache.enabled is True
+        assert c.file.cache.folder == Path('/tmp/enheduanna-cache')
+        assert c.file.cache.max_entries == 50
+
+def test_collation_plan():
+    test_data = '''---
+file:
+  entry_sections:
+    - title: Work Done
+      contents: '- '
+      level: 2
+    - title: Scratch
+      contents: '- '
+      level: 2
+'''
+    with NamedTemporaryFile() as tmp:
+        path = Path(tmp.name)
+        path.write_text(test_data)
+        c = Config.from_yaml(path)
+        plan = c.file.collation_plan
+        assert plan is c.file.collation_plan
+        assert plan.ignore_sections == frozenset(['Scratch'])
+        assert plan.collate_sections == tuple(c.file.collate_sections)
+
+def test_load_yaml_aggregator_updates():
+    with NamedTemporaryFile() as tmp:
+        path = Path(tmp.name)
+        path.write_text('---\nfile:\n  aggregator_updates: replace\n')
+        c = Config.from_yaml(path)
+        assert c.file.aggregator_updates == AggregatorUpdate.REPLACE
+        path.write_text('---\nfile: {}\n')
+        assert Config.from_yaml(path).file.aggregator_updates == AggregatorUpdate.APPEND
+
+def test_load_yaml_index():
+    with NamedTemporaryFile() as tmp:
+        path = Path(tmp.name)
+        path.write_text('---\nfile:\n  index:\n    enabled: true\n    path: /tmp/workspace.sqlite3\n')
+        c = Config.from_yaml(path)
+        assert c.file.index.enabled
+        assert c.file.index.path == Path('/tmp/workspace.sqlite3')
+        path.write_text('---\nfile: {}\n')
+        assert not Config.from_yaml(path).file.index.enabled
+
+def test_load_yaml_media_workers():
+    with NamedTemporaryFile() as tmp:
+        path = Path(tmp.name)
+        path.write_text('---\nfile:\n  media:\n    sources:\n      - folder: /tmp/shots\n        workers: 8\n      - folder: /tmp/downloads\n')
+        c = Config.from_yaml(path)
+        assert [source.workers for source in c.file.media.sources] == [8, 4]
+        path.write_text('---\nfile:\n  media:\n    sources:\n      - folder: /tmp/shots\n        workers: 0\n')
+        with pytest.raises(ValueError):
+            Config.from_yaml(path)
@@ -17,4 +17,10 @@ def test_validators():
     assert 'GroupBy field must be gathered in regex' in str(e.value)
 
 def test_str():
-    assert str(CollateSection('My Section')) == 'My Section'
\ No newline at end of file
+    assert str(CollateSection('My Section')) == 'My Section'
+
+def test_pattern():
+    c = CollateSection('Work Done', regex='\\((?P<ticket>[A-Za-z]+-[0-9]+)\\)', groupBy='ticket')
+    assert c.pattern.search('- Some work (ABC-123)').group('ticket') == 'ABC-123'
+    assert c.pattern is c.pattern
+    assert CollateSection('Work Done').pattern is None
@@ -0,0 +1,19 @@
+from enheduanna.types.markdown.collate_section import CollateSection
+from enheduanna.types.markdown.collation_plan import CollationPlan
+from enheduanna.types.markdown.markdown_section import MarkdownSection
+
+def test_collation_plan():
+    c1 = CollateSection('Work Done')
+    c2 = CollateSection('Work Done', level=3)
+    c3 = CollateSection('Work Done')
+    plan = CollationPlan([c1, c2, c3], ['Scratch', 'Scratch'])
+    assert plan.ignore_sections == frozenset(['Scratch'])
+    assert plan.match(MarkdownSection('Work Done', '', level=2)) == (c1, c3)
+    assert plan.match(MarkdownSection('Work Done', '', level=3)) == (c2,)
+    assert plan.match(MarkdownSection('Work Done', '', level=4)) == ()
+    assert plan.match(MarkdownSection('Meetings', '', level=2)) == ()
+    assert plan.index(c3) == 2
+    assert plan.title_index('Work Done') == 0
+    assert plan.match_title('Work Done') == (c1, c3)
+    assert plan.match_title('Meetings') == ()
+    assert CollationPlan([c2, c1]).match_title('Work Done') == (c2,)
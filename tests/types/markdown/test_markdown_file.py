@@ -2,6 +2,7 @@ from pathlib import Path
 from tempfile import NamedTemporaryFile
 
 from enheduanna.types.markdown.markdown_file import MarkdownFile, find_header
+from enheduanna.types.markdown.markdown_section import MarkdownSection
 
 def test_find_header_ignores_inline_hash():
     # A leading ATX header still counts
@@ -125,3 +126,81 @@ Remove this section later
         mf.root_section.remove_section('Remove Me')
         mf.write()
         assert path1.read_text() == '# 2025-02-20\n\n## Testing Data\n\nHeres some sections with example data\nThat has some stuff\n'
+
+LOSSLESS_TEXT = '''# 2025-02-20
+
+
+Some   intro text
+
+## Work Done
+- Tight list right under the heading
+- Another item   
+
+### Detail
+
+  indented detail
+
+
+## Remove Me
+
+Remove this section later
+
+## Scratch
+
+- '''
+
+def test_lossless_round_trip_is_byte_for_byte():
+    with NamedTemporaryFile() as tmp:
+        path = Path(tmp.name)
+        path.write_text(LOSSLESS_TEXT)
+        mf = MarkdownFile.from_file(path, lossless=True)
+        assert mf.root_section.sections[0].contents == '- Tight list right under the heading\n- Another item   '
+        mf.write()
+        assert path.read_text() == LOSSLESS_TEXT
+
+def test_lossless_only_rerenders_changed_sections():
+    with NamedTemporaryFile() as tmp:
+        path = Path(tmp.name)
+        path.write_text(LOSSLESS_TEXT)
+        mf = MarkdownFile.from_file(path, lossless=True)
+        mf.root_section.remove_section('Remove Me')
+        mf.root_section.sections[0].sections[0].contents = 'new detail'
+        mf.write()
+        assert path.read_text() == ('# 2025-02-20\n\n\nSome   intro text\n\n'
+                                    '## Work Done\n- Tight list right under the heading\n- Another item   \n\n'
+                                    '### Detail\n\nnew detail\n\n'
+                                    '## Scratch\n\n- ')
+
+def test_lossless_appends_after_unterminated_source():
+    with NamedTemporaryFile() as tmp:
+        path = Path(tmp.name)
+        path.write_text(LOSSLESS_TEXT)
+        mf = MarkdownFile.from_file(path, lossless=True)
+        mf.root_section.title = '2025-02-21'
+        mf.root_section.add_section(MarkdownSection('Follow Ups', '- call back', level=2))
+        mf.write()
+        result = path.read_text()
+        assert result.startswith('# 2025-02-21\n\nSome   intro text\n\n## Work Done\n- Tight list')
+        assert result.endswith('## Scratch\n\n- \n\n## Follow Ups\n\n- call back\n')
+
+def test_lossless_appends_after_terminated_source():
+    with NamedTemporaryFile() as tmp:
+        path = Path(tmp.name)
+        path.write_text('# Notes\nRunning notes\n')
+        mf = MarkdownFile.from_file(path, lossless=True)
+        mf.root_section.add_section(MarkdownSection('Next', '- item', level=2))
+        mf.write()
+        assert path.read_text() == '# Notes\nRunning notes\n\n## Next\n\n- item\n'
+
+def test_lossless_late_root_title_rerenders_open_sections():
+    text = '## Orphan\nbody\n# Late Title\n## Next\n\nkept as-is\n'
+    with NamedTemporaryFile() as tmp:
+        path = Path(tmp.name)
+        path.write_text(text)
+        mf = MarkdownFile.from_file(path, lossless=True)
+        assert mf.root_section.span is None
+        # The title line sits inside the still-open "Orphan" text, so that section is re-rendered
+        assert mf.root_section.sections[0].span is None
+        assert mf.root_section.sections[1].span is not None
+        mf.write()
+        assert path.read_text() == '# Late Title\n\n## Orphan\n\nbody\n\n## Next\n\nkept as-is\n'
@@ -0,0 +1,118 @@
+from random import Random
+
+from pytest import mark
+
+from enheduanna.types.markdown.markdown_file import find_header, generate_markdown_sections
+from enheduanna.types.markdown.markdown_section import MarkdownSection
+
+
+def _legacy_generate_markdown_sections(markdown_text: str, current_tab: int = 1) -> MarkdownSection:
+    '''
+    Original recursive parser, kept as the reference for parity checks
+    '''
+    per_line = markdown_text.split('\n')
+    title = None
+    contents = ''
+    subsection_contents = ''
+    sections = []
+    hit_sub_section = False
+    for line in per_line:
+        if not line:
+            continue
+        header_result = find_header(line)
+        if header_result == current_tab and not title:
+            title = line.lstrip().lstrip('#').lstrip()
+            continue
+        if header_result == current_tab + 1:
+            hit_sub_section = True
+            if subsection_contents:
+                sections.append(_legacy_generate_markdown_sections(subsection_contents, current_tab=current_tab+1))
+                subsection_contents = f'{line}\n'
+                hit_sub_section = True
+                continue
+        if hit_sub_section:
+            subsection_contents = f'{subsection_contents}{line}\n'
+        else:
+            contents = f'{contents}{line}\n'
+    if subsection_contents:
+        sections.append(_legacy_generate_markdown_sections(subsection_contents, current_tab=current_tab+1))
+    ms = MarkdownSection(title, contents.rstrip('\n'), level=current_tab)
+    for section in sections:
+        ms.add_section(section)
+    return ms
+
+
+def _tree(section: MarkdownSection) -> tuple:
+    '''
+    Comparable shape of a parsed section tree
+    '''
+    return (section.title, section.contents, section.level, [_tree(s) for s in section.sections])
+
+
+def _parse(parser, text: str):
+    '''
+    Run a parser, returning either the tree or the raised exception type
+    '''
+    try:
+        return _tree(parser(text))
+    except Exception as e: #pylint:disable=broad-except
+        return type(e)
+
+
+def _random_document(rng: Random, line_count: int) -> str:
+    '''
+    Build a random markdown document mixing headings, body text and edge cases
+    '''
+    lines = ['# Root Title']
+    for count in range(line_count):
+        choice = rng.random()
+        if choice < 0.25:
+            level = rng.randint(1, 5)
+            indent = ' ' * rng.choice([0, 0, 0, 2])
+            lines.append(f'{indent}{"#" * level} Heading {count}')
+        elif choice < 0.3:
+            lines.append('')
+        elif choice < 0.35:
+            lines.append('   ')
+        elif choice < 0.4:
+            lines.append(f'See [link](#heading-{count}) and #notaheading')
+        else:
+            lines.append(f'- item {count} (ABC-{rng.randint(1, 9)})')
+    return '\n'.join(lines)
+
+
+EDGE_CASES = [
+    '',
+    '# Title',
+    '# Title\n',
+    '#\n# Real Title\nbody',
+    'preamble\n# Title\nbody',
+    '## Orphan\nbody\n# Late Title',
+    '# Title\n### Too deep\n## Child\n#### Too deep again\n### Grandchild',
+    '# Title\n## A\n### A1\n## B\n# Second Root\nmore',
+    '# Title\n## Dup\n## Dup',
+    '# Title\n\n\n## Spaced\n\n\nbody\n\n',
+    '# Title\r\n## Windows\r\nbody\r\n',
+    '  # Indented Title\n  ## Indented Child\n  body',
+    '# Title\n## \n## Named',
+]
+
+
+@mark.parametrize('text', EDGE_CASES)
+def test_parser_parity_edge_cases(text):
+    assert _parse(generate_markdown_sections, text) == _parse(_legacy_generate_markdown_sections, text)
+
+
+def test_parser_parity_random_documents():
+    rng = Random(1234)
+    for _ in range(200):
+        text = _random_document(rng, rng.randint(0, 80))
+        assert _parse(generate_markdown_sections, text) == _parse(_legacy_generate_markdown_sections, text)
+
+
+def test_parser_parity_nested_root_level():
+    text = '## Section\n\nbody\n\n### Child\n\nchild body'
+    result = generate_markdown_sections(text, current_tab=2)
+    assert _tree(result) == _tree(_legacy_generate_markdown_sections(text, current_tab=2))
+    assert result.level == 2
+    assert result.sections[0].level == 3
@@ -1,3 +1,6 @@
+from io import StringIO
+from json import dumps
+
 from pytest import raises
 
 from enheduanna.types.markdown.markdown_section import MarkdownSection, MarkdownException
@@ -32,6 +35,17 @@ def test_markdown_write():
     result = m.write()
     assert result == '# 2025-02-16\n\ngeneric contents\n\n## Sub-Section\n\n- Some generic contents in list\n\n## Another sub-section\n\nSome generic stuff\nNot in list form\n\n### Another level in\n'
 
+def test_markdown_write_to_stream():
+    m = MarkdownSection('2025-02-16', 'generic contents')
+    n = MarkdownSection('Another sub-section', 'Some generic stuff', level=2)
+    n.add_section(MarkdownSection('Another level in', '', level=3))
+    m.add_section(n)
+    m.add_section(MarkdownSection('Last', '- item', level=2))
+    stream = StringIO()
+    m.write_to(stream)
+    assert stream.getvalue() == m.write()
+    assert stream.getvalue() == '# 2025-02-16\n\ngeneric contents\n\n## Another sub-section\n\nSome generic stuff\n\n### Another level in\n\n## Last\n\n- item\n'
+
 def test_markdown_generate_root():
     m = MarkdownSection('2025-02-16', 'generic contents')
     m.add_section(MarkdownSection('Sub-Section', '- Some generic contents in list', level=2))
@@ -97,4 +111,42 @@ def test_check_contents_empty():
 
 def test_str():
     m = MarkdownSection('My Title', 'some contents')
-    assert str(m) == 'My Title'
\ No newline at end of file
+    assert str(m) == 'My Title'
+
+def test_markdown_section_get_section():
+    m = MarkdownSection('2025-02-16', '')
+    child = MarkdownSection('Child', 'x', level=2)
+    m.add_section(child)
+    assert m.get_section('Child') is child
+    assert m.get_section('Missing') is None
+
+def test_markdown_section_merge_duplicate_titles():
+    # Same-titled subsections are paired off in order rather than all merging into the first
+    m = MarkdownSection('Root', '')
+    m.sections.append(MarkdownSection('Dup', 'a1', level=2))
+    m.sections.append(MarkdownSection('Dup', 'a2', level=2))
+    n = MarkdownSection('Root', '')
+    n.sections.append(MarkdownSection('Dup', 'b1', level=2))
+    n.sections.append(MarkdownSection('Dup', 'b2', level=2))
+    n.sections.append(MarkdownSection('New', 'c', level=2))
+    m.merge(n)
+    assert [s.contents for s in m.sections] == ['a1\nb1\n', 'a2\nb2\n', 'c']
+    assert len(n.sections) == 1
+
+def test_repr():
+    m = MarkdownSection('My Title', 'some contents', level=2)
+    m.add_section(MarkdownSection('Child', '', level=3))
+    assert repr(m) == "MarkdownSection(title='My Title', level=2, sections=1)"
+
+def test_to_dict_round_trip():
+    m = MarkdownSection('My Title', 'some contents', rollover=True)
+    m.add_section(MarkdownSection('Child', 'child contents', level=2, auto_generate=False))
+    result = m.to_dict()
+    assert result == {
+        'title': 'My Title', 'contents': 'some contents', 'level': 1, 'rollover': True, 'auto_generate': True,
+        'sections': [{'title': 'Child', 'contents': 'child contents', 'level': 2, 'rollover': False,
+                      'auto_generate': False, 'sections': []}],
+    }
+    loaded = MarkdownSection.from_json(dumps(result))
+    assert loaded.to_dict() == result
+    assert isinstance(loaded.sections[0], MarkdownSection)
@@ -0,0 +1,68 @@
+from copy import deepcopy
+
+from pytest import raises
+
+from enheduanna.types.markdown.markdown_section import MarkdownSection
+from enheduanna.types.markdown.section_list import SectionList
+
+
+def _sections(*titles):
+    return [MarkdownSection(title, '', level=2) for title in titles]
+
+
+def test_section_list_index_follows_mutations():
+    a, b, c, d = _sections('A', 'B', 'C', 'D')
+    sections = SectionList([a, b])
+    sections.append(c)
+    sections += [d]
+    assert sections.find('D') is d
+    assert sections.remove_title('B') is b
+    assert sections.remove_title('B') is None
+    assert not sections.has_title('B')
+    assert sections.pop() is d
+    assert sections.find('D') is None
+    sections.remove(a)
+    assert list(sections) == [c]
+    with raises(ValueError) as e:
+        sections.remove(a)
+    assert 'Section "A" not in list' in str(e.value)
+    sections.clear()
+    assert not sections.has_title('C')
+
+
+def test_section_list_duplicates_keep_list_order():
+    first, second, other = _sections('Dup', 'Dup', 'Other')
+    sections = SectionList([other, second])
+    sections.insert(0, first)
+    assert sections.find('Dup') is first
+    assert sections.find('Dup', occurrence=1) is second
+    assert sections.find('Dup', occurrence=2) is None
+    assert sections.remove_title('Dup') is first
+    assert sections.find('Dup') is second
+
+
+def test_section_list_bulk_operations_rebuild_index():
+    a, b, c, e = _sections('A', 'B', 'C', 'E')
+    sections = SectionList([c, a, b])
+    sections.sort(key=lambda s: s.title)
+    assert [s.title for s in sections] == ['A', 'B', 'C']
+    sections.reverse()
+    assert sections.find('C') is c
+    sections[0] = e
+    assert sections.find('C') is None
+    assert sections.find('E') is e
+    del sections[0]
+    assert sections.find('E') is None
+    sections.remove_all([b])
+    assert sections.find('B') is None
+    sections.remove_all([])
+    assert list(sections) == [a]
+
+
+def test_section_list_copy_keeps_index():
+    root = MarkdownSection('Root', '')
+    root.add_section(MarkdownSection('Child', 'text', level=2))
+    copied = deepcopy(root)
+    assert isinstance(copied.sections, SectionList)
+    assert copied.get_section('Child') is copied.sections[0]
+    assert copied.get_section('Child') is not root.sections[0]
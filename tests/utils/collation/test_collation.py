@@ -1,4 +1,4 @@
-from datetime import date
+from datetime import date, datetime
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
@@ -7,7 +7,7 @@ from freezegun import freeze_time
 from enheduanna.types.config import Config
 from enheduanna.types.config.file import FileConfig
 from enheduanna.types.config.collation import CollationConfig, CollationType
-from enheduanna.utils.collation import create_parent_folder
+from enheduanna.utils.collation import create_parent_folder, find_latest_entry, list_collation_folders
 
 @freeze_time('2025-03-01 12:00:00', tz_offset=0)
 def test_create_parent_folder():
@@ -19,3 +19,34 @@ def test_create_parent_folder():
         config = Config(FileConfig(entries_folder=tmpdir), CollationConfig(type=CollationType.MONTHLY))
         result = create_parent_folder(config, date(2025, 3, 1))
         assert str(result) == str(Path(tmpdir) / '2025-03-01_2025-03-31')
+
+def test_list_collation_folders():
+    with TemporaryDirectory() as tmpdir:
+        entries = Path(tmpdir)
+        for name in ['2025-03-03_2025-03-09', '2025-02-24_2025-03-02', '2025-02-17_2025-02-23', 'attachments']:
+            (entries / name).mkdir()
+        (entries / 'index.md').write_text('# Notes Index\n')
+        assert list_collation_folders(entries, '%Y-%m-%d') == [
+            entries / '2025-02-17_2025-02-23', entries / '2025-02-24_2025-03-02', entries / '2025-03-03_2025-03-09']
+        # Folders whose period ends on or after the date, including the one in progress
+        assert list_collation_folders(entries, '%Y-%m-%d', since=datetime(2025, 3, 2)) == [
+            entries / '2025-02-24_2025-03-02', entries / '2025-03-03_2025-03-09']
+        assert list_collation_folders(entries / 'missing', '%Y-%m-%d') == []
+
+
+def test_find_latest_entry():
+    with TemporaryDirectory() as tmpdir:
+        entries = Path(tmpdir)
+        assert find_latest_entry(entries, '%Y-%m-%d') is None
+        # Entries kept outside collation folders are found by a full scan
+        (entries / 'misc').mkdir()
+        (entries / 'misc' / '2025-01-02.md').write_text('# 2025-01-02\n')
+        assert find_latest_entry(entries, '%Y-%m-%d') == entries / 'misc' / '2025-01-02.md'
+        for name in ['2025-02-17_2025-02-23', '2025-02-24_2025-03-02', '2025-03-03_2025-03-09']:
+            (entries / name).mkdir()
+        (entries / '2025-02-17_2025-02-23' / '2025-02-18.md').write_text('# 2025-02-18\n')
+        (entries / '2025-02-24_2025-03-02' / '2025-02-25.md').write_text('# 2025-02-25\n')
+        (entries / '2025-02-24_2025-03-02' / '2025-02-27.md').write_text('# 2025-02-27\n')
+        (entries / '2025-02-24_2025-03-02' / 'summary.md').write_text('# Summary\n')
+        # The newest folder is empty, so the one before it holds the latest entry
+        assert find_latest_entry(entries, '%Y-%m-%d') == entries / '2025-02-24_2025-03-02' / '2025-02-27.md'
@@ -0,0 +1,106 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import os
+
+from enheduanna.types.markdown.collate_section import CollateSection
+from enheduanna.types.markdown.collation_plan import CollationPlan
+from enheduanna.types.markdown.markdown_file import MarkdownFile
+from enheduanna.utils.collation.manifest import CollationManifest, MANIFEST_NAME
+from enheduanna.utils.markdown import gather_markdown_collation, generate_markdown_collation
+
+COLLATE_SECTIONS = [
+    CollateSection('Work Done', regex='\\((?P<ticket>[A-Za-z]+-[0-9]+)\\)', groupBy='ticket'),
+    CollateSection('Learned'),
+]
+
+def _entries(file_dir: Path) -> list:
+    first = file_dir / '2025-02-27.md'
+    first.write_text('# 2025-02-27\n\n## Work Done\n\n- Support (ABC-1)\n\n## Learned\n\n- Something\n')
+    second = file_dir / '2025-02-28.md'
+    second.write_text('# 2025-02-28\n\n## Work Done\n\n- Testing (ABC-1)\n- Reviews\n')
+    return [first, second]
+
+def _run(file_dir: Path, paths: list, manifest: CollationManifest) -> list:
+    '''
+    Run the manifest side of a collate, returning rendered combined sections
+    '''
+    changed = [path for path in paths if not manifest.is_current(path)]
+    markdown_files = [MarkdownFile.from_file(path) for path in changed]
+    fragments, _ = gather_markdown_collation(markdown_files, CollationPlan(COLLATE_SECTIONS), file_dir)
+    combos = [section.write() for section in manifest.combine(paths, dict(zip(changed, fragments)))]
+    manifest.refresh(paths)
+    manifest.save()
+    return combos
+
+def _full(paths: list) -> list:
+    combos, _ = generate_markdown_collation([MarkdownFile.from_file(path) for path in paths], CollationPlan(COLLATE_SECTIONS), None)
+    return [section.write() for section in combos]
+
+def test_manifest_matches_full_collation():
+    with TemporaryDirectory() as tmpdir:
+        file_dir = Path(tmpdir)
+        paths = _entries(file_dir)
+        manifest = CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS))
+        assert _run(file_dir, paths, manifest) == _full(paths)
+        assert (file_dir / MANIFEST_NAME).exists()
+
+        # Nothing changed: nothing is parsed and the manifest is not rewritten
+        manifest = CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS))
+        assert all(manifest.is_current(path) for path in paths)
+        assert manifest.title(paths[0]) == '2025-02-27'
+        before = (file_dir / MANIFEST_NAME).stat().st_mtime_ns
+        assert _run(file_dir, paths, manifest) == _full(paths)
+        assert (file_dir / MANIFEST_NAME).stat().st_mtime_ns == before
+
+        # Only the changed title is re-grouped, the other comes from the manifest
+        paths[1].write_text('# 2025-02-28\n\n## Work Done\n\n- Testing (ABC-1)\n- Reviews (XYZ-2)\n')
+        manifest = CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS))
+        assert _run(file_dir, paths, manifest) == _full(paths)
+
+        # Removed entries drop their fragments
+        paths[0].unlink()
+        manifest = CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS))
+        assert _run(file_dir, paths[1:], manifest) == _full(paths[1:])
+        assert list(manifest.entries) == ['2025-02-28.md']
+
+def test_manifest_touched_entry_is_current():
+    with TemporaryDirectory() as tmpdir:
+        file_dir = Path(tmpdir)
+        paths = _entries(file_dir)
+        _run(file_dir, paths, CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS)))
+        os.utime(paths[0], ns=(1, 1))
+        manifest = CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS))
+        assert manifest.is_current(paths[0])
+        manifest.save()
+        assert CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS)).entries['2025-02-27.md']['mtime'] == 1
+
+def test_manifest_cleanup_changes_rebuild_next_run():
+    with TemporaryDirectory() as tmpdir:
+        file_dir = Path(tmpdir)
+        paths = _entries(file_dir)
+        manifest = CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS))
+        changed = list(paths)
+        markdown_files = [MarkdownFile.from_file(path) for path in changed]
+        fragments, _ = gather_markdown_collation(markdown_files, CollationPlan(COLLATE_SECTIONS), file_dir)
+        manifest.combine(paths, dict(zip(changed, fragments)))
+        # Entry edited after the summary was built, so its title is rebuilt next run
+        paths[0].write_text('# 2025-02-27\n\n## Work Done\n\n- Support (ABC-1)\n- More (ABC-1)\n\n## Learned\n\n- Something\n')
+        manifest.refresh(paths)
+        assert set(manifest.combined) == set()
+        manifest.save()
+        manifest = CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS))
+        assert _run(file_dir, paths, manifest) == _full(paths)
+
+def test_manifest_ignored_when_invalid():
+    with TemporaryDirectory() as tmpdir:
+        file_dir = Path(tmpdir)
+        paths = _entries(file_dir)
+        _run(file_dir, paths, CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS)))
+        assert CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS)).entries
+        # Other collate config
+        assert not CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS[:1])).entries
+        assert not CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS, ['Learned'])).entries
+        (file_dir / MANIFEST_NAME).write_text('{broken')
+        assert not CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS)).entries
+        (file_dir / MANIFEST_NAME).write_text('[]')
+        assert not CollationManifest.load(file_dir, CollationPlan(COLLATE_SECTIONS)).entries
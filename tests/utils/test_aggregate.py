@@ -0,0 +1,195 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from enheduanna.types.markdown.markdown_section import MarkdownSection
+from freezegun import freeze_time
+
+from enheduanna.types.config.file import AggregatorSharding, AggregatorUpdate
+from enheduanna.types.markdown.document_section import DocumentSection
+from enheduanna.utils import aggregate
+from enheduanna.utils.aggregate import _INDEX_FILES, _entry_year, AggregateIndex, list_shards, root_title, section_fingerprint, split_aggregator
+from enheduanna.utils.markdown import write_document_section
+from enheduanna.utils.write_plan import WritePlan
+
+AGGREGATOR_TEXT = '''# Greg Weekly
+
+## 2025-02-21 Greg Weekly
+
+- first notes
+
+## Unrelated
+
+- kept out of the index
+
+## 2025-02-28 Greg Weekly
+
+- second notes
+
+## 2025-01-01 Greg Weekly
+
+### Same
+
+### Same
+
+## 2025-02-28 Greg Weekly
+
+- second notes again
+'''
+
+def test_aggregate_index_rebuilds_from_aggregator():
+    with TemporaryDirectory() as tmpdir:
+        aggregate_path = Path(tmpdir) / 'Greg Weekly.md'
+        aggregate_path.write_text(AGGREGATOR_TEXT)
+        plan = WritePlan()
+        index = AggregateIndex.load(aggregate_path, 'Greg Weekly', plan)
+        # Repeated titles keep the latest copy, sections that do not parse are left out
+        assert list(index.sections) == [('2025-02-21', 'Greg Weekly'), ('2025-02-28', 'Greg Weekly')]
+        assert index.find('2025-02-28') == section_fingerprint(MarkdownSection('2025-02-28 Greg Weekly', '- second notes again', level=2))
+        assert index.find('2025-02-21') == section_fingerprint(MarkdownSection('2025-02-21 Greg Weekly', '- first notes', level=2))
+        assert index.find('2025-03-07') is None
+        index.record('2025-03-07', 'abc')
+        index.record('2025-03-07', 'def')
+        assert index.find('2025-03-07') == 'def'
+        index.save(plan)
+        # Loading again from the same plan sees the staged index
+        assert AggregateIndex.load(aggregate_path, 'Greg Weekly', plan).find('2025-03-07') == 'def'
+        plan.commit()
+        lines = index.path.read_text().splitlines()
+        assert len(lines) == 4
+
+        # A saved index is used while the aggregator size matches, and new records are appended to it
+        plan = WritePlan()
+        index = AggregateIndex.load(aggregate_path, 'Greg Weekly', plan)
+        assert index.find('2025-03-07') == 'def'
+        index.record('2025-03-14', 'ghi')
+        index.save(plan)
+        assert AggregateIndex.load(aggregate_path, 'Greg Weekly', plan).find('2025-03-14') == 'ghi'
+        plan.commit()
+        assert index.path.read_text().splitlines() == lines + ['["2025-03-14","Greg Weekly","ghi",%d]' % len(AGGREGATOR_TEXT)]
+        # A partly written last record is left for the next read
+        with index.path.open('a') as stream:
+            stream.write('["2025-03-21","Greg')
+        assert AggregateIndex.load(aggregate_path, 'Greg Weekly', WritePlan()).find('2025-03-21') is None
+        with index.path.open('a') as stream:
+            stream.write(' Weekly","jkl",%d]\n' % len(AGGREGATOR_TEXT))
+        assert AggregateIndex.load(aggregate_path, 'Greg Weekly', WritePlan()).find('2025-03-21') == 'jkl'
+        # Another process reads the whole file
+        _INDEX_FILES.clear()
+        assert AggregateIndex.load(aggregate_path, 'Greg Weekly', WritePlan()).find('2025-03-14') == 'ghi'
+
+        # Editing the aggregator by hand rebuilds it
+        aggregate_path.write_text(AGGREGATOR_TEXT + '\n## 2025-03-07 Greg Weekly\n\n- third notes\n')
+        index = AggregateIndex.load(aggregate_path, 'Greg Weekly', WritePlan())
+        assert index.find('2025-03-07') == section_fingerprint(MarkdownSection('2025-03-07 Greg Weekly', '- third notes', level=2))
+        # As does an unreadable index, or one from another version
+        index.path.write_text('not json\n')
+        assert len(AggregateIndex.load(aggregate_path, 'Greg Weekly', WritePlan()).sections) == 3
+        index.path.write_text('{"version":0,"size":%d}\n["2025-03-07","Greg Weekly","abc",%d]\n' % (
+            aggregate_path.stat().st_size, aggregate_path.stat().st_size))
+        assert AggregateIndex.load(aggregate_path, 'Greg Weekly', WritePlan()).find('2025-03-07') != 'abc'
+
+
+def test_aggregate_index_files_are_bounded(monkeypatch):
+    monkeypatch.setattr(aggregate, 'INDEX_FILES_MAX', 2)
+    _INDEX_FILES.clear()
+    with TemporaryDirectory() as tmpdir:
+        paths = [Path(tmpdir) / f'{name}.md' for name in ('first', 'second', 'third')]
+        for path in paths:
+            path.write_text(f'# {path.stem}\n')
+            plan = WritePlan()
+            AggregateIndex.load(path, 'Greg Weekly', plan).save(plan)
+            plan.commit()
+        # Loading the first again makes it the most recently used
+        AggregateIndex.load(paths[0], 'Greg Weekly', WritePlan())
+        assert list(_INDEX_FILES) == [paths[2].with_name('.third.index.jsonl'), paths[0].with_name('.first.index.jsonl')]
+
+
+def _document(date_prefix, notes='- notes'):
+    root = MarkdownSection(f'{date_prefix} Greg Weekly', '', level=1)
+    root.add_section(MarkdownSection('Details', notes, level=2))
+    return DocumentSection(base_title='Greg Weekly', root=root)
+
+def test_root_title():
+    assert root_title('\n# Greg Weekly\nnotes') == 'Greg Weekly'
+    assert root_title('## Greg Weekly\n') is None
+    assert root_title('#\n') is None
+    assert root_title('\n\n') is None
+
+@freeze_time('2026-01-05')
+def test_entry_year():
+    assert _entry_year('2025-01-03', '%Y-%m-%d') == '2025'
+    # The year does not have to come first, or be the first four digits
+    assert _entry_year('03012025', '%d%m%Y') == '2025'
+    assert _entry_year('January 03, 2024 standup', '%B %d, %Y') == '2024'
+    assert _entry_year('Undated', '%Y-%m-%d') == '2026'
+
+def test_split_aggregator_by_year():
+    with TemporaryDirectory() as tmpdir:
+        aggregate_path = Path(tmpdir) / 'Greg Weekly.md'
+        aggregate_path.write_text('# Greg Weekly\n\nRunning notes\n\n'
+                                  '## 2024-12-20 Greg Weekly\n\n- old notes\n\n'
+                                  '## Agenda\n\n- kept in the index\n\n'
+                                  '## 2025-01-03 Greg Weekly\n\n- new notes\n')
+        plan = WritePlan()
+        shards = split_aggregator(aggregate_path, 'Greg Weekly', AggregatorSharding.YEAR, 1_000_000, plan)
+        folder = Path(tmpdir) / 'Greg Weekly'
+        assert shards == [folder / '2024.md', folder / '2025.md']
+        plan.commit()
+        assert aggregate_path.read_text() == ('# Greg Weekly\n\nRunning notes\n\n'
+                                              '## Agenda\n\n- kept in the index\n\n'
+                                              '## Shards\n\n'
+                                              '- [2025](./Greg%20Weekly/2025.md)\n'
+                                              '- [2024](./Greg%20Weekly/2024.md)\n')
+        assert (folder / '2024.md').read_text() == '# Greg Weekly 2024\n\n## 2024-12-20 Greg Weekly\n\n- old notes\n'
+        assert list_shards(aggregate_path, WritePlan()) == [folder / '2025.md', folder / '2024.md']
+        # Shards come with their fingerprint index, so they are not parsed again
+        assert AggregateIndex.load(folder / '2025.md', 'Greg Weekly', WritePlan()).find('2025-01-03') is not None
+
+        # Appends go to the shard for the entry's year, starting new shards as needed
+        assert write_document_section(_document('2025-01-10'), Path(tmpdir),
+                                      sharding=AggregatorSharding.YEAR) == (folder / '2025.md', 'appended')
+        assert write_document_section(_document('2025-01-10'), Path(tmpdir),
+                                      sharding=AggregatorSharding.YEAR) == (folder / '2025.md', 'unchanged')
+        with freeze_time('2026-01-05'):
+            assert write_document_section(_document('Undated'), Path(tmpdir),
+                                          sharding=AggregatorSharding.YEAR) == (folder / '2026.md', 'appended')
+        assert aggregate_path.read_text().endswith('## Shards\n\n'
+                                                   '- [2026](./Greg%20Weekly/2026.md)\n'
+                                                   '- [2025](./Greg%20Weekly/2025.md)\n'
+                                                   '- [2024](./Greg%20Weekly/2024.md)\n')
+        assert (folder / '2026.md').read_text() == ('# Greg Weekly 2026\n\n'
+                                                    '## Undated Greg Weekly\n\n### Details\n\n- notes\n')
+
+def test_split_aggregator_by_size():
+    with TemporaryDirectory() as tmpdir:
+        document_folder = Path(tmpdir)
+        aggregate_path = document_folder / 'Greg Weekly.md'
+        aggregate_path.write_text('# Greg Weekly\n')
+        folder = document_folder / 'Greg Weekly'
+        # Nothing to move yet, so the first append starts the first shard
+        plan = WritePlan()
+        assert not split_aggregator(aggregate_path, 'Greg Weekly', AggregatorSharding.SIZE, 100, plan)
+        for day in range(1, 5):
+            write_document_section(_document(f'2025-01-0{day}'), document_folder, sharding=AggregatorSharding.SIZE, shard_size=100)
+        assert list_shards(aggregate_path, WritePlan()) == [folder / '002.md', folder / '001.md']
+        assert (folder / '001.md').read_text().count('Greg Weekly\n\n### Details') == 2
+        # A changed section from an entry in the newest shard is replaced there, even though it is full
+        path, action = write_document_section(_document('2025-01-04', '- changed'), document_folder, update=AggregatorUpdate.REPLACE,
+                                              sharding=AggregatorSharding.SIZE, shard_size=100)
+        assert (path, action) == (folder / '002.md', 'replaced')
+        assert '- changed' in path.read_text()
+        # Older shards are closed, so one from an entry in them goes to a new shard
+        path, action = write_document_section(_document('2025-01-01', '- changed'), document_folder, update=AggregatorUpdate.REPLACE,
+                                              sharding=AggregatorSharding.SIZE, shard_size=100)
+        assert (path, action) == (folder / '003.md', 'appended')
+        assert '- changed' not in (folder / '001.md').read_text()
+
+        # Splitting by size fills each shard up to the limit
+        flat_path = document_folder / 'Flat.md'
+        flat_path.write_text('# Flat\n\n' + ''.join(f'## 2025-01-0{day} Flat\n\n- {"x" * 60}\n\n' for day in range(1, 6)))
+        plan = WritePlan()
+        shards = split_aggregator(flat_path, 'Flat', AggregatorSharding.SIZE, 100, plan)
+        assert [shard.name for shard in shards] == ['001.md', '002.md', '003.md']
+        plan.commit()
+        assert (document_folder / 'Flat' / '001.md').read_text().count('## 2025') == 2
+        assert (document_folder / 'Flat' / '003.md').read_text().count('## 2025') == 1
@@ -0,0 +1,160 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import os
+
+from enheduanna.types.config.cache import CacheConfig
+from enheduanna.types.markdown.markdown_file import MarkdownFile, generate_markdown_sections
+from enheduanna.utils.cache import MemoryParseCache, ParseCache, pack_section, unpack_section
+
+TEXT = '# 2025-02-27\n\n## Work Done\n\n- Fixed a bug (ABC-1)\n\n### Details\n\nnotes\n\n## Scratch\n\n- \n'
+
+
+def _tree(section):
+    return (section.title, section.contents, section.level, [_tree(s) for s in section.sections])
+
+
+def test_pack_round_trip():
+    section = generate_markdown_sections(TEXT)
+    result = unpack_section(pack_section(section))
+    assert _tree(result) == _tree(section)
+    assert result.get_section('Work Done').get_section('Details').level == 3
+
+
+def test_from_config_disabled():
+    assert ParseCache.from_config(CacheConfig()) is None
+    with TemporaryDirectory() as tmpdir:
+        cache = ParseCache.from_config(CacheConfig(enabled=True, folder=Path(tmpdir), max_entries=5))
+        assert cache.folder == Path(tmpdir) / 'parse'
+        assert cache.max_entries == 5
+
+
+def test_load_reuses_parsed_tree():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        entry = tmpdir / 'entry.md'
+        entry.write_text(TEXT)
+        cache = ParseCache(tmpdir / 'cache')
+        first = cache.load(entry)
+        cache.save()
+        assert _tree(first) == _tree(generate_markdown_sections(TEXT))
+
+        # A new cache instance reads the saved index and blob without parsing
+        cache = ParseCache(tmpdir / 'cache')
+        blob = next(p for p in cache.folder.glob('*.json') if p.name != 'index.json')
+        blob.write_text('["Cached", "", 1, []]')
+        assert cache.load(entry).title == 'Cached'
+        # Changed mtime with identical contents revalidates by hash and keeps the blob
+        os.utime(entry, ns=(1, 1))
+        assert cache.load(entry).title == 'Cached'
+        assert cache.load(entry).title == 'Cached'
+
+
+def test_load_reparses_changed_file():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        entry = tmpdir / 'entry.md'
+        entry.write_text(TEXT)
+        cache = ParseCache(tmpdir / 'cache')
+        cache.load(entry)
+        entry.write_text('# Changed\n\nbody of a different size\n')
+        section = cache.load(entry)
+        assert section.title == 'Changed'
+        assert section.contents == 'body of a different size'
+
+
+def test_load_recovers_from_bad_files():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        entry = tmpdir / 'entry.md'
+        entry.write_text(TEXT)
+        cache = ParseCache(tmpdir / 'cache')
+        cache.load(entry)
+        cache.save()
+        for blob in cache.folder.glob('*.json'):
+            if blob.name != 'index.json':
+                blob.write_text('not json')
+        cache = ParseCache(tmpdir / 'cache')
+        assert cache.load(entry).title == '2025-02-27'
+        for blob in cache.folder.glob('*.json'):
+            if blob.name != 'index.json':
+                blob.unlink()
+        cache = ParseCache(tmpdir / 'cache')
+        assert cache.load(entry).title == '2025-02-27'
+        cache.index_path.write_text('{broken')
+        cache = ParseCache(tmpdir / 'cache')
+        assert cache.load(entry).title == '2025-02-27'
+
+
+def test_save_evicts_least_recently_used():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        paths = []
+        for count in range(3):
+            path = tmpdir / f'{count}.md'
+            path.write_text(f'# File {count}\n')
+            paths.append(path)
+        cache = ParseCache(tmpdir / 'cache', max_entries=2)
+        for path in paths:
+            cache.load(path)
+        cache.load(paths[0])
+        cache.save()
+        cache.save()
+        blobs = [p for p in cache.folder.glob('*.json') if p.name != 'index.json']
+        assert len(blobs) == 2
+        cache = ParseCache(tmpdir / 'cache', max_entries=2)
+        assert set(cache._load_index()['entries']) == {str(paths[0].resolve()), str(paths[2].resolve())} #pylint:disable=protected-access
+
+
+def test_clear():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        entry = tmpdir / 'entry.md'
+        entry.write_text(TEXT)
+        cache = ParseCache(tmpdir / 'cache')
+        cache.load(entry)
+        cache.save()
+        cache.clear()
+        assert not cache.folder.exists()
+        cache.clear()
+
+
+def test_from_file_with_cache():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        entry = tmpdir / 'entry.md'
+        entry.write_text(TEXT)
+        cache = ParseCache(tmpdir / 'cache')
+        markdown_file = MarkdownFile.from_file(entry, cache=cache)
+        assert markdown_file.file_path == entry
+        assert markdown_file.root_section.title == '2025-02-27'
+        # Lossless parsing needs the source text, so it skips the cache
+        lossless = MarkdownFile.from_file(entry, lossless=True, cache=cache)
+        assert lossless.root_section.span is not None
+
+
+def test_memory_cache():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        paths = []
+        for count in range(3):
+            path = tmpdir / f'{count}.md'
+            path.write_text(f'# File {count}\n')
+            paths.append(path)
+        cache = MemoryParseCache(max_entries=2)
+        first = cache.load(paths[0])
+        # Every hit is a new tree, so changing one never changes the cached copy
+        first.title = 'Changed'
+        assert cache.load(paths[0]).title == 'File 0'
+        os.utime(paths[0], ns=(1, 1))
+        assert cache.load(paths[0]).title == 'File 0'
+        paths[0].write_text('# Edited\n')
+        assert cache.load(paths[0]).title == 'Edited'
+        for path in paths[1:]:
+            cache.load(path)
+        cache.load(paths[0])
+        cache.save()
+        cache.save()
+        assert set(cache._load_index()['entries']) == {str(paths[0].resolve()), str(paths[2].resolve())} #pylint:disable=protected-access
+        assert len(cache._trees) == 2 #pylint:disable=protected-access
+        cache.clear()
+        assert cache._load_index()['entries'] == {} #pylint:disable=protected-access
@@ -0,0 +1,104 @@
+from pathlib import Path
+import os
+
+import pytest
+
+from enheduanna.types.config import Config
+from enheduanna.utils.config_snapshot import load_config, read_snapshot, snapshot_key, snapshot_path
+
+CONFIG_TEXT = '''---
+file:
+  entries_folder: !ENV ${NOTES_DIR:/tmp/notes}
+  date_output_format: "%Y-%m-%d"
+  entry_sections:
+    - title: Follow Ups
+      contents: ''
+      sections:
+        - title: Short Term
+          contents: '- '
+          level: 3
+'''
+
+@pytest.fixture(name='snapshot')
+def fixture_snapshot(tmp_path, monkeypatch):
+    path = tmp_path / 'cache' / 'config.snapshot'
+    monkeypatch.setenv('ENHEDUANNA_CONFIG_SNAPSHOT', str(path))
+    monkeypatch.delenv('NOTES_DIR', raising=False)
+    return path
+
+def fail_from_yaml(_path):
+    raise AssertionError('config was parsed again')
+
+def test_snapshot_path(tmp_path, monkeypatch):
+    monkeypatch.setenv('ENHEDUANNA_CONFIG_SNAPSHOT', '~/config.snapshot')
+    path = snapshot_path(tmp_path / 'config.yml')
+    assert path.parent == Path.home()
+    assert path.name.startswith('config-') and path.suffix == '.snapshot'
+    # Each config file gets its own snapshot
+    assert snapshot_path(tmp_path / 'config.yml') == path
+    assert snapshot_path(tmp_path / 'other.yml') != path
+
+def test_snapshot_key_covers_home_and_defaults(tmp_path, monkeypatch):
+    config_path = tmp_path / 'config.yml'
+    key = snapshot_key(config_path)
+    monkeypatch.setenv('HOME', str(tmp_path))
+    assert snapshot_key(config_path) != key
+    assert b'"defaults":[' in key
+
+def test_load_config_uses_snapshot(tmp_path, snapshot, monkeypatch):
+    config_path = tmp_path / 'config.yml'
+    config_path.write_text(CONFIG_TEXT)
+    config = load_config(config_path)
+    assert config.file.entries_folder == Path('/tmp/notes')
+    path = snapshot_path(config_path)
+    assert path.parent == snapshot.parent
+    assert path.stat().st_mode & 0o777 == 0o600
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Config, 'from_yaml', fail_from_yaml)
+        cached = load_config(config_path)
+    assert cached.file.entries_folder == Path('/tmp/notes')
+    assert cached.file.entry_sections[0].get_section('Short Term').level == 3
+    assert cached.file.collation_plan.title_index('Work Done') == 0
+
+    # Referenced environment variables are part of the key
+    monkeypatch.setenv('NOTES_DIR', str(tmp_path / 'notes'))
+    assert load_config(config_path).file.entries_folder == tmp_path / 'notes'
+    # So is the config file itself
+    config_path.write_text(CONFIG_TEXT.replace('%Y-%m-%d', '%d-%m-%Y'))
+    assert load_config(config_path).file.date_output_format == '%d-%m-%Y'
+    # Rebuilding always parses the file
+    with monkeypatch.context() as patch:
+        patch.setattr(Config, 'from_yaml', fail_from_yaml)
+        with pytest.raises(AssertionError):
+            load_config(config_path, rebuild=True)
+
+def test_missing_config_file(tmp_path, snapshot):
+    config = load_config(tmp_path / 'missing.yml')
+    assert config.file.date_output_format == '%Y-%m-%d'
+    assert read_snapshot(snapshot_path(tmp_path / 'missing.yml'), snapshot_key(tmp_path / 'missing.yml')) is not None
+
+def test_read_snapshot_rejects_bad_data(tmp_path, snapshot):
+    config_path = tmp_path / 'config.yml'
+    config_path.write_text(CONFIG_TEXT)
+    snapshot = snapshot_path(config_path)
+    key = snapshot_key(config_path)
+    assert read_snapshot(snapshot, key) is None
+    snapshot.parent.mkdir(parents=True)
+    snapshot.write_bytes(key + b'\nnot a pickle')
+    assert read_snapshot(snapshot, key) is None
+    # Pickled data that is not a config is ignored
+    snapshot.write_bytes(key + b'\n' + b'\x80\x05K\x01.')
+    assert read_snapshot(snapshot, key) is None
+    load_config(config_path)
+    assert read_snapshot(snapshot, b'{}') is None
+    assert read_snapshot(snapshot, key) is not None
+
+def test_unwritable_snapshot_folder(tmp_path, monkeypatch):
+    blocker = tmp_path / 'blocker'
+    blocker.write_text('')
+    monkeypatch.setenv('ENHEDUANNA_CONFIG_SNAPSHOT', str(blocker / 'config.snapshot'))
+    config_path = tmp_path / 'config.yml'
+    config_path.write_text(CONFIG_TEXT)
+    assert load_config(config_path).file.date_output_format == '%Y-%m-%d'
+    assert sorted(os.listdir(tmp_path)) == ['blocker', 'config.yml']
@@ -4,16 +4,20 @@ from tempfile import TemporaryDirectory, NamedTemporaryFile
 from pydantic_core._pydantic_core import ValidationError
 from pytest import raises
 
+from enheduanna.types.config.file import AggregatorUpdate
 from enheduanna.types.markdown.markdown_file import MarkdownFile
 from enheduanna.types.markdown.markdown_section import MarkdownSection
 from enheduanna.types.markdown.collate_section import CollateSection
+from enheduanna.types.markdown.collation_plan import CollationPlan
 from enheduanna.types.markdown.document_section import DocumentSection
 from enheduanna.utils.markdown import section_generate_from_json
 from enheduanna.utils.markdown import collate_section_generate_from_json
+from enheduanna.utils.markdown import collect_collate_fragments
 from enheduanna.utils.markdown import generate_markdown_collation
 from enheduanna.utils.markdown import generate_markdown_merge
 from enheduanna.utils.markdown import remove_empty_sections
 from enheduanna.utils.markdown import write_document_section
+from enheduanna.utils.write_plan import WritePlan
 
 
 def test_validation_of_section_schema():
@@ -59,7 +63,7 @@ def test_combine_markdown_sections():
 
         mf1 = MarkdownFile(path1, ms1)
         mf2 = MarkdownFile(path2, ms2)
-        result, document = generate_markdown_collation([mf1, mf2], [cs1], ['Follow Ups'], Path(tmpdir) / 'documents')
+        result, document = generate_markdown_collation([mf1, mf2], CollationPlan([cs1], ['Follow Ups']), Path(tmpdir) / 'documents')
         assert len(result) == 1
         assert len(document) == 2
         assert result[0].title == 'Work Done'
@@ -156,10 +160,26 @@ def test_combine_markdown_sections_recursive():
     with TemporaryDirectory() as tmpdir:
         path = Path(tmpdir) / '2025-02-10.md'
         mf = MarkdownFile(path, outer)
-        result, _ = generate_markdown_collation([mf], [cs], [], Path(tmpdir) / 'documents')
+        result, _ = generate_markdown_collation([mf], CollationPlan([cs]), Path(tmpdir) / 'documents')
         assert len(result) == 1
         assert result[0].title == 'Work Done'
 
+def test_collect_collate_fragments():
+    outer = MarkdownSection('2025-02-10', '', level=1)
+    inner = MarkdownSection('Inner', '', level=1)
+    inner.add_section(MarkdownSection('Work Done', 'some work', level=2))
+    outer.add_section(inner)
+    outer.add_section(MarkdownSection('Work Done', 'more work', level=2))
+    outer.add_section(MarkdownSection('Scratch', 'ignored', level=2))
+    outer.add_section(MarkdownSection('Runbook', 'document', level=2))
+
+    cs = CollateSection('Work Done')
+    fragments = collect_collate_fragments(outer, CollationPlan([cs], ['Scratch']))
+    assert [(collate.title, section.contents) for collate, section in fragments] == [('Work Done', 'some work'), ('Work Done', 'more work')]
+    # Nothing is extracted or copied
+    assert fragments[1][1] is outer.sections[1]
+    assert len(outer.sections) == 4
+
 def _document_section(base_title='Greg Weekly', date_prefix='2025-02-28'):
     root = MarkdownSection(f'{date_prefix} {base_title}', '', level=1)
     root.add_section(MarkdownSection('Details', 'some notes from the meeting', level=2))
@@ -169,8 +189,8 @@ def test_write_document_section_standalone():
     # No aggregator file present -> standalone dated file, original behaviour
     with TemporaryDirectory() as tmpdir:
         document_folder = Path(tmpdir)
-        path, appended = write_document_section(_document_section(), document_folder)
-        assert appended is False
+        path, action = write_document_section(_document_section(), document_folder)
+        assert action == 'written'
         assert path == document_folder / '2025-02-28 Greg Weekly.md'
         assert path.read_text() == '# 2025-02-28 Greg Weekly\n\n## Details\n\nsome notes from the meeting\n'
 
@@ -181,8 +201,8 @@ def test_write_document_section_appends_to_existing():
         aggregate_path = document_folder / 'Greg Weekly.md'
         aggregate_path.write_text('# Greg Weekly\n\nRunning notes for the weekly sync\n')
 
-        path, appended = write_document_section(_document_section(), document_folder)
-        assert appended is True
+        path, action = write_document_section(_document_section(), document_folder)
+        assert action == 'appended'
         assert path == aggregate_path
         content = path.read_text()
         assert content == ('# Greg Weekly\n\nRunning notes for the weekly sync\n\n'
@@ -190,9 +210,9 @@ def test_write_document_section_appends_to_existing():
         # No standalone dated file was created
         assert not (document_folder / '2025-02-28 Greg Weekly.md').exists()
 
-        # Re-running appends a second same-titled section (no dedup guard)
-        write_document_section(_document_section(), document_folder)
-        assert path.read_text().count('## 2025-02-28 Greg Weekly') == 2
+        # Re-running with the same content is skipped
+        assert write_document_section(_document_section(), document_folder) == (path, 'unchanged')
+        assert path.read_text() == content
 
 def test_write_document_section_appends_to_empty_aggregator():
     # An empty aggregator (freshly touched) is seeded with a title from the base section
@@ -201,11 +221,88 @@ def test_write_document_section_appends_to_empty_aggregator():
         aggregate_path = document_folder / 'Greg Weekly.md'
         aggregate_path.write_text('')
 
-        path, appended = write_document_section(_document_section(), document_folder)
-        assert appended is True
+        path, action = write_document_section(_document_section(), document_folder)
+        assert action == 'appended'
         assert path == aggregate_path
         assert path.read_text() == '# Greg Weekly\n\n## 2025-02-28 Greg Weekly\n\n### Details\n\nsome notes from the meeting\n'
 
+def test_write_document_section_lossless_keeps_aggregator_text():
+    # Lossless mode leaves the existing aggregator text untouched and only renders the new section
+    with TemporaryDirectory() as tmpdir:
+        document_folder = Path(tmpdir)
+        aggregate_path = document_folder / 'Greg Weekly.md'
+        original = '# Greg Weekly\nRunning notes\n\n\n## 2025-02-21 Greg Weekly\n- tight list\n'
+        aggregate_path.write_text(original)
+
+        path, action = write_document_section(_document_section(), document_folder, lossless=True)
+        assert action == 'appended'
+        assert path.read_text() == (f'{original}\n'
+                                    '## 2025-02-28 Greg Weekly\n\n### Details\n\nsome notes from the meeting\n')
+
+def test_write_document_section_appends_without_rewriting():
+    # Appends only add the new section, earlier text is never re-rendered
+    with TemporaryDirectory() as tmpdir:
+        document_folder = Path(tmpdir)
+        aggregate_path = document_folder / 'Greg Weekly.md'
+        original = '\n# Greg Weekly\nRunning notes\n\n\n## 2025-02-21 Greg Weekly\n- tight list'
+        aggregate_path.write_text(original)
+
+        plan = WritePlan()
+        write_document_section(_document_section(), document_folder, write_plan=plan)
+        write_document_section(_document_section(date_prefix='2025-03-07'), document_folder, write_plan=plan)
+        assert aggregate_path.read_text() == original
+        assert plan.read(aggregate_path).count('Greg Weekly\n\n### Details') == 2
+        assert plan.commit() == [document_folder / '.Greg Weekly.index.jsonl', aggregate_path]
+        assert aggregate_path.read_text() == (f'{original}\n\n'
+                                              '## 2025-02-28 Greg Weekly\n\n### Details\n\nsome notes from the meeting\n\n'
+                                              '## 2025-03-07 Greg Weekly\n\n### Details\n\nsome notes from the meeting\n')
+
+def test_write_document_section_reparses_untitled_aggregator():
+    # Text before the title is moved under it, so the aggregator is parsed and rewritten
+    with TemporaryDirectory() as tmpdir:
+        document_folder = Path(tmpdir)
+        aggregate_path = document_folder / 'Greg Weekly.md'
+        aggregate_path.write_text('Notes before the title\n\n# Greg Weekly\n')
+
+        write_document_section(_document_section(), document_folder)
+        assert aggregate_path.read_text() == ('# Greg Weekly\n\nNotes before the title\n\n'
+                                              '## 2025-02-28 Greg Weekly\n\n### Details\n\nsome notes from the meeting\n')
+
+def test_write_document_section_changed_sections():
+    # A changed section from the same entry is appended again, or replaces the old one
+    with TemporaryDirectory() as tmpdir:
+        document_folder = Path(tmpdir)
+        aggregate_path = document_folder / 'Greg Weekly.md'
+        aggregate_path.write_text('# Greg Weekly\n')
+        write_document_section(_document_section(), document_folder)
+        write_document_section(_document_section(date_prefix='2025-03-07'), document_folder)
+
+        changed = _document_section()
+        changed.root.sections[0].contents = 'updated notes'
+        assert write_document_section(changed, document_folder) == (aggregate_path, 'appended')
+        assert aggregate_path.read_text().count('## 2025-02-28 Greg Weekly') == 2
+
+        changed = _document_section()
+        changed.root.sections[0].contents = 'final notes'
+        assert write_document_section(changed, document_folder, update=AggregatorUpdate.REPLACE) == (aggregate_path, 'replaced')
+        assert aggregate_path.read_text() == ('# Greg Weekly\n\n'
+                                              '## 2025-02-28 Greg Weekly\n\n### Details\n\nsome notes from the meeting\n\n'
+                                              '## 2025-03-07 Greg Weekly\n\n### Details\n\nsome notes from the meeting\n\n'
+                                              '## 2025-02-28 Greg Weekly\n\n### Details\n\nfinal notes\n')
+        assert write_document_section(changed, document_folder, update=AggregatorUpdate.REPLACE) == (aggregate_path, 'unchanged')
+
+        # Replacing a section that was deleted by hand appends it instead
+        aggregate_path.write_text('# Greg Weekly\n')
+        changed.root.sections[0].contents = 'restored notes'
+        write_document_section(changed, document_folder, update=AggregatorUpdate.REPLACE)
+        assert aggregate_path.read_text() == '# Greg Weekly\n\n## 2025-02-28 Greg Weekly\n\n### Details\n\nrestored notes\n'
+
+        # An entry whose section now has another title has nothing to replace, so it is appended
+        renamed = _document_section(date_prefix='Friday')
+        renamed.entry_title = '2025-02-28'
+        assert write_document_section(renamed, document_folder, update=AggregatorUpdate.REPLACE) == (aggregate_path, 'appended')
+        assert aggregate_path.read_text().endswith('## Friday Greg Weekly\n\n### Details\n\nsome notes from the meeting\n')
+
 def test_remove_sections():
     m = MarkdownSection('2025-03-01', '', level=1)
     m1 = MarkdownSection('Scratch', '-', level=2)
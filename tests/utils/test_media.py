@@ -6,10 +6,14 @@ import time
 
 from enheduanna.types.config.media import MediaConfig, MediaSource
 from enheduanna.types.markdown.markdown_file import MarkdownFile
+from enheduanna.types.markdown.markdown_section import MarkdownSection
 from enheduanna.utils.media import (
     parse_collation_folder_name,
     organize_media_for_collation,
-    update_markdown_media_references
+    rewrite_media_references,
+    update_markdown_media_references,
+    update_media_reference_files,
+    update_section_media_references
 )
 
 def test_parse_collation_folder_name_success():
@@ -386,3 +390,90 @@ def test_update_markdown_no_mapping():
         update_markdown_media_references([markdown_file], {})
 
         assert md_file.read_text() == original_content
+
+def test_organize_media_with_source_index():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        source_dir = tmpdir / 'screenshots'
+        source_dir.mkdir()
+        for name, when in (('first.png', datetime(2025, 1, 20, 14, 30, 45)), ('second.png', datetime(2025, 1, 21, 9, 15, 30))):
+            (source_dir / name).write_text(name)
+            os.utime(source_dir / name, (when.timestamp(), when.timestamp()))
+        collation_dir = tmpdir / '2025-01-20_2025-01-26'
+        collation_dir.mkdir()
+        config = MediaConfig(sources=[MediaSource(folder=source_dir, operation="move")], extensions=[".png"],
+                             enabled=True, index=True, index_folder=tmpdir / 'index')
+        start = datetime(2025, 1, 20, 0, 0, 0)
+        end = datetime(2025, 1, 26, 23, 59, 59)
+        mapping = organize_media_for_collation(collation_dir, start, end, config)
+        assert mapping == {'first.png': ('media', '2025-01-20_14-30-45.png'),
+                           'second.png': ('media', '2025-01-21_09-15-30.png')}
+        assert len(list((tmpdir / 'index').glob('*.json'))) == 1
+        # Moved files are gone from the index, so a second run finds nothing
+        assert organize_media_for_collation(collation_dir, start, end, config) == {}
+
+def test_organize_media_parallel_matches_serial(tmp_path, capsys):
+    source_dir = tmp_path / 'screenshots'
+    source_dir.mkdir()
+    for count in range(12):
+        # Pairs of files share a modified time, so half of them need a numbered name
+        mtime = datetime(2025, 1, 20, 14, 30, count // 2).timestamp()
+        (source_dir / f'shot{count:02d}.png').write_text(f'image {count}' * (count + 1))
+        os.utime(source_dir / f'shot{count:02d}.png', (mtime, mtime))
+    start = datetime(2025, 1, 20, 0, 0, 0)
+    end = datetime(2025, 1, 26, 23, 59, 59)
+    results = []
+    for workers in (1, 4):
+        collation_dir = tmp_path / str(workers) / '2025-01-20_2025-01-26'
+        config = MediaConfig(sources=[MediaSource(folder=source_dir, workers=workers)], extensions=['.png'], enabled=True)
+        mapping = organize_media_for_collation(collation_dir, start, end, config)
+        files = {path.name: path.read_text() for path in (collation_dir / 'media').iterdir()}
+        output = capsys.readouterr().out.splitlines()
+        assert output[-1].startswith('Media files transferred: 12 (569 bytes) in ')
+        assert output[-1].endswith(' MB/s')
+        results.append((mapping, files, [line.replace(f'/{workers}/', '/') for line in output[:-1]]))
+    assert results[0] == results[1]
+    assert results[0][0]['shot01.png'] == ('media', '2025-01-20_14-30-00_1.png')
+
+MAPPING = {'shot.png': ('media', '2025-01-20_14-30-45.png')}
+
+def test_rewrite_media_references():
+    text = ('![a](~/Screenshots/shot.png) ![b](~/Screenshots/myshot.png) [link](~/Screenshots/shot.png)\n'
+            '<img class="wide" src="/home/user/shot.png"> <img src="other.png">')
+    assert rewrite_media_references(text, MAPPING) == (
+        '![a](./media/2025-01-20_14-30-45.png) ![b](~/Screenshots/myshot.png) [link](~/Screenshots/shot.png)\n'
+        '<img class="wide" src="./media/2025-01-20_14-30-45.png"> <img src="other.png">')
+    assert rewrite_media_references('No images here', MAPPING) == 'No images here'
+
+def test_update_section_media_references():
+    root = MarkdownSection('2025-01-20', '')
+    root.add_section(MarkdownSection('Work Done', '- Fixed it ![shot](shot.png)', level=2))
+    root.sections[0].add_section(MarkdownSection('Notes', '- Nothing to see', level=3))
+    assert update_section_media_references(root, MAPPING)
+    assert root.sections[0].contents == '- Fixed it ![shot](./media/2025-01-20_14-30-45.png)'
+    assert not update_section_media_references(root, MAPPING)
+
+def test_update_markdown_media_references_uses_tree(tmp_path):
+    md_file = tmp_path / 'entry.md'
+    md_file.write_text('# 2025-01-20\n\n## Work Done\n\n- Fixed it ![shot](~/shot.png)\n')
+    markdown_file = MarkdownFile.from_file(md_file)
+    untouched = MarkdownFile.from_file(md_file)
+    untouched.file_path = tmp_path / 'untouched.md'
+    # Changes on disk after parsing are not read back
+    md_file.write_text('# Changed on disk\n')
+    update_markdown_media_references([markdown_file, untouched], {'other.png': ('media', 'other.png')})
+    assert not untouched.file_path.exists()
+    update_markdown_media_references([markdown_file], MAPPING)
+    assert md_file.read_text() == '# 2025-01-20\n\n## Work Done\n\n- Fixed it ![shot](./media/2025-01-20_14-30-45.png)\n'
+
+def test_update_media_reference_files(tmp_path):
+    changed = tmp_path / 'changed.md'
+    changed.write_text('# 2025-01-20\n\n- ![shot](~/shot.png)\n')
+    unchanged = tmp_path / 'unchanged.md'
+    unchanged.write_text('# 2025-01-21\n')
+    mtime = unchanged.stat().st_mtime_ns
+    update_media_reference_files([changed, unchanged], {})
+    assert changed.read_text() == '# 2025-01-20\n\n- ![shot](~/shot.png)\n'
+    update_media_reference_files([changed, unchanged], MAPPING)
+    assert changed.read_text() == '# 2025-01-20\n\n- ![shot](./media/2025-01-20_14-30-45.png)\n'
+    assert unchanged.stat().st_mtime_ns == mtime
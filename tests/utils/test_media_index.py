@@ -0,0 +1,100 @@
+from datetime import datetime
+from pathlib import Path
+import os
+
+from enheduanna.utils.media_index import MediaSourceIndex, timestamp_ns
+
+OLD_FOLDER_TIME = datetime(2025, 1, 1).timestamp()
+
+def media_file(folder: Path, name: str, when: datetime) -> Path:
+    path = folder / name
+    path.write_text(name)
+    os.utime(path, (when.timestamp(), when.timestamp()))
+    return path
+
+def settle(folder: Path, offset: int = 0) -> None:
+    # Push the folder mtime out of the racy window so the index trusts it
+    os.utime(folder, (OLD_FOLDER_TIME + offset, OLD_FOLDER_TIME + offset))
+
+def test_timestamp_ns():
+    value = datetime(2025, 1, 20, 14, 30, 45, 123456)
+    assert timestamp_ns(value) == int(value.replace(microsecond=0).timestamp()) * 1_000_000_000 + 123_456_000
+
+def test_scan_and_select(tmp_path):
+    media_file(tmp_path, 'late.png', datetime(2025, 1, 21, 9, 15, 30))
+    media_file(tmp_path, 'early.PNG', datetime(2025, 1, 20, 14, 30, 45))
+    media_file(tmp_path, 'outside.png', datetime(2025, 1, 27, 0, 0, 0))
+    media_file(tmp_path, 'edge.png', datetime(2025, 1, 26, 23, 59, 59))
+    media_file(tmp_path, 'notes.txt', datetime(2025, 1, 21))
+    (tmp_path / 'folder.png').mkdir()
+    index = MediaSourceIndex.load(tmp_path, ['.png'])
+    assert index.scan() == 4
+    selected = index.select(datetime(2025, 1, 20), datetime(2025, 1, 26, 23, 59, 59))
+    assert [name for _mtime, name in selected] == ['early.PNG', 'late.png', 'edge.png']
+    assert selected[0][0] == timestamp_ns(datetime(2025, 1, 20, 14, 30, 45))
+    # Without an index file the folder is listed again every scan
+    assert index.scan() == 0
+    index.save()
+    assert index.path is None
+
+def test_persisted_index_only_checks_changes(tmp_path):
+    source = tmp_path / 'screenshots'
+    source.mkdir()
+    media_file(source, 'one.png', datetime(2025, 1, 20, 10))
+    media_file(source, 'two.png', datetime(2025, 1, 21, 10))
+    settle(source)
+    index = MediaSourceIndex.load(source, ['.png'], tmp_path / 'index')
+    assert index.scan() == 2
+    index.save()
+    assert index.path.parent == tmp_path / 'index'
+
+    # Unchanged folders are not listed at all
+    index = MediaSourceIndex.load(source, ['.PNG'], tmp_path / 'index')
+    assert index.scan() == 0
+    assert [name for _mtime, name in index.select(datetime(2025, 1, 20), datetime(2025, 1, 22))] == ['one.png', 'two.png']
+
+    # Only new names, and names that point at a new file, are stat'd
+    media_file(source, 'three.png', datetime(2025, 1, 19, 10))
+    os.replace(media_file(source, 'new.tmp', datetime(2025, 1, 23, 10)), source / 'one.png')
+    settle(source, 60)
+    assert index.scan() == 2
+    assert [name for _mtime, name in index.select(datetime(2025, 1, 1), datetime(2025, 2, 1))] == ['three.png', 'two.png', 'one.png']
+
+def test_recent_folder_mtime_is_not_trusted(tmp_path):
+    media_file(tmp_path, 'one.png', datetime(2025, 1, 20, 10))
+    index = MediaSourceIndex.load(tmp_path / 'source', ['.png'], tmp_path / 'index')
+    index.folder = tmp_path
+    index.scan()
+    assert index.folder_mtime is None
+
+def test_out_of_date_index_is_started_over(tmp_path):
+    source = tmp_path / 'screenshots'
+    source.mkdir()
+    media_file(source, 'one.png', datetime(2025, 1, 20, 10))
+    media_file(source, 'two.jpg', datetime(2025, 1, 20, 11))
+    settle(source)
+    index = MediaSourceIndex.load(source, ['.png'], tmp_path / 'index')
+    index.scan()
+    index.save()
+    # Other extensions need another listing
+    index = MediaSourceIndex.load(source, ['.png', '.jpg'], tmp_path / 'index')
+    assert index.scan() == 2
+    index.path.write_text('not json')
+    index = MediaSourceIndex.load(source, ['.png'], tmp_path / 'index')
+    assert index.scan() == 1
+
+def test_discard_and_unwritable_index(tmp_path):
+    media_file(tmp_path, 'one.png', datetime(2025, 1, 20, 10))
+    media_file(tmp_path, 'two.png', datetime(2025, 1, 21, 10))
+    (tmp_path / 'blocked').write_text('')
+    settle(tmp_path)
+    index = MediaSourceIndex.load(tmp_path, ['.png'], tmp_path / 'blocked')
+    index.scan()
+    index.discard([])
+    assert index.folder_mtime is not None
+    index.discard(['one.png'])
+    assert index.folder_mtime is None
+    assert index.select(datetime(2025, 1, 1), datetime(2025, 2, 1)) == [(timestamp_ns(datetime(2025, 1, 21, 10)), 'two.png')]
+    # The index file cannot be written under a file, the scan result is just not kept
+    index.save()
+    assert not index.path.exists()
@@ -0,0 +1,102 @@
+from datetime import datetime
+from pathlib import Path
+import os
+
+from enheduanna.types.config.media import MediaConfig, MediaSource
+from enheduanna.utils.media import organize_media_for_collation
+from enheduanna.utils.media_manifest import MEDIA_MANIFEST_NAME, MediaManifest, media_hash
+
+START = datetime(2025, 1, 20, 0, 0, 0)
+END = datetime(2025, 1, 26, 23, 59, 59)
+
+def media_file(folder: Path, name: str, text: str, when: datetime) -> Path:
+    path = folder / name
+    path.write_text(text)
+    os.utime(path, (when.timestamp(), when.timestamp()))
+    return path
+
+def copy_config(*folders: Path) -> MediaConfig:
+    return MediaConfig(sources=[MediaSource(folder=folder, operation='copy') for folder in folders],
+                       extensions=['.png'], enabled=True)
+
+def test_recollate_does_not_copy_again(tmp_path):
+    source = tmp_path / 'screenshots'
+    source.mkdir()
+    shot = media_file(source, 'shot.png', 'image', datetime(2025, 1, 20, 14, 30, 45))
+    collation_dir = tmp_path / '2025-01-20_2025-01-26'
+    collation_dir.mkdir()
+    expected = {'shot.png': ('media', '2025-01-20_14-30-45.png')}
+    assert organize_media_for_collation(collation_dir, START, END, copy_config(source)) == expected
+    manifest_mtime = (collation_dir / MEDIA_MANIFEST_NAME).stat().st_mtime_ns
+    assert organize_media_for_collation(collation_dir, START, END, copy_config(source)) == expected
+    assert sorted(path.name for path in (collation_dir / 'media').iterdir()) == ['2025-01-20_14-30-45.png']
+    assert (collation_dir / MEDIA_MANIFEST_NAME).stat().st_mtime_ns == manifest_mtime
+
+    # Touched but unchanged files are hashed once and still skipped
+    when = datetime(2025, 1, 21, 8, 0, 0).timestamp()
+    os.utime(shot, (when, when))
+    assert organize_media_for_collation(collation_dir, START, END, copy_config(source)) == expected
+    manifest = MediaManifest.load(collation_dir)
+    assert manifest.files[str(shot.resolve())]['mtime'] == int(when) * 1_000_000_000
+
+    # A copy deleted from the collation folder is copied again under its old name
+    (collation_dir / 'media' / '2025-01-20_14-30-45.png').unlink()
+    assert organize_media_for_collation(collation_dir, START, END, copy_config(source)) == expected
+    assert (collation_dir / 'media' / '2025-01-20_14-30-45.png').read_text() == 'image'
+    assert shot.exists()
+
+    # New content under the same name gets a new, numbered copy
+    media_file(source, 'shot.png', 'edited image', datetime(2025, 1, 20, 14, 30, 45))
+    assert organize_media_for_collation(collation_dir, START, END, copy_config(source)) == {
+        'shot.png': ('media', '2025-01-20_14-30-45_1.png')}
+    assert (collation_dir / 'media' / '2025-01-20_14-30-45_1.png').read_text() == 'edited image'
+
+def test_same_content_from_two_sources(tmp_path):
+    screenshots = tmp_path / 'screenshots'
+    downloads = tmp_path / 'downloads'
+    screenshots.mkdir()
+    downloads.mkdir()
+    media_file(screenshots, 'shot.png', 'image', datetime(2025, 1, 20, 14, 30, 45))
+    media_file(downloads, 'saved.png', 'image', datetime(2025, 1, 22, 9, 0, 0))
+    collation_dir = tmp_path / '2025-01-20_2025-01-26'
+    mapping = organize_media_for_collation(collation_dir, START, END, copy_config(screenshots, downloads))
+    assert mapping == {'shot.png': ('media', '2025-01-20_14-30-45.png'), 'saved.png': ('media', '2025-01-20_14-30-45.png')}
+    assert len(list((collation_dir / 'media').iterdir())) == 1
+
+def test_unreadable_manifest_numbers_against_folder(tmp_path):
+    source = tmp_path / 'screenshots'
+    source.mkdir()
+    media_file(source, 'shot.png', 'image', datetime(2025, 1, 20, 14, 30, 45))
+    collation_dir = tmp_path / '2025-01-20_2025-01-26'
+    (collation_dir / 'media').mkdir(parents=True)
+    (collation_dir / 'media' / '2025-01-20_14-30-45.png').write_text('placed by hand')
+    (collation_dir / MEDIA_MANIFEST_NAME).write_text('not json')
+    mapping = organize_media_for_collation(collation_dir, START, END, copy_config(source))
+    assert mapping == {'shot.png': ('media', '2025-01-20_14-30-45_1.png')}
+    assert (collation_dir / 'media' / '2025-01-20_14-30-45.png').read_text() == 'placed by hand'
+
+def test_media_hash(tmp_path):
+    path = tmp_path / 'shot.png'
+    path.write_bytes(b'image')
+    assert media_hash(path) == '6105d6cc76af400325e94d588ce511be5bfdbb73b437dc51eca43917d7a43e3d'
+
+def test_move_removes_duplicate_sources(tmp_path, capsys):
+    source = tmp_path / 'screenshots'
+    source.mkdir()
+    media_file(source, 'shot.png', 'image', datetime(2025, 1, 20, 14, 30, 45))
+    media_file(source, 'dup.png', 'image', datetime(2025, 1, 21, 9, 0, 0))
+    collation_dir = tmp_path / '2025-01-20_2025-01-26'
+    config = MediaConfig(sources=[MediaSource(folder=source, operation='move')], extensions=['.png'], enabled=True)
+    mapping = organize_media_for_collation(collation_dir, START, END, config)
+    assert mapping == {'shot.png': ('media', '2025-01-20_14-30-45.png'), 'dup.png': ('media', '2025-01-20_14-30-45.png')}
+    assert not list(source.iterdir())
+    assert [path.name for path in (collation_dir / 'media').iterdir()] == ['2025-01-20_14-30-45.png']
+    assert f"Removed dup.png, already in {collation_dir / 'media' / '2025-01-20_14-30-45.png'}" in capsys.readouterr().out
+
+    # Content that comes back after its copy was deleted from the collation folder is moved into the old place
+    (collation_dir / 'media' / '2025-01-20_14-30-45.png').unlink()
+    media_file(source, 'again.png', 'image', datetime(2025, 1, 22, 9, 0, 0))
+    mapping = organize_media_for_collation(collation_dir, START, END, config)
+    assert mapping == {'again.png': ('media', '2025-01-20_14-30-45.png')}
+    assert not list(source.iterdir())
+    assert (collation_dir / 'media' / '2025-01-20_14-30-45.png').read_text() == 'image'
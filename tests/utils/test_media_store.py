@@ -0,0 +1,103 @@
+from datetime import datetime
+from pathlib import Path
+import fcntl
+import os
+
+import pytest
+
+from enheduanna.types.config.file import FileConfig
+from enheduanna.types.config.media import MediaConfig, MediaSource
+from enheduanna.utils import media_store
+from enheduanna.utils.media import organize_media_for_collation
+from enheduanna.utils.media_manifest import media_hash
+from enheduanna.utils.media_store import MEDIA_STORE_NAME, MediaStore, reflink
+
+START = datetime(2025, 1, 20, 0, 0, 0)
+END = datetime(2025, 2, 2, 23, 59, 59)
+
+def media_file(folder: Path, name: str, text: str, when: datetime) -> Path:
+    path = folder / name
+    path.write_text(text)
+    os.utime(path, (when.timestamp(), when.timestamp()))
+    return path
+
+def store_config(source: Path, operation: str = 'copy') -> MediaConfig:
+    return MediaConfig(sources=[MediaSource(folder=source, operation=operation)], extensions=['.png'], enabled=True, store=True)
+
+def test_from_config(tmp_path):
+    assert MediaStore.from_config(FileConfig(entries_folder=tmp_path)) is None
+    store = MediaStore.from_config(FileConfig(entries_folder=tmp_path, media=MediaConfig(store=True)))
+    assert store.folder == tmp_path / MEDIA_STORE_NAME
+    assert store.blob_path('abcdef', '.PNG') == tmp_path / MEDIA_STORE_NAME / 'ab' / 'abcdef.png'
+
+def test_same_media_in_two_collations_is_stored_once(tmp_path):
+    source = tmp_path / 'screenshots'
+    source.mkdir()
+    shot = media_file(source, 'shot.png', 'image', datetime(2025, 1, 21, 9, 15, 30))
+    store = MediaStore(tmp_path / 'notes' / MEDIA_STORE_NAME)
+    first = tmp_path / 'notes' / '2025-01-20_2025-01-26'
+    second = tmp_path / 'notes' / '2025-01-27_2025-02-02'
+    for collation_dir in (first, second):
+        mapping = organize_media_for_collation(collation_dir, START, END, store_config(source), store=store)
+        assert mapping == {'shot.png': ('media', '2025-01-21_09-15-30.png')}
+    blob = store.blob_path(media_hash(shot), '.png')
+    assert blob.read_text() == 'image'
+    placed = [first / 'media' / '2025-01-21_09-15-30.png', second / 'media' / '2025-01-21_09-15-30.png']
+    # Reflinks are not supported on every test filesystem, hard links are
+    assert all(path.read_text() == 'image' for path in placed)
+    assert blob.stat().st_nlink in (1, 3)
+    assert blob.stat().st_mtime == shot.stat().st_mtime
+
+def test_move_into_store(tmp_path):
+    source = tmp_path / 'screenshots'
+    source.mkdir()
+    store = MediaStore(tmp_path / 'notes' / MEDIA_STORE_NAME)
+    collation_dir = tmp_path / 'notes' / '2025-01-20_2025-01-26'
+    media_file(source, 'shot.png', 'image', datetime(2025, 1, 21, 9, 15, 30))
+    organize_media_for_collation(collation_dir, START, END, store_config(source, 'move'), store=store)
+    # The same content shows up again, it is already stored so the source is just removed
+    shot = media_file(source, 'again.png', 'image', datetime(2025, 1, 22, 9, 15, 30))
+    blob = store.add(shot, media_hash(shot), move=True)
+    assert not shot.exists()
+    assert blob.read_text() == 'image'
+    assert not list(source.iterdir())
+
+def test_place_falls_back(tmp_path, monkeypatch):
+    blob = tmp_path / 'blob.png'
+    blob.write_text('image')
+    store = MediaStore(tmp_path)
+    monkeypatch.setattr(media_store, 'reflink', lambda source, target: target.write_bytes(source.read_bytes()))
+    assert store.place(blob, tmp_path / 'reflinked.png') == 'reflinked'
+    monkeypatch.setattr(media_store, 'reflink', reflink)
+    def no_link(source, target):
+        raise OSError('Links are not supported')
+    monkeypatch.setattr(os, 'link', no_link)
+    assert store.place(blob, tmp_path / 'copied.png') == 'copied'
+    assert (tmp_path / 'copied.png').read_text() == 'image'
+
+def test_reflink(tmp_path, monkeypatch):
+    source = media_file(tmp_path, 'source.png', 'image', datetime(2025, 1, 21, 9, 15, 30))
+    def unsupported(fd, request, arg):
+        raise OSError(95, 'Operation not supported')
+    monkeypatch.setattr(fcntl, 'ioctl', unsupported)
+    with pytest.raises(OSError):
+        reflink(source, tmp_path / 'target.png')
+    assert not (tmp_path / 'target.png').exists()
+    monkeypatch.setattr(fcntl, 'ioctl', lambda fd, request, arg: 0)
+    reflink(source, tmp_path / 'target.png')
+    assert (tmp_path / 'target.png').stat().st_mtime == source.stat().st_mtime
+
+def test_gc_removes_unused_blobs(tmp_path):
+    source = tmp_path / 'screenshots'
+    source.mkdir()
+    media_file(source, 'kept.png', 'kept image', datetime(2025, 1, 21, 9, 15, 30))
+    media_file(source, 'dropped.png', 'dropped', datetime(2025, 1, 22, 9, 15, 30))
+    entries = tmp_path / 'notes'
+    store = MediaStore(entries / MEDIA_STORE_NAME)
+    collation_dir = entries / '2025-01-20_2025-01-26'
+    organize_media_for_collation(collation_dir, START, END, store_config(source), store=store)
+    assert store.gc(entries) == (0, 0)
+    (collation_dir / 'media' / '2025-01-22_09-15-30.png').unlink()
+    assert store.gc(entries) == (1, 7)
+    assert [path.name for path in store.folder.glob('*/*')] == [f"{media_hash(source / 'kept.png')}.png"]
+    assert len(list(store.folder.iterdir())) == 1
@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from enheduanna.utils.cache import ParseCache
+from enheduanna.utils.parse import PARALLEL_MIN_FILES, parse_markdown_files
+
+
+def _tree(section):
+    return (section.title, section.contents, section.level, [_tree(s) for s in section.sections])
+
+
+def _write_entries(folder: Path, count: int):
+    paths = []
+    for number in range(count):
+        path = folder / f'2025-01-{number:03d}.md'
+        path.write_text(f'# Entry {number}\n\n## Work Done\n\n-   item {number}\n\n### Detail\n\ntext {number}\n')
+        paths.append(path)
+    return paths
+
+
+def test_parse_markdown_files_parallel_matches_serial():
+    with TemporaryDirectory() as tmpdir:
+        paths = _write_entries(Path(tmpdir), PARALLEL_MIN_FILES + 3)
+        serial = parse_markdown_files(paths)
+        parallel = parse_markdown_files(paths, jobs=2)
+        assert [f.file_path for f in parallel] == paths
+        assert [_tree(f.root_section) for f in parallel] == [_tree(f.root_section) for f in serial]
+        assert [str(f.root_section) for f in parallel] == [str(f.root_section) for f in serial]
+
+
+def test_parse_markdown_files_parallel_lossless():
+    with TemporaryDirectory() as tmpdir:
+        paths = _write_entries(Path(tmpdir), PARALLEL_MIN_FILES)
+        for markdown_file in parse_markdown_files(paths, lossless=True, jobs=2):
+            # Spans survive the trip back from the workers, so unchanged files write back verbatim
+            assert markdown_file.root_section.span is not None
+            assert markdown_file.root_section.write() == markdown_file.file_path.read_text()
+
+
+def test_parse_markdown_files_with_cache():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        entries = tmpdir / 'entries'
+        entries.mkdir()
+        paths = _write_entries(entries, PARALLEL_MIN_FILES)
+        cache = ParseCache(tmpdir / 'cache')
+        first = parse_markdown_files(paths[:5], cache=cache)
+        second = parse_markdown_files(paths, cache=cache, jobs=2)
+        assert [_tree(f.root_section) for f in second[:5]] == [_tree(f.root_section) for f in first]
+        cache.save()
+        assert len(ParseCache(tmpdir / 'cache')._load_index()['entries']) == len(paths) #pylint:disable=protected-access
+
+
+def test_parse_markdown_files_parallel_from_threads():
+    # Collate --all parses folders from threads, so workers must not be forked from them
+    with TemporaryDirectory() as tmpdir:
+        folders = [Path(tmpdir) / name for name in ('first', 'second')]
+        for folder in folders:
+            folder.mkdir()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(parse_markdown_files, _write_entries(folder, PARALLEL_MIN_FILES), jobs=2) for folder in folders]
+            results = [future.result() for future in futures]
+        assert [len(result) for result in results] == [PARALLEL_MIN_FILES, PARALLEL_MIN_FILES]
+        assert results[1][0].file_path.parent == folders[1]
@@ -0,0 +1,141 @@
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import os
+
+from enheduanna.types.config.file import FileConfig
+from enheduanna.types.config.toc import TocConfig
+from enheduanna.types.markdown.collate_section import CollateSection
+from enheduanna.types.markdown.collation_plan import CollationPlan
+from enheduanna.types.markdown.markdown_file import MarkdownFile
+from enheduanna.utils.markdown import generate_markdown_collation
+from enheduanna.utils.rollup import ROLLUP_MANIFEST_NAME, RollupManifest, build_rollups, period_names
+from enheduanna.utils.write_plan import WritePlan
+
+COLLATE_SECTIONS = [CollateSection('Work Done', regex='\\((?P<ticket>[A-Za-z]+-[0-9]+)\\)', groupBy='ticket')]
+
+SUMMARIES = {
+    '2024-12-30_2025-01-05': '# Summary | 2024-12-30 -> 2025-01-05\n\n## Contents\n\n### Entries\n\n- [2024-12-30](./2024-12-30.md)\n\n## Work Done\n\n- New year planning (ABC-1)\n',
+    '2025-01-06_2025-01-12': '# Summary | 2025-01-06 -> 2025-01-12\n\n## Work Done\n\n- Support (ABC-1)\n- Reviews\n\n### Easy Work\n\n- Docs\n',
+    '2025-03-31_2025-04-06': '# Summary | 2025-03-31 -> 2025-04-06\n\n## Work Done\n\n- Testing (XYZ-2)\n- More support (ABC-1)\n',
+    '2025-04-07_2025-04-13': '# Summary | 2025-04-07 -> 2025-04-13\n\n## Work Done\n\n- Release (XYZ-2)\n\n### Easy Work\n\n- More docs\n',
+}
+
+def _setup(entries: Path) -> FileConfig:
+    for name, text in SUMMARIES.items():
+        (entries / name).mkdir()
+        (entries / name / 'summary.md').write_text(text)
+    # Folders without a summary are skipped
+    (entries / '2025-04-14_2025-04-20').mkdir()
+    return FileConfig(entries_folder=entries, collate_sections=COLLATE_SECTIONS, toc=TocConfig())
+
+def _build(entries: Path, file_config: FileConfig, year: int = None, full: bool = False):
+    output_dir = entries / 'rollups'
+    if full:
+        manifest = RollupManifest(output_dir, CollationPlan(COLLATE_SECTIONS, ['Contents']))
+    else:
+        manifest = RollupManifest.load(output_dir, CollationPlan(COLLATE_SECTIONS, ['Contents']))
+    plan = WritePlan()
+    results = build_rollups(manifest, output_dir, 'summary.md', file_config, plan, year=year)
+    output_dir.mkdir(exist_ok=True)
+    plan.commit()
+    manifest.save()
+    return [(path.name, rebuilt) for path, rebuilt in results], plan
+
+def _direct(paths: list) -> str:
+    combos, _ = generate_markdown_collation([MarkdownFile.from_file(path) for path in paths], CollationPlan(COLLATE_SECTIONS, ['Contents']), None)
+    return '\n'.join(section.write() for section in combos)
+
+def _body(path: Path) -> str:
+    # Combined sections of a rollup, without its title and links
+    text = path.read_text()
+    return text[text.index('## Work Done'):]
+
+def test_period_names():
+    assert period_names(datetime(2025, 1, 6)) == ('2025-Q1', '2025')
+    assert period_names(datetime(2025, 3, 31)) == ('2025-Q1', '2025')
+    assert period_names(datetime(2025, 12, 1)) == ('2025-Q4', '2025')
+
+def test_build_rollups():
+    with TemporaryDirectory() as tmpdir:
+        entries = Path(tmpdir)
+        file_config = _setup(entries)
+        results, plan = _build(entries, file_config)
+        assert results == [('2024-Q4.md', True), ('2025-Q1.md', True), ('2025-Q2.md', True), ('2024-Year.md', True), ('2025-Year.md', True)]
+        assert plan.files_written == 5
+        rollups = entries / 'rollups'
+        assert (rollups / '2025-Q1.md').read_text() == (
+            '# Rollup | 2025 Q1\n\n## Contents\n\n'
+            '- [2025-01-06 -> 2025-01-12](../2025-01-06_2025-01-12/summary.md)\n'
+            '- [2025-03-31 -> 2025-04-06](../2025-03-31_2025-04-06/summary.md)\n\n'
+            '## Work Done\n\n- Support (ABC-1)\n- More support (ABC-1)\n\n- Testing (XYZ-2)\n\n- Reviews\n\n### Easy Work\n\n- Docs\n')
+        # A year built from its quarters matches combining all of its summaries at once
+        summaries = [entries / name / 'summary.md' for name in sorted(SUMMARIES) if name.startswith('2025-0')]
+        assert _body(rollups / '2025-Year.md') == _direct(summaries)
+        assert '- [2025 Q2](./2025-Q2.md)' in (rollups / '2025-Year.md').read_text()
+
+        # Nothing changed, nothing is rebuilt or written
+        results, plan = _build(entries, file_config)
+        assert not any(rebuilt for _name, rebuilt in results)
+        assert plan.files_written == 0
+
+        # A touched summary with the same contents is not rebuilt
+        os.utime(entries / '2025-04-07_2025-04-13' / 'summary.md', ns=(1, 1))
+        results, _ = _build(entries, file_config)
+        assert not any(rebuilt for _name, rebuilt in results)
+
+        # Only the quarter and year of a changed summary are rebuilt
+        summary = entries / '2025-04-07_2025-04-13' / 'summary.md'
+        summary.write_text(summary.read_text().replace('- Release (XYZ-2)', '- Release (XYZ-2)\n- Hotfix (XYZ-3)'))
+        results, plan = _build(entries, file_config)
+        assert results == [('2024-Q4.md', False), ('2025-Q1.md', False), ('2025-Q2.md', True), ('2024-Year.md', False), ('2025-Year.md', True)]
+        assert _body(rollups / '2025-Year.md') == _direct(summaries)
+
+        # A missing rollup file is rebuilt
+        (rollups / '2024-Year.md').unlink()
+        results, _ = _build(entries, file_config, year=2024)
+        assert results == [('2024-Q4.md', False), ('2024-Year.md', True)]
+
+def test_build_rollups_manifest_invalid():
+    with TemporaryDirectory() as tmpdir:
+        entries = Path(tmpdir)
+        file_config = _setup(entries)
+        _build(entries, file_config)
+        assert RollupManifest.load(entries / 'rollups', CollationPlan(COLLATE_SECTIONS, ['Contents'])).periods
+        assert not RollupManifest.load(entries / 'rollups', CollationPlan([], ['Contents'])).periods
+        (entries / 'rollups' / ROLLUP_MANIFEST_NAME).write_text('{broken')
+        assert not RollupManifest.load(entries / 'rollups', CollationPlan(COLLATE_SECTIONS, ['Contents'])).periods
+        results, _ = _build(entries, file_config, full=True)
+        assert all(rebuilt for _name, rebuilt in results)
+
+def test_build_rollups_without_toc():
+    with TemporaryDirectory() as tmpdir:
+        entries = Path(tmpdir)
+        file_config = _setup(entries)
+        file_config.toc.enabled = False
+        _build(entries, file_config, year=2024)
+        assert (entries / 'rollups' / '2024-Q4.md').read_text() == '# Rollup | 2024 Q4\n\n## Work Done\n\n- New year planning (ABC-1)\n'
+
+def test_build_rollups_other_collate_levels():
+    # Summaries write every combined section at level 2, whatever level it is collated from
+    with TemporaryDirectory() as tmpdir:
+        entries = Path(tmpdir)
+        collate_sections = [CollateSection('Work Done', level=3, regex='\\((?P<ticket>[A-Za-z]+-[0-9]+)\\)', groupBy='ticket')]
+        file_config = _setup(entries)
+        file_config.toc.enabled = False
+        manifest = RollupManifest(entries / 'rollups', CollationPlan(collate_sections, ['Contents']))
+        plan = WritePlan()
+        build_rollups(manifest, entries / 'rollups', 'summary.md', file_config, plan, year=2024)
+        plan.commit()
+        assert (entries / 'rollups' / '2024-Q4.md').read_text() == '# Rollup | 2024 Q4\n\n## Work Done\n\n- New year planning (ABC-1)\n'
+
+def test_build_rollups_prunes_removed_folders():
+    with TemporaryDirectory() as tmpdir:
+        entries = Path(tmpdir)
+        file_config = _setup(entries)
+        _build(entries, file_config)
+        (entries / '2025-01-06_2025-01-12' / 'summary.md').unlink()
+        (entries / '2025-01-06_2025-01-12').rmdir()
+        _build(entries, file_config, year=2024)
+        manifest = RollupManifest.load(entries / 'rollups', CollationPlan(COLLATE_SECTIONS, ['Contents']))
+        assert sorted(manifest.summaries) == ['2024-12-30_2025-01-05', '2025-03-31_2025-04-06', '2025-04-07_2025-04-13']
@@ -0,0 +1,142 @@
+from distutils.dir_util import copy_tree
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import os
+import sqlite3
+
+from enheduanna.types.config.file import FileConfig
+from enheduanna.types.config.index import IndexConfig
+from enheduanna.types.markdown.collate_section import CollateSection
+from enheduanna.types.markdown.collation_plan import CollationPlan
+from enheduanna.utils.workspace_index import WorkspaceIndex
+
+DATA_PATH = Path(__file__).parent.parent / 'data'
+
+def build_index(tmpdir: str) -> WorkspaceIndex:
+    entries = Path(tmpdir) / 'Notes'
+    documents = Path(tmpdir) / 'Documents'
+    documents.mkdir()
+    copy_tree(str(DATA_PATH / '2025-02-24_2025-03-02'), str(entries / '2025-02-24_2025-03-02'))
+    config = FileConfig(entries_folder=entries, document_folder=documents,
+                        index=IndexConfig(enabled=True, path=Path(tmpdir) / 'cache' / 'index.sqlite3'))
+    return WorkspaceIndex.from_config(config)
+
+def test_from_config_disabled():
+    assert WorkspaceIndex.from_config(FileConfig()) is None
+
+def test_new_index_is_filled_on_first_use():
+    with TemporaryDirectory() as tmpdir:
+        index = build_index(tmpdir)
+        folder = (index.entries_folder / '2025-02-24_2025-03-02').resolve()
+        assert index.latest_entry() == folder / '2025-02-28.md'
+        assert index.entries(folder) == [folder / '2025-02-27.md', folder / '2025-02-28.md']
+        rows = index.connection.execute('SELECT title, level, start FROM sections WHERE path = ? ORDER BY position',
+                                        (str(folder / '2025-02-28.md'),)).fetchall()
+        assert rows[:3] == [('2025-02-28', 1, 0), ('Work Done', 2, 14), ('Meetings', 2, 149)]
+        index.close()
+        index.close()
+
+def test_find_items():
+    with TemporaryDirectory() as tmpdir:
+        index = build_index(tmpdir)
+        folder = (index.entries_folder / '2025-02-24_2025-03-02').resolve()
+        assert index.find_items('ABC-1234') == [
+            (folder / '2025-02-27.md', 'Work Done', '- Writing up customer support (ABC-1234)'),
+            (folder / '2025-02-28.md', 'Work Done', '- Doing some testing for customer fix (ABC-1234)'),
+        ]
+        assert index.find_items('XYZ-1') == []
+
+def test_update_skips_unchanged_files():
+    with TemporaryDirectory() as tmpdir:
+        index = build_index(tmpdir)
+        entry = index.entries_folder / '2025-02-24_2025-03-02' / '2025-02-28.md'
+        assert index.update([entry]) == 0
+        # Same content with a new mtime is caught by the hash
+        os.utime(entry, (1, 1))
+        assert index.update([entry]) == 0
+        entry.write_text('# 2025-02-28\n\n## Work Done\n\n- Closed out (XYZ-1)\n')
+        assert index.update([entry]) == 1
+        assert index.find_items('XYZ-1') == [(entry.resolve(), 'Work Done', '- Closed out (XYZ-1)')]
+        assert len(index.find_items('ABC-1234')) == 1
+        # Files outside the indexed folders, and other file types, are skipped
+        outside = Path(tmpdir) / 'outside.md'
+        outside.write_text('# Outside\n')
+        assert index.update([outside, index.entries_folder / 'notes.txt']) == 0
+
+def test_reindex_drops_removed_files():
+    with TemporaryDirectory() as tmpdir:
+        index = build_index(tmpdir)
+        assert index.reindex() == (2, 0)
+        folder = index.entries_folder / '2025-02-24_2025-03-02'
+        (folder / '2025-02-28.md').unlink()
+        # Files the parser rejects are listed without sections
+        (index.document_folder / 'Broken.md').write_text('# Broken\n\n## Same\n\n## Same\n')
+        (index.document_folder / 'Summary.md').write_text('# Summary\n')
+        assert index.reindex() == (3, 2)
+        assert index.latest_entry() == folder.resolve() / '2025-02-27.md'
+        assert index.connection.execute('SELECT title FROM files WHERE name = ?', ('Broken.md',)).fetchone() == (None,)
+
+def test_summary_folders():
+    with TemporaryDirectory() as tmpdir:
+        index = build_index(tmpdir)
+        folder = (index.entries_folder / '2025-02-24_2025-03-02').resolve()
+        (folder / 'summary.md').write_text('# Summary\n')
+        # Summaries in the document folder are not collation folders
+        (index.document_folder / 'summary.md').write_text('# Summary\n')
+        index.reindex()
+        assert index.summary_folders('summary.md') == [folder]
+        staged = index.entries_folder / '2025-03-03_2025-03-09'
+        assert index.summary_folders('summary.md', staged=[staged]) == [folder, staged.resolve()]
+
+def test_outdated_schema_is_rebuilt():
+    with TemporaryDirectory() as tmpdir:
+        index = build_index(tmpdir)
+        assert index.latest_entry() is not None
+        index.close()
+        connection = sqlite3.connect(index.path)
+        connection.execute('PRAGMA user_version = 0')
+        connection.execute('DELETE FROM files')
+        connection.commit()
+        connection.close()
+        assert index.latest_entry() is not None
+        index.close()
+
+def test_entry_date_from_name():
+    with TemporaryDirectory() as tmpdir:
+        index = build_index(tmpdir)
+        folder = index.entries_folder / '2025-02-24_2025-03-02'
+        # Entry-like names that do not match the date format get no date
+        (folder / '2025-99.md').write_text('# Odd\n')
+        index.update([folder / '2025-99.md'])
+        rows = index.connection.execute('SELECT name, entry_date FROM files WHERE is_entry ORDER BY name').fetchall()
+        assert rows == [('2025-02-27.md', '2025-02-27'), ('2025-02-28.md', '2025-02-28'), ('2025-99.md', None)]
+
+def test_collate_sections_without_regex_have_no_items():
+    with TemporaryDirectory() as tmpdir:
+        default = build_index(tmpdir)
+        index = WorkspaceIndex(Path(tmpdir) / 'plain.sqlite3', default.entries_folder, default.document_folder,
+                               CollationPlan([CollateSection('Work Done')]), '%Y-%m-%d')
+        assert index.find_items('ABC-1234') == []
+        assert index.latest_entry() is not None
+
+def test_optional_group_without_a_key_is_skipped():
+    with TemporaryDirectory() as tmpdir:
+        default = build_index(tmpdir)
+        section = CollateSection('Work Done', regex=r'^- (?P<ticket>[A-Z]+-\d+ )?', groupBy='ticket')
+        index = WorkspaceIndex(Path(tmpdir) / 'optional.sqlite3', default.entries_folder, default.document_folder,
+                               CollationPlan([section]), '%Y-%m-%d')
+        entry = index.entries_folder / '2025-02-24_2025-03-02' / '2025-02-28.md'
+        entry.write_text('# 2025-02-28\n\n## Work Done\n\n- XYZ-1 Closed out\n- No ticket\n')
+        assert index.reindex()[0] > 0
+        assert index.find_items('XYZ-1 ') == [(entry.resolve(), 'Work Done', '- XYZ-1 Closed out')]
+        index.close()
+
+def test_files_that_are_not_utf8_are_skipped(capsys):
+    with TemporaryDirectory() as tmpdir:
+        index = build_index(tmpdir)
+        folder = index.entries_folder / '2025-02-24_2025-03-02'
+        (folder / '2025-02-28.md').write_bytes(b'# 2025-02-28\n\n\xff\xfe\n')
+        assert index.reindex() == (2, 0)
+        assert f'Warning: skipping {(folder / "2025-02-28.md").resolve()}, it is not valid UTF-8' in capsys.readouterr().err
+        assert index.latest_entry() == folder.resolve() / '2025-02-27.md'
+        index.close()
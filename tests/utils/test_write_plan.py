@@ -0,0 +1,145 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import os
+import stat
+
+from enheduanna.types.markdown.markdown_file import MarkdownFile
+from enheduanna.types.markdown.markdown_section import MarkdownSection
+from enheduanna.utils.write_plan import WritePlan
+
+
+def test_write_plan_writes_each_path_once():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        path = tmpdir / 'entry.md'
+        section = MarkdownSection('Entry', 'first')
+        plan = WritePlan()
+        plan.stage(MarkdownFile(path, section))
+        assert plan.exists(path)
+        assert not path.exists()
+        # Staged files render their latest in-memory state
+        section.contents = 'second'
+        assert plan.read(path) == '# Entry\n\nsecond\n'
+        plan.stage_text(path, plan.read(path).replace('second', 'third'))
+        assert plan.read(path) == '# Entry\n\nthird\n'
+        assert plan.commit() == [path]
+        assert path.read_text() == '# Entry\n\nthird\n'
+        assert plan.files_written == 1
+        assert plan.bytes_written == len('# Entry\n\nthird\n')
+        assert plan.summary() == 'Files written: 1 (15 bytes)'
+        assert sorted(p.name for p in tmpdir.iterdir()) == ['entry.md']
+
+
+def test_write_plan_skips_unchanged_and_keeps_mode():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        same = tmpdir / 'same.md'
+        same.write_text('# Same\n')
+        os.utime(same, ns=(1, 1))
+        changed = tmpdir / 'changed.md'
+        changed.write_text('# Old\n')
+        changed.chmod(0o640)
+        plan = WritePlan()
+        assert plan.read(same) == '# Same\n'
+        plan.stage(MarkdownFile(same, MarkdownSection('Same', '')))
+        plan.stage_text(changed, '# New\n')
+        assert plan.commit() == [changed]
+        assert same.stat().st_mtime_ns == 1
+        assert changed.read_text() == '# New\n'
+        assert stat.S_IMODE(changed.stat().st_mode) == 0o640
+        assert plan.files_written == 1
+        assert plan.bytes_written == 6
+        # Nothing is left staged after a commit
+        assert plan.commit() == []
+        assert sorted(p.name for p in tmpdir.iterdir()) == ['changed.md', 'same.md']
+
+def test_write_plan_syncs_only_replaced_files(monkeypatch):
+    synced = []
+    monkeypatch.setattr(os, 'fsync', synced.append)
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        same = tmpdir / 'same.md'
+        same.write_text('# Same\n')
+        # Same size, other content
+        resized = tmpdir / 'resized.md'
+        resized.write_text('# Abcd\n')
+        plan = WritePlan()
+        plan.stage_text(same, '# Same\n')
+        plan.stage_text(resized, '# Efgh\n')
+        plan.stage_text(tmpdir / 'new' / 'entry.md', '# New\n')
+        assert plan.commit() == [resized, tmpdir / 'new' / 'entry.md']
+        assert len(synced) == 2
+        assert resized.read_text() == '# Efgh\n'
+
+def test_write_plan_streams_markdown_files(monkeypatch):
+    def render(_section):
+        raise AssertionError('rendered in one piece')
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        same = tmpdir / 'same.md'
+        same.write_text('# Same\n\nnotes\n')
+        longer = tmpdir / 'longer.md'
+        longer.write_text('# Longer\n\nnotes\n\nmore\n')
+        plan = WritePlan()
+        plan.stage(MarkdownFile(same, MarkdownSection('Same', 'notes')))
+        plan.stage(MarkdownFile(longer, MarkdownSection('Longer', 'notes')))
+        monkeypatch.setattr(MarkdownSection, 'write', render)
+        # Chunks are compared with the file on disk as they are written, and a match is thrown away
+        assert plan.commit() == [longer]
+        assert longer.read_text() == '# Longer\n\nnotes\n'
+        assert sorted(p.name for p in tmpdir.iterdir()) == ['longer.md', 'same.md']
+
+
+def test_write_plan_appends():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        path = tmpdir / 'notes.md'
+        path.write_text('# Notes\n')
+        path.chmod(0o640)
+        plan = WritePlan()
+        assert plan.head(path) == '# Notes\n'
+        assert plan.tail(path) == 's\n'
+        plan.stage_append(path, '\n## One\n')
+        plan.stage_append(path, '\n## Two\n')
+        assert plan.exists(path)
+        assert plan.read(path) == '# Notes\n\n## One\n\n## Two\n'
+        assert plan.tail(path, size=3) == 'wo\n'
+        assert path.read_text() == '# Notes\n'
+        assert plan.commit() == [path]
+        assert path.read_text() == '# Notes\n\n## One\n\n## Two\n'
+        assert stat.S_IMODE(path.stat().st_mode) == 0o640
+        assert plan.summary() == 'Files written: 1 (16 bytes)'
+        assert sorted(p.name for p in tmpdir.iterdir()) == ['notes.md']
+
+
+def test_write_plan_mixes_appends_and_full_writes():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        path = tmpdir / 'notes.md'
+        path.write_text('# Notes\n')
+        plan = WritePlan()
+        # A full write replaces anything appended before it
+        plan.stage_append(path, 'dropped\n')
+        plan.stage_text(path, '# New\n')
+        # And appends after a full write go on top of it
+        plan.stage_append(path, 'kept\n')
+        assert plan.head(path) == '# New\nkept\n'
+        assert plan.tail(path) == 't\n'
+        assert plan.commit() == [path]
+        assert path.read_text() == '# New\nkept\n'
+
+
+def test_write_plan_lists_staged_markdown_and_creates_folders():
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        folder = tmpdir / 'shards'
+        plan = WritePlan()
+        assert not plan.list_markdown(folder)
+        plan.stage_text(folder / '2025.md', '# 2025\n')
+        plan.stage_text(folder / '.2025.index.json', '{}')
+        plan.stage_text(tmpdir / 'other.md', '# Other\n')
+        assert plan.list_markdown(folder) == [folder / '2025.md']
+        plan.commit()
+        (folder / '2024.md').write_text('# 2024\n')
+        plan.stage_append(folder / '2024.md', 'more\n')
+        assert plan.list_markdown(folder) == [folder / '2024.md', folder / '2025.md']